@@ -0,0 +1,415 @@
+"""API 负载基准测试
+
+在合成数据库（见 benchmarks/seed_db.py）上驱动 src/api/server.py 的每个路由，
+报告每个场景的 p50/p95/p99 延迟与每秒请求数。默认通过 Flask 测试客户端在进程内
+发送请求，指定 --url 时改为通过 HTTP 请求已启动的服务器。热门市场按种子的 Zipf
+权重选取，深分页场景沿游标连续翻页。结果保存为 JSON，--compare 与上一次结果对比。
+
+用法：
+    python -m benchmarks.api_bench --db ./data/bench/api.db --requests 500 --concurrency 4 \\
+        --output ./data/bench/api.json --compare ./data/bench/api-baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+from benchmarks.seed_db import read_seed_params, seed_database
+from benchmarks.synthetic import SyntheticMarkets
+from src.api import server
+from src.db.connection import connect_reader
+
+
+def percentile(sorted_values, fraction):
+    """最近秩百分位数
+
+    Args:
+        sorted_values: 升序排列的数值列表
+        fraction: 0 到 1 之间的分位
+
+    Returns:
+        float: 百分位数，列表为空时返回 None
+    """
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, statuses, byte_count, wall_seconds):
+    """汇总一个场景的延迟分布与吞吐量
+
+    Returns:
+        dict: 请求数、状态码分布、延迟百分位（毫秒）与每秒请求数
+    """
+    ordered = sorted(latencies)
+    status_counts = {}
+    for status in statuses:
+        status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+    return {
+        "requests": len(ordered),
+        "statuses": status_counts,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3) if ordered else None,
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3) if ordered else None,
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3) if ordered else None,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else None,
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else None,
+        "rps": round(len(ordered) / wall_seconds, 1) if wall_seconds else None,
+        "bytes": byte_count
+    }
+
+
+class InProcessTarget:
+    """通过 Flask 测试客户端发送请求（每个线程一个客户端）"""
+
+    def __init__(self, db_path, response_cache=True):
+        server.db_path = db_path
+        if not response_cache:
+            server.response_cache.max_entries = 0
+        self._local = threading.local()
+
+    def get(self, path):
+        """发送 GET 请求并读完响应体
+
+        Returns:
+            tuple: (状态码, 响应体字节数, JSON 响应或 None)
+        """
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = server.app.test_client()
+        response = client.get(path)
+        body = response.get_data()
+        payload = response.get_json(silent=True) if response.is_json else None
+        return response.status_code, len(body), payload
+
+
+class HttpTarget:
+    """通过 HTTP 请求已启动的 API 服务器（每个线程一个连接池）"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self._local = threading.local()
+
+    def get(self, path):
+        """发送 GET 请求并读完响应体
+
+        Returns:
+            tuple: (状态码, 响应体字节数, JSON 响应或 None)
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        response = session.get(self.base_url + path)
+        body = response.content
+        payload = None
+        if response.headers.get('Content-Type', '').startswith('application/json'):
+            payload = response.json()
+        return response.status_code, len(body), payload
+
+
+def run_paths(target, paths, concurrency):
+    """用 concurrency 个线程发送一组请求
+
+    Returns:
+        dict: 场景汇总（见 summarize）
+    """
+    queue = list(reversed(paths))
+    lock = threading.Lock()
+    latencies, statuses = [], []
+    byte_counts = [0]
+
+    def worker():
+        while True:
+            with lock:
+                if not queue:
+                    return
+                path = queue.pop()
+            started_at = time.perf_counter()
+            status, size, _ = target.get(path)
+            elapsed = time.perf_counter() - started_at
+            with lock:
+                latencies.append(elapsed)
+                statuses.append(status)
+                byte_counts[0] += size
+
+    started_at = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, statuses, byte_counts[0], time.perf_counter() - started_at)
+
+
+def run_pagination(target, base_paths, pages, concurrency):
+    """沿 next_cursor 连续翻页，每条翻页链在一个线程中顺序执行
+
+    Returns:
+        dict: 场景汇总，另附首 10 页与最后 10 页的 p50，用于发现随深度增长的延迟
+    """
+    chains = list(base_paths)
+    lock = threading.Lock()
+    latencies, statuses, depth_latencies = [], [], {}
+    byte_counts = [0]
+
+    def worker():
+        while True:
+            with lock:
+                if not chains:
+                    return
+                base_path = chains.pop()
+            cursor = None
+            for depth in range(pages):
+                separator = '&' if '?' in base_path else '?'
+                path = base_path + (f'{separator}cursor={cursor}' if cursor else '')
+                started_at = time.perf_counter()
+                status, size, payload = target.get(path)
+                elapsed = time.perf_counter() - started_at
+                with lock:
+                    latencies.append(elapsed)
+                    statuses.append(status)
+                    byte_counts[0] += size
+                    depth_latencies.setdefault(depth, []).append(elapsed)
+                cursor = (payload or {}).get('next_cursor')
+                if not cursor:
+                    break
+
+    started_at = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    summary = summarize(latencies, statuses, byte_counts[0], time.perf_counter() - started_at)
+
+    depths = sorted(depth_latencies)
+    first = sorted(value for depth in depths[:10] for value in depth_latencies[depth])
+    last = sorted(value for depth in depths[-10:] for value in depth_latencies[depth])
+    summary["max_depth"] = depths[-1] + 1 if depths else 0
+    summary["first_pages_p50_ms"] = round(percentile(first, 0.5) * 1000, 3) if first else None
+    summary["last_pages_p50_ms"] = round(percentile(last, 0.5) * 1000, 3) if last else None
+    return summary
+
+
+def build_scenarios(catalog, seed_params, request_count, hot_count, export_blocks, rng):
+    """生成各场景的请求路径
+
+    Returns:
+        dict: 场景名 → 路径列表
+    """
+    by_weight = sorted(range(catalog.market_count), key=lambda index: catalog.weights[index], reverse=True)
+    hot = by_weight[:max(1, hot_count)]
+    tokens = catalog.token_ids
+
+    def hot_market():
+        return rng.choice(hot)
+
+    def any_market():
+        return rng.randrange(catalog.market_count)
+
+    last_block = seed_params['start_block'] + (seed_params['trades'] - 1) // seed_params['trades_per_block']
+    export_from = max(seed_params['start_block'], last_block - export_blocks + 1)
+    event_count = (catalog.market_count + catalog.markets_per_event - 1) // catalog.markets_per_event
+
+    def times(fn):
+        return [fn() for _ in range(request_count)]
+
+    return {
+        "market_hot": times(lambda: f"/markets/bench-market-{hot_market()}"),
+        "market_random": times(lambda: f"/markets/bench-market-{any_market()}"),
+        "market_missing": times(lambda: f"/markets/missing-{rng.randrange(10 ** 9)}"),
+        "trades_first_page_hot": times(lambda: f"/markets/bench-market-{hot_market()}/trades?limit=100"),
+        "trades_first_page_random": times(lambda: f"/markets/bench-market-{any_market()}/trades?limit=100"),
+        "trades_offset_deep_hot": times(
+            lambda: f"/markets/bench-market-{hot_market()}/trades?limit=100&offset={rng.randrange(1000, 20000)}"
+        ),
+        "token_trades_hot": times(lambda: f"/tokens/{tokens[hot_market()][rng.randrange(2)]}/trades?limit=100"),
+        "candles_1h_hot": times(lambda: f"/markets/bench-market-{hot_market()}/candles?interval=1h&limit=1000"),
+        "candles_1m_hot": times(
+            lambda: f"/markets/bench-market-{hot_market()}/candles?interval=1m&outcome=YES&limit=1000"
+        ),
+        "candles_1d_random": times(lambda: f"/markets/bench-market-{any_market()}/candles?interval=1d"),
+        "event": times(lambda: f"/events/bench-event-{rng.randrange(event_count)}"),
+        "event_markets": times(lambda: f"/events/bench-event-{rng.randrange(event_count)}/markets"),
+        "export_ndjson_hot": [
+            f"/markets/bench-market-{hot_market()}/trades/export?from_block={export_from}&to_block={last_block}"
+            for _ in range(max(1, request_count // 20))
+        ],
+        "export_csv_random": [
+            f"/markets/bench-market-{any_market()}/trades/export?format=csv&from_block={export_from}"
+            for _ in range(max(1, request_count // 20))
+        ],
+        "metrics": times(lambda: "/metrics")
+    }
+
+
+def compare_results(previous, current):
+    """对比两次运行的各场景百分位延迟
+
+    Returns:
+        dict: 场景名 → {指标: {previous, current, change}}，change 为相对变化比例
+    """
+    comparison = {}
+    for name, scenario in current["scenarios"].items():
+        before = previous.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        comparison[name] = {}
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "rps"):
+            old, new = before.get(metric), scenario.get(metric)
+            comparison[name][metric] = {
+                "previous": old,
+                "current": new,
+                "change": round((new - old) / old, 4) if old and new is not None else None
+            }
+    return comparison
+
+
+def run_benchmark(
+    db_path,
+    base_url=None,
+    request_count=500,
+    concurrency=1,
+    hot_count=10,
+    pages=200,
+    pagination_chains=8,
+    export_blocks=20000,
+    warmup=50,
+    response_cache=True,
+    scenario_names=None,
+    seed=1
+):
+    """对合成数据库运行全部场景
+
+    Args:
+        db_path: 由 seed_db 生成的数据库路径
+        base_url: 已启动服务器的地址，为 None 时在进程内使用 Flask 测试客户端
+        request_count: 每个场景的请求数（导出场景为其 1/20）
+        concurrency: 并发线程数
+        hot_count: 热门市场数量
+        pages: 深分页场景每条翻页链的最大页数
+        pagination_chains: 深分页场景的翻页链数量
+        export_blocks: 导出场景覆盖的最近区块数
+        warmup: 正式计时前的预热请求数
+        response_cache: 进程内模式是否启用响应缓存
+        scenario_names: 只运行指定的场景，None 表示全部
+        seed: 请求路径的随机种子
+
+    Returns:
+        dict: 参数、数据库规模与各场景汇总
+    """
+    conn = connect_reader(db_path)
+    seed_params = read_seed_params(conn)
+    db_stats = {
+        "trades": conn.execute('SELECT COALESCE(SUM(total_trades), 0) FROM market_stats').fetchone()[0],
+        "markets": conn.execute('SELECT COUNT(*) FROM markets').fetchone()[0],
+        "events": conn.execute('SELECT COUNT(*) FROM events').fetchone()[0],
+        "bytes": os.path.getsize(db_path)
+    }
+    conn.close()
+    if not seed_params:
+        raise ValueError(f'{db_path} was not generated by benchmarks.seed_db')
+
+    catalog = SyntheticMarkets(
+        seed_params['markets'],
+        markets_per_event=seed_params['markets_per_event'],
+        seed=seed_params['seed']
+    )
+    target = HttpTarget(base_url) if base_url else InProcessTarget(db_path, response_cache)
+    rng = random.Random(seed)
+    scenarios = build_scenarios(catalog, seed_params, request_count, hot_count, export_blocks, rng)
+
+    # 深分页：在最热门的市场上沿游标翻页
+    by_weight = sorted(range(catalog.market_count), key=lambda index: catalog.weights[index], reverse=True)
+    pagination_bases = [
+        f"/markets/bench-market-{by_weight[index % max(1, hot_count)]}/trades?limit=100"
+        for index in range(pagination_chains)
+    ]
+
+    # 预热连接、页缓存与响应缓存
+    run_paths(target, [rng.choice(paths) for paths in scenarios.values() for _ in range(max(1, warmup // len(scenarios)))], concurrency)
+
+    results = {}
+    for name, paths in scenarios.items():
+        if scenario_names and name not in scenario_names:
+            continue
+        results[name] = run_paths(target, paths, concurrency)
+        print(f"{name}: {results[name]}")
+    if not scenario_names or "trades_cursor_deep_hot" in scenario_names:
+        results["trades_cursor_deep_hot"] = run_pagination(target, pagination_bases, pages, concurrency)
+        print(f"trades_cursor_deep_hot: {results['trades_cursor_deep_hot']}")
+
+    return {
+        "benchmark": "api",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "target": base_url or "in-process",
+        "params": {
+            "requests": request_count,
+            "concurrency": concurrency,
+            "hot_markets": hot_count,
+            "pages": pages,
+            "pagination_chains": pagination_chains,
+            "export_blocks": export_blocks,
+            "response_cache": response_cache,
+            "seed": seed
+        },
+        "db": {**db_stats, "seed": seed_params},
+        "scenarios": results
+    }
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='API 负载基准测试')
+    parser.add_argument('--db', default='./data/bench/api.db', help='合成数据库路径，不存在时先生成')
+    parser.add_argument('--url', help='已启动的 API 服务器地址（默认在进程内使用 Flask 测试客户端）')
+    parser.add_argument('--markets', type=int, default=5000, help='生成数据库时的市场数量')
+    parser.add_argument('--trades', type=int, default=10000000, help='生成数据库时的交易总数')
+    parser.add_argument('--requests', type=int, default=500, help='每个场景的请求数')
+    parser.add_argument('--concurrency', type=int, default=1, help='并发线程数')
+    parser.add_argument('--hot-markets', type=int, default=10, help='热门市场数量')
+    parser.add_argument('--pages', type=int, default=200, help='深分页场景每条翻页链的最大页数')
+    parser.add_argument('--export-blocks', type=int, default=20000, help='导出场景覆盖的最近区块数')
+    parser.add_argument('--no-response-cache', action='store_true', help='进程内模式关闭响应缓存')
+    parser.add_argument('--scenario', action='append', help='只运行指定场景（可重复）')
+    parser.add_argument('--output', help='结果 JSON 文件路径')
+    parser.add_argument('--compare', help='与之前保存的结果 JSON 对比')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        os.makedirs(os.path.dirname(args.db) or '.', exist_ok=True)
+        print(json.dumps(seed_database(args.db, markets=args.markets, trades=args.trades), indent=2))
+
+    results = run_benchmark(
+        args.db,
+        base_url=args.url,
+        request_count=args.requests,
+        concurrency=args.concurrency,
+        hot_count=args.hot_markets,
+        pages=args.pages,
+        export_blocks=args.export_blocks,
+        response_cache=not args.no_response_cache,
+        scenario_names=args.scenario
+    )
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            results["comparison"] = compare_results(json.load(f), results)
+
+    output_json = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output_json)
+        print(f"基准测试结果已保存到: {args.output}")
+    print(output_json)
+
+
+if __name__ == '__main__':
+    main()
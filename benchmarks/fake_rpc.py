@@ -0,0 +1,166 @@
+"""离线 JSON-RPC 节点替身
+
+FakeChain 按 JSON-RPC 语义响应 eth_blockNumber、eth_getLogs 与 eth_getBlockByNumber，
+支持注入延迟、随机错误以及节点的单次查询日志数上限（返回带建议范围的错误，
+与 Alchemy 的行为一致）。FakeProvider 把它包装为 web3 provider，FakeRpcClient
+替换 BatchRpcClient 的 HTTP 发送，使批量请求同样不经过网络。
+"""
+import random
+import threading
+import time
+
+import requests
+from web3.providers import JSONBaseProvider
+
+from benchmarks.synthetic import block_header
+from src.indexer.rpc import BatchRpcClient
+
+
+class FakeChain:
+    """合成链的 JSON-RPC 处理器"""
+
+    def __init__(
+        self,
+        logs,
+        head_block,
+        latency_ms=0.0,
+        jitter_ms=0.0,
+        error_rate=0.0,
+        max_logs_per_query=10000,
+        seed=1
+    ):
+        """初始化合成链
+
+        Args:
+            logs: SyntheticLogs 实例
+            head_block: 链头区块号
+            latency_ms: 每个 HTTP 请求的固定延迟（毫秒），批量请求只计一次
+            jitter_ms: 在固定延迟之上追加的随机延迟上限（毫秒）
+            error_rate: 每个 HTTP 请求失败的概率
+            max_logs_per_query: eth_getLogs 单次返回的最大日志数，超出时返回范围过大错误
+            seed: 延迟与错误注入的随机种子
+        """
+        self.logs = logs
+        self.head_block = head_block
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.max_logs_per_query = max_logs_per_query
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._block_logs = {}
+
+        # 请求统计
+        self.http_requests = 0
+        self.calls = {}
+        self.injected_errors = 0
+        self.range_errors = 0
+
+    def preload(self, from_block, to_block):
+        """预先生成区块范围内的日志，避免生成开销计入获取耗时"""
+        for number in range(from_block, to_block + 1):
+            if number not in self._block_logs:
+                self._block_logs[number] = self.logs.block_logs(number)
+
+    def _logs_for_block(self, number):
+        logs = self._block_logs.get(number)
+        if logs is None:
+            logs = self.logs.block_logs(number)
+        return logs
+
+    def simulate_transport(self):
+        """模拟一次 HTTP 往返：等待注入的延迟，按 error_rate 抛出连接错误
+
+        Raises:
+            requests.ConnectionError: 注入的传输错误
+        """
+        self.http_requests += 1
+        with self._rng_lock:
+            delay = self.latency_ms + (self._rng.random() * self.jitter_ms if self.jitter_ms else 0.0)
+            failed = self.error_rate and self._rng.random() < self.error_rate
+        if delay:
+            time.sleep(delay / 1000.0)
+        if failed:
+            self.injected_errors += 1
+            raise requests.ConnectionError("injected transport error")
+
+    def handle(self, request):
+        """处理单个 JSON-RPC 请求
+
+        Args:
+            request: JSON-RPC 请求字典
+
+        Returns:
+            dict: JSON-RPC 响应字典
+        """
+        method = request["method"]
+        params = request.get("params") or []
+        self.calls[method] = self.calls.get(method, 0) + 1
+        response = {"jsonrpc": "2.0", "id": request.get("id")}
+
+        if method == "eth_blockNumber":
+            response["result"] = hex(self.head_block)
+        elif method == "eth_chainId":
+            response["result"] = hex(137)
+        elif method == "eth_getBlockByNumber":
+            number = int(params[0], 16)
+            response["result"] = block_header(number) if number <= self.head_block else None
+        elif method == "eth_getLogs":
+            query = params[0]
+            from_block, to_block = int(query["fromBlock"], 16), int(query["toBlock"], 16)
+            logs = []
+            for number in range(from_block, min(to_block, self.head_block) + 1):
+                logs.extend(self._logs_for_block(number))
+                if len(logs) > self.max_logs_per_query:
+                    # 与 Alchemy 相同：拒绝查询并建议一个不会超限的范围
+                    self.range_errors += 1
+                    response["error"] = {
+                        "code": -32602,
+                        "message": (
+                            f"Log response size exceeded. You can make eth_getLogs requests with up to a "
+                            f"{self.max_logs_per_query} logs limit. Based on your parameters, this block range "
+                            f"should work: [{hex(from_block)}, {hex(max(from_block, number - 1))}]"
+                        )
+                    }
+                    return response
+            response["result"] = logs
+        else:
+            response["error"] = {"code": -32601, "message": f"the method {method} does not exist"}
+        return response
+
+
+class FakeProvider(JSONBaseProvider):
+    """由 FakeChain 响应请求的 web3 provider"""
+
+    def __init__(self, chain):
+        super().__init__()
+        self.chain = chain
+        self._request_id = 0
+
+    def make_request(self, method, params):
+        self.chain.simulate_transport()
+        self._request_id += 1
+        return self.chain.handle({"jsonrpc": "2.0", "id": self._request_id, "method": method, "params": params})
+
+    def is_connected(self, show_traceback=False):
+        return True
+
+
+class FakeRpcClient(BatchRpcClient):
+    """由 FakeChain 响应批量请求的 BatchRpcClient"""
+
+    def __init__(self, chain, **kwargs):
+        """初始化
+
+        Args:
+            chain: FakeChain 实例
+            kwargs: 传给 BatchRpcClient 的参数（batch_size、max_retries 等）
+        """
+        super().__init__("fake://", **kwargs)
+        self.chain = chain
+
+    def _post(self, payload):
+        self.chain.simulate_transport()
+        if isinstance(payload, list):
+            return [self.chain.handle(item) for item in payload]
+        return self.chain.handle(payload)
@@ -0,0 +1,254 @@
+"""离线索引器端到端基准测试
+
+在临时数据库上对合成链运行 TradesIndexer.run_indexer，不需要网络或付费节点。
+各阶段耗时取自索引器的 Prometheus 指标（见 src/metrics.py），输出每个阶段的
+日志/秒与交易/秒。
+
+用法：
+    python -m benchmarks.indexer_bench --blocks 20000 --logs-per-block 5 --markets 1000 \\
+        --latency-ms 20 --error-rate 0.01 --output ./data/bench/indexer.json
+"""
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+from datetime import datetime
+
+from web3 import Web3
+
+from benchmarks.fake_rpc import FakeChain, FakeProvider, FakeRpcClient
+from benchmarks.synthetic import SyntheticLogs, SyntheticMarkets
+from src.db.schema import init_db
+from src.db.store import upsert_catalog
+from src.indexer import trades_indexer
+from src.indexer.chunker import AdaptiveChunker
+from src.indexer.rpc import RPC_CALLS, RPC_SECONDS
+from src.indexer.trades_indexer import TradesIndexer
+
+
+def snapshot_metrics():
+    """读取各阶段的累计耗时与计数
+
+    Returns:
+        dict: 指标名 → 当前累计值
+    """
+    return {
+        "fetch_seconds": RPC_SECONDS.sum(method="eth_getLogs"),
+        "block_header_seconds": RPC_SECONDS.sum(method="eth_getBlockByNumber"),
+        "decode_seconds": trades_indexer.DECODE_SECONDS.sum(),
+        "store_seconds": (
+            trades_indexer.DB_WRITE_SECONDS.sum(operation="trades")
+            + trades_indexer.DB_WRITE_SECONDS.sum(operation="progress")
+        ),
+        "get_logs_calls": RPC_CALLS.value(method="eth_getLogs"),
+        "block_header_calls": RPC_CALLS.value(method="eth_getBlockByNumber"),
+        "logs": trades_indexer.LOGS_FETCHED.value(),
+        "trades": trades_indexer.TRADES_INSERTED.value()
+    }
+
+
+def stage_breakdown(before, after, wall_seconds):
+    """由前后两次指标快照计算各阶段耗时与吞吐量
+
+    未单独计时的部分（市场查找、区块头缓存与 blocks 表写入、分块器开销等）记为 other。
+
+    Returns:
+        dict: 阶段名 → {seconds, share, logs_per_sec, trades_per_sec}
+    """
+    delta = {name: after[name] - before[name] for name in after}
+    stages = {
+        "fetch": delta["fetch_seconds"],
+        "decode": delta["decode_seconds"],
+        "block_headers": delta["block_header_seconds"],
+        "store": delta["store_seconds"]
+    }
+    stages["other"] = max(0.0, wall_seconds - sum(stages.values()))
+
+    breakdown = {}
+    for name, seconds in stages.items():
+        breakdown[name] = {
+            "seconds": round(seconds, 4),
+            "share": round(seconds / wall_seconds, 4) if wall_seconds else 0.0,
+            "logs_per_sec": round(delta["logs"] / seconds, 1) if seconds else None,
+            "trades_per_sec": round(delta["trades"] / seconds, 1) if seconds else None
+        }
+    return breakdown
+
+
+def run_benchmark(
+    blocks=20000,
+    logs_per_block=5.0,
+    markets=1000,
+    start_block=60000000,
+    latency_ms=0.0,
+    jitter_ms=0.0,
+    error_rate=0.0,
+    max_logs_per_query=10000,
+    unknown_token_rate=0.0,
+    rpc_batch_size=100,
+    write_batch_size=10000,
+    initial_chunk_size=2000,
+    fetch_concurrency=1,
+    seed=1,
+    db_path=None
+):
+    """生成合成数据并运行一次索引
+
+    Args:
+        blocks: 索引的区块数
+        logs_per_block: 每个区块的平均 OrderFilled 日志数
+        markets: 市场数量
+        start_block: 起始区块号
+        latency_ms: 每个 RPC HTTP 请求的注入延迟（毫秒）
+        jitter_ms: 随机附加延迟上限（毫秒）
+        error_rate: 每个 RPC HTTP 请求的注入失败概率
+        max_logs_per_query: 节点单次 eth_getLogs 返回的日志上限
+        unknown_token_rate: 使用未知 token 的日志比例（这些交易会被跳过）
+        rpc_batch_size: 区块头批量请求大小
+        write_batch_size: 每个写入事务的最大交易数
+        initial_chunk_size: 分块器初始窗口大小
+        fetch_concurrency: 同时获取日志的区块窗口数，大于 1 时以流水线方式运行
+        seed: 随机种子
+        db_path: 数据库路径，默认在临时目录中新建
+
+    Returns:
+        dict: 参数、总吞吐量、分阶段耗时与节点请求统计
+    """
+    end_block = start_block + blocks - 1
+    catalog = SyntheticMarkets(markets, seed=seed)
+    chain = FakeChain(
+        SyntheticLogs(catalog, logs_per_block, seed=seed, unknown_token_rate=unknown_token_rate),
+        head_block=end_block,
+        latency_ms=latency_ms,
+        jitter_ms=jitter_ms,
+        error_rate=error_rate,
+        max_logs_per_query=max_logs_per_query,
+        seed=seed
+    )
+    chain.preload(start_block, end_block)
+    expected_logs = sum(len(chain._logs_for_block(number)) for number in range(start_block, end_block + 1))
+
+    temp_dir = None
+    if db_path is None:
+        temp_dir = tempfile.TemporaryDirectory(prefix="indexer-bench-")
+        db_path = os.path.join(temp_dir.name, "bench.db")
+    try:
+        conn = init_db(db_path)
+        upsert_catalog(conn, catalog.events(), catalog.markets())
+
+        indexer = TradesIndexer(
+            Web3(FakeProvider(chain)),
+            chunker=AdaptiveChunker(initial_size=initial_chunk_size, backoff_seconds=0.01),
+            rpc=FakeRpcClient(chain, batch_size=rpc_batch_size, backoff_seconds=0.01),
+            write_batch_size=write_batch_size,
+            fetch_concurrency=fetch_concurrency
+        )
+
+        before = snapshot_metrics()
+        started_at = time.perf_counter()
+        cpu_started_at = time.process_time()
+        result = indexer.run_indexer(conn, start_block, end_block)
+        wall_seconds = time.perf_counter() - started_at
+        cpu_seconds = time.process_time() - cpu_started_at
+        after = snapshot_metrics()
+        conn.close()
+        db_size = os.path.getsize(db_path)
+    finally:
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+    logs = after["logs"] - before["logs"]
+    trades = after["trades"] - before["trades"]
+    return {
+        "benchmark": "indexer",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "params": {
+            "blocks": blocks,
+            "logs_per_block": logs_per_block,
+            "markets": markets,
+            "latency_ms": latency_ms,
+            "jitter_ms": jitter_ms,
+            "error_rate": error_rate,
+            "max_logs_per_query": max_logs_per_query,
+            "unknown_token_rate": unknown_token_rate,
+            "rpc_batch_size": rpc_batch_size,
+            "write_batch_size": write_batch_size,
+            "initial_chunk_size": initial_chunk_size,
+            "fetch_concurrency": fetch_concurrency,
+            "seed": seed
+        },
+        "totals": {
+            "wall_seconds": round(wall_seconds, 4),
+            "cpu_seconds": round(cpu_seconds, 4),
+            "expected_logs": expected_logs,
+            "logs": logs,
+            "trades": trades,
+            "logs_per_sec": round(logs / wall_seconds, 1) if wall_seconds else None,
+            "trades_per_sec": round(trades / wall_seconds, 1) if wall_seconds else None,
+            "chunks": result["chunks"],
+            "final_chunk_size": result["chunk_size"],
+            "db_bytes": db_size
+        },
+        "stages": stage_breakdown(before, after, wall_seconds),
+        "rpc": {
+            "http_requests": chain.http_requests,
+            "calls": chain.calls,
+            "get_logs_calls": after["get_logs_calls"] - before["get_logs_calls"],
+            "block_header_calls": after["block_header_calls"] - before["block_header_calls"],
+            "injected_errors": chain.injected_errors,
+            "range_errors": chain.range_errors
+        }
+    }
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='离线索引器端到端基准测试')
+    parser.add_argument('--blocks', type=int, default=20000, help='索引的区块数')
+    parser.add_argument('--logs-per-block', type=float, default=5.0, help='每个区块的平均日志数')
+    parser.add_argument('--markets', type=int, default=1000, help='市场数量')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='每个 RPC 请求的注入延迟（毫秒）')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='随机附加延迟上限（毫秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='每个 RPC 请求的注入失败概率')
+    parser.add_argument('--max-logs-per-query', type=int, default=10000, help='节点单次 eth_getLogs 的日志上限')
+    parser.add_argument('--unknown-token-rate', type=float, default=0.0, help='使用未知 token 的日志比例')
+    parser.add_argument('--rpc-batch-size', type=int, default=100, help='区块头批量请求大小')
+    parser.add_argument('--write-batch-size', type=int, default=10000, help='每个写入事务的最大交易数')
+    parser.add_argument('--initial-chunk-size', type=int, default=2000, help='分块器初始窗口大小')
+    parser.add_argument('--fetch-concurrency', type=int, default=1, help='同时获取日志的区块窗口数')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子')
+    parser.add_argument('--db', help='数据库路径（默认使用临时文件，运行后删除）')
+    parser.add_argument('--output', help='结果 JSON 文件路径')
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        blocks=args.blocks,
+        logs_per_block=args.logs_per_block,
+        markets=args.markets,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        max_logs_per_query=args.max_logs_per_query,
+        unknown_token_rate=args.unknown_token_rate,
+        rpc_batch_size=args.rpc_batch_size,
+        write_batch_size=args.write_batch_size,
+        initial_chunk_size=args.initial_chunk_size,
+        fetch_concurrency=args.fetch_concurrency,
+        seed=args.seed,
+        db_path=args.db
+    )
+
+    output_json = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output_json)
+        print(f"基准测试结果已保存到: {args.output}")
+    print(output_json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""生成 API 基准测试用的合成数据库
+
+事件与市场来自 SyntheticMarkets，交易按区块顺序生成，市场按 Zipf 分布倾斜，
+交易者地址从固定的地址池中抽取。交易通过 insert_trades 写入，K 线与市场统计
+与生产环境一样在写入时维护。
+
+用法：
+    python -m benchmarks.seed_db --db ./data/bench/api.db --markets 5000 --trades 10000000
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+from benchmarks.synthetic import BLOCK_TIME, GENESIS_TIMESTAMP, SyntheticMarkets
+from src.db.codec import AMOUNT_SCALE, OUTCOME_CODES, SIDE_CODES
+from src.db.schema import init_db
+from src.db.store import get_metadata, insert_trades, refresh_market_stats, set_metadata, update_sync_state, upsert_catalog
+
+
+# 在 metadata 中记录种子参数的键名前缀，用于判断已有数据库能否复用
+SEED_STATE_PREFIX = 'bench_seed_'
+
+# 记录在 metadata 中的种子参数（均为整数）
+SEED_PARAMS = ('markets', 'markets_per_event', 'trades', 'trades_per_block', 'start_block', 'seed')
+
+
+def read_seed_params(conn):
+    """读取数据库中记录的种子参数
+
+    Returns:
+        dict: 参数名 → 值，数据库不是由本工具生成时返回空字典
+    """
+    params = {name: get_metadata(conn, SEED_STATE_PREFIX + name) for name in SEED_PARAMS}
+    return params if params['trades'] else {}
+
+
+def iter_trade_batches(catalog, market_ids, trades, trades_per_block, start_block, seed, batch_size=50000, traders=100000):
+    """按区块顺序生成交易批次
+
+    Args:
+        catalog: SyntheticMarkets 实例
+        market_ids: 市场下标 → 数据库中的市场 ID
+        trades: 交易总数
+        trades_per_block: 每个区块的交易数
+        start_block: 第一个区块号
+        seed: 随机种子
+        batch_size: 每批交易数
+        traders: 交易者地址池大小
+
+    Yields:
+        list: 按 TRADE_COLUMNS 排列的交易元组列表
+    """
+    rng = random.Random(seed)
+    addresses = [rng.randbytes(20) for _ in range(traders)]
+    # 每个市场的基准 YES 价格（百万分之一单位）
+    base_prices = [rng.randint(20000, 980000) for _ in range(catalog.market_count)]
+    market_indexes = range(catalog.market_count)
+
+    produced = 0
+    while produced < trades:
+        count = min(batch_size, trades - produced)
+        chosen = rng.choices(market_indexes, cum_weights=catalog.cum_weights, k=count)
+        batch = []
+        for offset, market in enumerate(chosen):
+            sequence = produced + offset
+            block_number = start_block + sequence // trades_per_block
+            outcome = rng.randrange(2)
+            yes_price = min(990000, max(10000, base_prices[market] + rng.randint(-30000, 30000)))
+            batch.append((
+                market_ids[market],
+                rng.randbytes(32),
+                sequence % trades_per_block,
+                addresses[rng.randrange(traders)],
+                addresses[rng.randrange(traders)],
+                SIDE_CODES['BUY'] if rng.random() < 0.5 else SIDE_CODES['SELL'],
+                outcome,
+                yes_price if outcome == OUTCOME_CODES['YES'] else AMOUNT_SCALE - yes_price,
+                rng.randint(1, 500) * AMOUNT_SCALE,
+                block_number,
+                GENESIS_TIMESTAMP + block_number * BLOCK_TIME
+            ))
+        produced += count
+        yield batch
+
+
+def seed_database(
+    db_path,
+    markets=5000,
+    markets_per_event=2,
+    trades=10000000,
+    trades_per_block=5,
+    start_block=60000000,
+    seed=1,
+    batch_size=50000
+):
+    """生成合成数据库（数据库文件应不存在或为空）
+
+    Args:
+        db_path: 数据库路径
+        markets: 市场数量
+        markets_per_event: 每个事件的市场数量
+        trades: 交易总数
+        trades_per_block: 每个区块的交易数
+        start_block: 第一个区块号
+        seed: 随机种子
+        batch_size: 每个写入事务的交易数
+
+    Returns:
+        dict: 种子参数、写入数量、耗时与文件大小
+    """
+    started_at = time.time()
+    catalog = SyntheticMarkets(markets, markets_per_event=markets_per_event, seed=seed)
+
+    conn = init_db(db_path)
+    # 生成的数据可以重建，关闭同步写入以加快写入速度
+    conn.execute('PRAGMA synchronous = OFF')
+    try:
+        upsert_catalog(conn, catalog.events(), catalog.markets())
+        ids_by_slug = dict(conn.execute('SELECT slug, id FROM markets').fetchall())
+        market_ids = [ids_by_slug[f'bench-market-{index}'] for index in range(markets)]
+
+        inserted = 0
+        for batch in iter_trade_batches(catalog, market_ids, trades, trades_per_block, start_block, seed, batch_size):
+            inserted += insert_trades(conn, batch, batch_size)
+            print(f"已写入 {inserted}/{trades} 条交易（{time.time() - started_at:.0f} 秒）")
+
+        refresh_market_stats(conn)
+        params = {
+            'markets': markets,
+            'markets_per_event': markets_per_event,
+            'trades': trades,
+            'trades_per_block': trades_per_block,
+            'start_block': start_block,
+            'seed': seed
+        }
+        for name, value in params.items():
+            set_metadata(conn, SEED_STATE_PREFIX + name, value)
+        update_sync_state(conn, start_block + (trades - 1) // trades_per_block)
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        conn.close()
+
+    return {
+        'params': params,
+        'inserted_trades': inserted,
+        'seconds': round(time.time() - started_at, 1),
+        'db_bytes': os.path.getsize(db_path)
+    }
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='生成 API 基准测试用的合成数据库')
+    parser.add_argument('--db', default='./data/bench/api.db', help='数据库路径（不能已存在）')
+    parser.add_argument('--markets', type=int, default=5000, help='市场数量')
+    parser.add_argument('--markets-per-event', type=int, default=2, help='每个事件的市场数量')
+    parser.add_argument('--trades', type=int, default=10000000, help='交易总数')
+    parser.add_argument('--trades-per-block', type=int, default=5, help='每个区块的交易数')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子')
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        raise SystemExit(f'{args.db} already exists')
+    os.makedirs(os.path.dirname(args.db) or '.', exist_ok=True)
+    result = seed_database(
+        args.db,
+        markets=args.markets,
+        markets_per_event=args.markets_per_event,
+        trades=args.trades,
+        trades_per_block=args.trades_per_block,
+        seed=args.seed
+    )
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""合成 OrderFilled 日志生成器
+
+按固定随机种子生成市场目录与逐区块的 OrderFilled 日志（原始 JSON-RPC 格式，
+data 与 topics 与链上编码一致），供离线基准测试使用。市场成交量按 Zipf 分布倾斜，
+少数热门市场占大部分成交。
+"""
+import hashlib
+import itertools
+import random
+
+from web3 import Web3
+
+
+# TradesIndexer 监听的交易所合约
+EXCHANGE_ADDRESSES = (
+    "0x4bfb41d5b3570defd03c39a9a4d8de6bd8b8982e",
+    "0x8381f58a9814ac1f3562968a6e59819f14308c05",
+)
+
+ORDER_FILLED_TOPIC = "0x" + Web3.keccak(
+    text="OrderFilled(bytes32,address,address,uint256,uint256,uint256,uint256,uint256)"
+).hex()
+
+# 第一个区块的时间戳与出块间隔（秒）
+GENESIS_TIMESTAMP = 1700000000
+BLOCK_TIME = 2
+
+
+def _hash_hex(*parts):
+    """由若干部分生成确定性的 32 字节十六进制哈希"""
+    return "0x" + hashlib.sha256("/".join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _word(value):
+    """把整数编码为 32 字节大端十六进制字（不带 0x）"""
+    return f"{value:064x}"
+
+
+def block_hash(number):
+    """区块的确定性哈希"""
+    return _hash_hex("block", number)
+
+
+def block_header(number):
+    """区块头（eth_getBlockByNumber 的原始 JSON-RPC 结果）"""
+    return {
+        "number": hex(number),
+        "hash": block_hash(number),
+        "parentHash": block_hash(number - 1) if number > 0 else "0x" + "00" * 32,
+        "timestamp": hex(GENESIS_TIMESTAMP + number * BLOCK_TIME),
+        "transactions": []
+    }
+
+
+class SyntheticMarkets:
+    """合成市场目录
+
+    每个事件包含 markets_per_event 个市场，每个市场有 YES/NO 两个 token。
+    """
+
+    def __init__(self, market_count=1000, markets_per_event=4, seed=1, zipf_exponent=1.1):
+        """初始化市场目录
+
+        Args:
+            market_count: 市场数量
+            markets_per_event: 每个事件的市场数量
+            seed: 随机种子
+            zipf_exponent: 成交量 Zipf 分布的指数，越大越集中在热门市场
+        """
+        self.market_count = market_count
+        self.markets_per_event = max(1, markets_per_event)
+        rng = random.Random(seed)
+
+        self.token_ids = []
+        for index in range(market_count):
+            yes_token = rng.getrandbits(255) | 1 << 255
+            no_token = rng.getrandbits(255) | 1 << 255
+            self.token_ids.append((yes_token, no_token))
+
+        # 按 Zipf 权重打乱排名，热门市场分散在目录中
+        ranks = list(range(1, market_count + 1))
+        rng.shuffle(ranks)
+        self.weights = [1.0 / rank ** zipf_exponent for rank in ranks]
+        self.cum_weights = list(itertools.accumulate(self.weights))
+
+    def event_slug(self, index):
+        """市场所属事件的 slug"""
+        return f"bench-event-{index // self.markets_per_event}"
+
+    def events(self):
+        """事件数据字典列表（upsert_catalog 格式）"""
+        event_count = (self.market_count + self.markets_per_event - 1) // self.markets_per_event
+        return [
+            {"slug": f"bench-event-{index}", "title": f"Benchmark event {index}", "status": "active"}
+            for index in range(event_count)
+        ]
+
+    def markets(self):
+        """市场数据字典列表（upsert_catalog 格式）"""
+        return [
+            {
+                "slug": f"bench-market-{index}",
+                "condition_id": _hash_hex("condition", index),
+                "question_id": _hash_hex("question", index),
+                "yes_token_id": str(yes_token),
+                "no_token_id": str(no_token),
+                "event_slug": self.event_slug(index),
+                "status": "active"
+            }
+            for index, (yes_token, no_token) in enumerate(self.token_ids)
+        ]
+
+
+class SyntheticLogs:
+    """逐区块的合成 OrderFilled 日志
+
+    每个区块的日志只由种子与区块号决定，与查询时的分块方式无关。
+    """
+
+    def __init__(self, markets, logs_per_block=5.0, seed=1, unknown_token_rate=0.0):
+        """初始化日志生成器
+
+        Args:
+            markets: SyntheticMarkets 实例
+            logs_per_block: 每个区块的平均日志数（实际数量在 0 到 2 倍之间均匀分布）
+            seed: 随机种子
+            unknown_token_rate: 使用目录之外 token 的日志比例
+        """
+        self.markets = markets
+        self.logs_per_block = logs_per_block
+        self.seed = seed
+        self.unknown_token_rate = unknown_token_rate
+
+    def block_logs(self, number):
+        """生成一个区块的日志
+
+        Args:
+            number: 区块号
+
+        Returns:
+            list: 原始 JSON-RPC 日志字典列表
+        """
+        rng = random.Random(self.seed * 1000003 + number)
+        count = rng.randint(0, int(self.logs_per_block * 2))
+        logs = []
+        for log_index in range(count):
+            if self.unknown_token_rate and rng.random() < self.unknown_token_rate:
+                token_id = rng.getrandbits(256)
+            else:
+                market = rng.choices(range(self.markets.market_count), cum_weights=self.markets.cum_weights)[0]
+                token_id = self.markets.token_ids[market][rng.randrange(2)]
+
+            # 代币数量 1-1000 个，价格 0.01-0.99 USDC
+            token_amount = rng.randint(1, 1000) * 10 ** 6
+            usdc_amount = token_amount * rng.randint(1, 99) // 100
+            if rng.random() < 0.5:
+                maker_asset, taker_asset, maker_amount, taker_amount = 0, token_id, usdc_amount, token_amount
+            else:
+                maker_asset, taker_asset, maker_amount, taker_amount = token_id, 0, token_amount, usdc_amount
+
+            logs.append({
+                "address": EXCHANGE_ADDRESSES[log_index % 2],
+                "topics": [
+                    ORDER_FILLED_TOPIC,
+                    _hash_hex("order", number, log_index),
+                    "0x" + _word(rng.getrandbits(160)),
+                    "0x" + _word(rng.getrandbits(160))
+                ],
+                "data": "0x" + "".join(_word(value) for value in (
+                    maker_asset, taker_asset, maker_amount, taker_amount, 0
+                )),
+                "blockNumber": hex(number),
+                "blockHash": block_hash(number),
+                "transactionHash": _hash_hex("tx", number, log_index),
+                "transactionIndex": hex(log_index),
+                "logIndex": hex(log_index),
+                "removed": False
+            })
+        return logs
+
+    def range_logs(self, from_block, to_block):
+        """生成区块范围内的全部日志"""
+        logs = []
+        for number in range(from_block, to_block + 1):
+            logs.extend(self.block_logs(number))
+        return logs
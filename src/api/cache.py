@@ -0,0 +1,131 @@
+"""API 响应缓存"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class CachedResponse:
+    """已序列化的响应"""
+
+    __slots__ = ('body', 'status', 'mimetype', 'etag')
+
+    def __init__(self, body, status, mimetype, etag):
+        self.body = body
+        self.status = status
+        self.mimetype = mimetype
+        self.etag = etag
+
+
+class ResponseCache:
+    """按数据版本号失效的 LRU 响应缓存
+
+    缓存内容只在数据版本号（索引器与市场发现每次提交时递增）变化时整体失效。
+    版本号本身最多每 generation_ttl 秒读取一次，命中的请求不需要访问数据库。
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, generation_ttl=1.0):
+        """初始化响应缓存
+
+        Args:
+            max_entries: 最大缓存条目数
+            max_bytes: 缓存响应体的最大总字节数
+            generation_ttl: 数据版本号的重新读取间隔（秒）
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.generation_ttl = generation_ttl
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._generation = None
+        self._generation_checked_at = 0.0
+        self._lock = threading.Lock()
+
+        # 命中统计
+        self.hits = 0
+        self.misses = 0
+
+    def generation(self, load_fn):
+        """获取当前数据版本号，必要时通过 load_fn 重新读取
+
+        Args:
+            load_fn: 读取版本号的函数
+
+        Returns:
+            int: 数据版本号
+        """
+        now = time.monotonic()
+        if self._generation is None or now - self._generation_checked_at >= self.generation_ttl:
+            generation = load_fn()
+            with self._lock:
+                if generation != self._generation:
+                    # 数据已变化，丢弃所有旧响应
+                    self._entries.clear()
+                    self._bytes = 0
+                    self._generation = generation
+                self._generation_checked_at = now
+        return self._generation
+
+    def get(self, key):
+        """获取缓存的响应
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            CachedResponse: 缓存的响应，未命中时返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, generation, body, status, mimetype):
+        """缓存响应，超出容量时淘汰最久未使用的条目
+
+        Args:
+            key: 缓存键
+            generation: 生成响应时的数据版本号，与当前版本号不一致时不缓存
+            body: 响应体字节
+            status: HTTP 状态码
+            mimetype: 响应类型
+
+        Returns:
+            CachedResponse: 缓存的响应
+        """
+        etag = f'{generation}-{hashlib.sha1(body).hexdigest()[:16]}'
+        entry = CachedResponse(body, status, mimetype, etag)
+        if len(body) > self.max_bytes:
+            return entry
+
+        with self._lock:
+            if generation != self._generation:
+                return entry
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous.body)
+            self._entries[key] = entry
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.body)
+        return entry
+
+    def stats(self):
+        """获取缓存统计
+
+        Returns:
+            dict: 命中统计与当前大小
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "generation": self._generation
+        }
@@ -1,26 +1,76 @@
 """API 服务器实现"""
 import argparse
+import base64
+import csv
+import functools
+import io
 import json
-from flask import Flask, request, jsonify, g
+import time
+from flask import Flask, Response, request, jsonify, g
 import sqlite3
+from src import metrics
+from src.api.cache import ResponseCache
+from src.db.codec import OUTCOME_CODES, blob_to_token_id, decode_trade
+from src.db.connection import connect_reader, connect_writer
+from src.db.rollups import CANDLE_INTERVALS, fetch_candles, fetch_market_stats, timestamp_to_epoch
 from src.db.schema import init_db
-from src.db.store import fetch_market_by_slug, fetch_market_by_token_id
+from src.db.store import (
+    fetch_market_by_slug, fetch_market_by_token_id, fetch_metadata, fetch_sync_states, get_data_generation
+)
 
 app = Flask(__name__)
 db_path = None
+response_cache = ResponseCache()
+
+# API 指标
+API_REQUESTS = metrics.Counter('polymarket_api_requests_total', 'API requests by route and status', ['endpoint', 'status'])
+API_SECONDS = metrics.Histogram('polymarket_api_request_seconds', 'API request latency by route', ['endpoint'])
+API_CACHE_LOOKUPS = metrics.Counter('polymarket_api_cache_lookups_total', 'Response cache lookups', ['result'])
+API_CACHE_BYTES = metrics.Gauge('polymarket_api_cache_bytes', 'Bytes held by the response cache')
+SYNC_STATE = metrics.Gauge('polymarket_sync_state', 'sync_state values read from the database', ['key'])
+DB_METADATA = metrics.Gauge('polymarket_db_metadata', 'metadata values read from the database', ['key'])
+
+
+# 没有交易的市场返回的统计
+EMPTY_MARKET_STATS = {
+    'total_trades': 0,
+    'total_volume': 0,
+    'volume_24h': 0,
+    'last_price': None,
+    'last_trade_timestamp': None,
+    'first_trade_block': None,
+    'last_trade_block': None
+}
 
 
 def get_db_connection():
     """获取数据库连接
     
-    使用Flask的g对象为每个请求创建独立的数据库连接，避免线程安全问题
+    使用Flask的g对象为每个请求创建独立的只读数据库连接，避免线程安全问题
     """
     if 'db' not in g:
-        g.db = sqlite3.connect(db_path)
+        g.db = connect_reader(db_path)
         g.db.row_factory = sqlite3.Row
     return g.db
 
 
+@app.before_request
+def start_request_timer():
+    """记录请求开始时间"""
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """记录请求计数与耗时（流式导出只计到开始发送响应体为止）"""
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    API_REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    started = g.get('request_started')
+    if started is not None:
+        API_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+    return response
+
+
 @app.teardown_appcontext
 def close_db_connection(exception):
     """关闭数据库连接
@@ -32,7 +82,37 @@ def close_db_connection(exception):
         db.close()
 
 
+def cached_response(view):
+    """缓存视图的序列化响应，并支持 ETag / If-None-Match
+    
+    缓存键为请求路径与查询参数，索引器或市场发现提交数据后整体失效。
+    只缓存 200 与 404 响应。
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        generation = response_cache.generation(lambda: get_data_generation(get_db_connection()))
+        key = request.full_path
+        
+        entry = response_cache.get(key)
+        API_CACHE_LOOKUPS.inc(result='miss' if entry is None else 'hit')
+        if entry is None:
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code not in (200, 404):
+                return response
+            entry = response_cache.put(key, generation, response.get_data(), response.status_code, response.mimetype)
+        
+        if entry.status == 200 and request.if_none_match.contains(entry.etag):
+            response = Response(status=304)
+        else:
+            response = Response(entry.body, status=entry.status, mimetype=entry.mimetype)
+        response.set_etag(entry.etag)
+        return response
+    
+    return wrapper
+
+
 @app.route('/markets/<slug>', methods=['GET'])
+@cached_response
 def get_market(slug):
     """获取市场信息
     
@@ -58,67 +138,313 @@ def get_market(slug):
         "collateral_token": market["collateral_token"],
         "yes_token_id": market["yes_token_id"],
         "no_token_id": market["no_token_id"],
-        "status": market["status"]
+        "status": market["status"],
+        "stats": fetch_market_stats(db_conn, [market["id"]]).get(market["id"], EMPTY_MARKET_STATS)
     }
     
     return jsonify(response)
 
 
-@app.route('/markets/<slug>/trades', methods=['GET'])
-def get_market_trades(slug):
-    """获取市场交易记录
+def encode_trade_cursor(block_number, log_index):
+    """将 (block_number, log_index) 编码为不透明的分页游标
     
     Args:
-        slug: 市场 slug
+        block_number: 区块高度
+        log_index: 日志索引
         
     Returns:
-        JSON: 交易记录列表
+        str: 游标字符串
     """
-    db_conn = get_db_connection()
+    raw = f"{block_number}:{log_index}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_trade_cursor(cursor):
+    """解码分页游标
     
-    # 获取市场信息
-    market = fetch_market_by_slug(db_conn, slug)
-    if not market:
-        return jsonify({"error": "Market not found"}), 404
+    Args:
+        cursor: 游标字符串
+        
+    Returns:
+        tuple: (block_number, log_index)
+        
+    Raises:
+        ValueError: 游标格式错误
+    """
+    padded = cursor + '=' * (-len(cursor) % 4)
+    block_number, log_index = base64.urlsafe_b64decode(padded.encode()).decode().split(':')
+    return int(block_number), int(log_index)
+
+
+def query_trades_page(db_conn, market_id, outcome=None):
+    """按键集分页查询交易记录
     
-    # 获取查询参数
+    从请求参数读取 limit、cursor 与 offset。提供 cursor 时返回 (block_number, log_index)
+    严格小于游标的记录，利用 (market_id, block_number DESC, log_index DESC) 索引直接定位，
+    深分页与首页的开销相同；offset 仅为兼容保留。
+    
+    Args:
+        db_conn: 数据库连接
+        market_id: 市场 ID
+        outcome: 可选的结果过滤（YES/NO）
+        
+    Returns:
+        tuple: (响应 JSON 对象, HTTP 状态码)，交易已从存储编码解码
+    """
     limit = request.args.get('limit', 100, type=int)
     offset = request.args.get('offset', 0, type=int)
-    cursor = request.args.get('cursor', 0, type=int)
-    
-    # 计算实际偏移量
-    actual_offset = max(offset, cursor)
-    
-    # 查询交易记录
+    cursor_param = request.args.get('cursor')
+    
+    conditions = ['market_id = ?']
+    params = [market_id]
+    if outcome:
+        conditions.append('outcome = ?')
+        params.append(OUTCOME_CODES[outcome])
+    if cursor_param:
+        try:
+            cursor_block, cursor_log_index = decode_trade_cursor(cursor_param)
+        except (ValueError, UnicodeDecodeError):
+            return {"error": "Invalid cursor"}, 400
+        conditions.append('(block_number, log_index) < (?, ?)')
+        params.extend([cursor_block, cursor_log_index])
+        offset = 0
+    
+    params.extend([limit, offset])
     cursor = db_conn.cursor()
-    cursor.execute('''
+    cursor.execute(f'''
     SELECT 
         id, tx_hash, log_index, maker, taker, side, outcome, 
         price, size, block_number, timestamp 
     FROM trades 
-    WHERE market_id = ? 
-    ORDER BY timestamp DESC 
+    WHERE {' AND '.join(conditions)}
+    ORDER BY block_number DESC, log_index DESC 
     LIMIT ? OFFSET ?
-    ''', (market["id"], limit, actual_offset))
+    ''', params)
     
     trades = []
     for row in cursor.fetchall():
-        trade = {
-            "trade_id": row[0],
-            "tx_hash": row[1],
-            "log_index": row[2],
-            "maker": row[3],
-            "taker": row[4],
-            "side": row[5],
-            "outcome": row[6],
-            "price": row[7],
-            "size": row[8],
-            "block_number": row[9],
-            "timestamp": row[10]
-        }
+        trade = {"trade_id": row[0]}
+        trade.update(decode_trade(*row[1:]))
         trades.append(trade)
     
-    return jsonify(trades)
+    # 满页时返回下一页游标
+    next_cursor = None
+    if trades and len(trades) == limit:
+        next_cursor = encode_trade_cursor(trades[-1]["block_number"], trades[-1]["log_index"])
+    
+    return {"trades": trades, "next_cursor": next_cursor}, 200
+
+
+@app.route('/markets/<slug>/trades', methods=['GET'])
+def get_market_trades(slug):
+    """获取市场交易记录
+    
+    Args:
+        slug: 市场 slug
+        
+    Returns:
+        JSON: 交易记录列表与下一页游标
+    """
+    db_conn = get_db_connection()
+    
+    # 获取市场信息
+    market = fetch_market_by_slug(db_conn, slug)
+    if not market:
+        return jsonify({"error": "Market not found"}), 404
+    
+    response, status = query_trades_page(db_conn, market["id"])
+    
+    # 总数来自 market_stats，无需扫描 trades
+    stats = fetch_market_stats(db_conn, [market["id"]]).get(market["id"], EMPTY_MARKET_STATS)
+    return jsonify(response), status, {'X-Total-Count': str(stats['total_trades'])}
+
+
+# 导出的交易字段（与数据库列及 decode_trade 的输出一致）
+EXPORT_COLUMNS = (
+    'tx_hash', 'log_index', 'maker', 'taker', 'side', 'outcome',
+    'price', 'size', 'block_number', 'timestamp'
+)
+
+# 导出时每次从游标读取的行数
+EXPORT_FETCH_SIZE = 1000
+
+
+def parse_epoch(value):
+    """解析 Unix 秒或 ISO 8601 时间参数
+    
+    Args:
+        value: 时间参数字符串
+        
+    Returns:
+        int: Unix 秒
+    """
+    try:
+        return int(float(value))
+    except ValueError:
+        return timestamp_to_epoch(value)
+
+
+def iter_trade_rows(market_id, conditions, params):
+    """按区块顺序逐批读取交易记录
+    
+    使用独立的只读连接与服务端游标，每次只在内存中保留 EXPORT_FETCH_SIZE 行。
+    
+    Args:
+        market_id: 市场 ID
+        conditions: 额外的 WHERE 条件列表
+        params: 条件参数列表
+        
+    Yields:
+        dict: 已解码的交易记录，键顺序与 EXPORT_COLUMNS 一致
+    """
+    conn = connect_reader(db_path, check_same_thread=False)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+        SELECT {', '.join(EXPORT_COLUMNS)}
+        FROM trades
+        WHERE {' AND '.join(['market_id = ?'] + conditions)}
+        ORDER BY block_number, log_index
+        ''', [market_id] + params)
+        
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                yield decode_trade(*row)
+    finally:
+        conn.close()
+
+
+def generate_ndjson(rows):
+    """将交易记录编码为 NDJSON 流"""
+    buffer = []
+    for row in rows:
+        buffer.append(json.dumps(row))
+        if len(buffer) >= EXPORT_FETCH_SIZE:
+            yield '\n'.join(buffer) + '\n'
+            buffer = []
+    if buffer:
+        yield '\n'.join(buffer) + '\n'
+
+
+def generate_csv(rows):
+    """将交易记录编码为 CSV 流，首先输出表头"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(EXPORT_COLUMNS)
+    yield output.getvalue()
+    
+    output.seek(0)
+    output.truncate()
+    count = 0
+    for row in rows:
+        writer.writerow(row.values())
+        count += 1
+        if count >= EXPORT_FETCH_SIZE:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+            count = 0
+    if count:
+        yield output.getvalue()
+
+
+@app.route('/markets/<slug>/trades/export', methods=['GET'])
+def export_market_trades(slug):
+    """流式导出市场交易记录
+    
+    查询参数：format（ndjson 或 csv，默认 ndjson）、from_block、to_block、
+    from_time、to_time（Unix 秒或 ISO 8601）。记录按区块顺序输出，
+    无论导出多少行内存占用都保持不变。
+    
+    Args:
+        slug: 市场 slug
+        
+    Returns:
+        Response: NDJSON 或 CSV 流
+    """
+    db_conn = get_db_connection()
+    market = fetch_market_by_slug(db_conn, slug)
+    if not market:
+        return jsonify({"error": "Market not found"}), 404
+    
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({"error": "Unsupported format, use ndjson or csv"}), 400
+    
+    conditions = []
+    params = []
+    try:
+        for name, column, operator, parse in (
+            ('from_block', 'block_number', '>=', int),
+            ('to_block', 'block_number', '<=', int),
+            ('from_time', 'timestamp', '>=', parse_epoch),
+            ('to_time', 'timestamp', '<=', parse_epoch),
+        ):
+            value = request.args.get(name)
+            if value is not None:
+                conditions.append(f'{column} {operator} ?')
+                params.append(parse(value))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid bound: {str(e)}"}), 400
+    
+    rows = iter_trade_rows(market["id"], conditions, params)
+    if export_format == 'csv':
+        body, mimetype = generate_csv(rows), 'text/csv'
+    else:
+        body, mimetype = generate_ndjson(rows), 'application/x-ndjson'
+    
+    response = Response(body, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{slug}-trades.{export_format}"'
+    return response
+
+
+@app.route('/markets/<slug>/candles', methods=['GET'])
+@cached_response
+def get_market_candles(slug):
+    """获取市场 K 线
+    
+    查询参数：interval（1m/1h/1d，默认 1h）、from、to（Unix 秒或 ISO 8601）、
+    outcome（YES/NO，可选）、limit（默认 1000）。
+    
+    Args:
+        slug: 市场 slug
+        
+    Returns:
+        JSON: K 线列表
+    """
+    db_conn = get_db_connection()
+    market = fetch_market_by_slug(db_conn, slug)
+    if not market:
+        return jsonify({"error": "Market not found"}), 404
+    
+    interval = request.args.get('interval', '1h')
+    if interval not in CANDLE_INTERVALS:
+        return jsonify({"error": f"Unsupported interval, use one of {', '.join(CANDLE_INTERVALS)}"}), 400
+    
+    outcome = request.args.get('outcome')
+    if outcome and outcome not in OUTCOME_CODES:
+        return jsonify({"error": f"Unsupported outcome, use one of {', '.join(OUTCOME_CODES)}"}), 400
+    
+    try:
+        from_time = parse_epoch(request.args['from']) if request.args.get('from') else None
+        to_time = parse_epoch(request.args['to']) if request.args.get('to') else None
+    except ValueError as e:
+        return jsonify({"error": f"Invalid time bound: {str(e)}"}), 400
+    
+    candles = fetch_candles(
+        db_conn,
+        market["id"],
+        interval,
+        outcome=outcome,
+        from_time=from_time,
+        to_time=to_time,
+        limit=request.args.get('limit', 1000, type=int)
+    )
+    
+    return jsonify(candles)
 
 
 @app.route('/tokens/<token_id>/trades', methods=['GET'])
@@ -129,51 +455,26 @@ def get_token_trades(token_id):
         token_id: 代币 ID
         
     Returns:
-        JSON: 交易记录列表
+        JSON: 交易记录列表与下一页游标
     """
     db_conn = get_db_connection()
     
     # 通过 token_id 找到所属市场
-    market = fetch_market_by_token_id(db_conn, token_id)
+    try:
+        market = fetch_market_by_token_id(db_conn, token_id)
+    except ValueError:
+        market = None
     if not market:
         return jsonify({"error": "Token not found in any market"}), 404
     
-    # 获取查询参数
-    limit = request.args.get('limit', 100, type=int)
-    
-    # 查询交易记录
-    cursor = db_conn.cursor()
-    cursor.execute('''
-    SELECT 
-        id, tx_hash, log_index, maker, taker, side, outcome, 
-        price, size, block_number, timestamp 
-    FROM trades 
-    WHERE market_id = ? 
-    ORDER BY timestamp DESC 
-    LIMIT ?
-    ''', (market["id"], limit))
-    
-    trades = []
-    for row in cursor.fetchall():
-        trade = {
-            "trade_id": row[0],
-            "tx_hash": row[1],
-            "log_index": row[2],
-            "maker": row[3],
-            "taker": row[4],
-            "side": row[5],
-            "outcome": row[6],
-            "price": row[7],
-            "size": row[8],
-            "block_number": row[9],
-            "timestamp": row[10]
-        }
-        trades.append(trade)
-    
-    return jsonify(trades)
+    # 市场中的 token_id 为规范化的十进制字符串
+    outcome = "YES" if str(int(token_id)) == market["yes_token_id"] else "NO"
+    response, status = query_trades_page(db_conn, market["id"], outcome)
+    return jsonify(response), status
 
 
 @app.route('/events/<slug>', methods=['GET'])
+@cached_response
 def get_event(slug):
     """获取事件信息
     
@@ -207,6 +508,7 @@ def get_event(slug):
 
 
 @app.route('/events/<slug>/markets', methods=['GET'])
+@cached_response
 def get_event_markets(slug):
     """获取事件下的所有市场
     
@@ -245,16 +547,37 @@ def get_event_markets(slug):
             "question_id": row[3],
             "oracle": row[4],
             "collateral_token": row[5],
-            "yes_token_id": row[6],
-            "no_token_id": row[7],
+            "yes_token_id": blob_to_token_id(row[6]),
+            "no_token_id": blob_to_token_id(row[7]),
             "status": row[8],
             "created_at": row[9]
         }
         markets.append(market)
     
+    # 一次查询附加所有市场的统计
+    stats = fetch_market_stats(db_conn, [market["id"] for market in markets])
+    for market in markets:
+        market["stats"] = stats.get(market["id"], EMPTY_MARKET_STATS)
+    
     return jsonify(markets)
 
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """输出 Prometheus 文本格式的指标
+    
+    包含本进程的请求指标、响应缓存状态，以及从数据库读取的同步状态（索引进度）与元数据（数据版本号等）。
+    索引器进程内的指标通过其独立导出端口（--metrics-port）获取。
+    """
+    db_conn = get_db_connection()
+    for key, value in fetch_sync_states(db_conn).items():
+        SYNC_STATE.set(value, key=key)
+    for key, value in fetch_metadata(db_conn).items():
+        DB_METADATA.set(value, key=key)
+    API_CACHE_BYTES.set(response_cache.stats()['bytes'])
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 def main():
     """主函数"""
     global db_path
@@ -262,13 +585,19 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--db', default='./data/demo_indexer.db', help='数据库路径')
     parser.add_argument('--port', type=int, default=8000, help='服务器端口')
+    parser.add_argument('--cache-entries', type=int, default=1024, help='响应缓存的最大条目数')
+    parser.add_argument('--cache-mb', type=int, default=64, help='响应缓存的最大容量（MB）')
     args = parser.parse_args()
     
     # 设置数据库路径
     db_path = args.db
     
+    # 配置响应缓存
+    response_cache.max_entries = args.cache_entries
+    response_cache.max_bytes = args.cache_mb * 1024 * 1024
+    
     # 初始化数据库（创建表结构）
-    temp_conn = sqlite3.connect(db_path)
+    temp_conn = connect_writer(db_path)
     init_db(temp_conn)
     temp_conn.close()
     
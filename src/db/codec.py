@@ -0,0 +1,130 @@
+"""存储编码与解码
+
+trades 等大表使用紧凑编码：哈希与地址存为 32/20 字节 BLOB，价格与数量存为
+百万分之一单位的整数，方向与结果存为小整数枚举，时间戳存为 Unix 秒，
+token_id 存为 32 字节大端 BLOB。对外（API、导出）统一解码为十六进制字符串、
+小数、枚举名称与 ISO 时间字符串。
+"""
+from datetime import datetime
+
+
+# 价格与数量的定点精度（USDC 与条件代币均为 6 位小数）
+AMOUNT_SCALE = 10 ** 6
+
+# 方向与结果枚举，列表下标即存储值
+SIDES = ('BUY', 'SELL')
+OUTCOMES = ('YES', 'NO')
+SIDE_CODES = {name: code for code, name in enumerate(SIDES)}
+OUTCOME_CODES = {name: code for code, name in enumerate(OUTCOMES)}
+
+# token_id 为 uint256
+TOKEN_ID_SIZE = 32
+
+
+def hex_to_blob(value):
+    """将十六进制字符串（可带 0x 前缀）或字节转换为 bytes
+
+    Args:
+        value: 十六进制字符串、bytes 或 None
+
+    Returns:
+        bytes: 原始字节，value 为空时返回 None
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith('0x') else value)
+    return bytes(value)
+
+
+def blob_to_hex(value):
+    """将字节转换为带 0x 前缀的小写十六进制字符串
+
+    Args:
+        value: bytes 或 None
+
+    Returns:
+        str: 十六进制字符串，value 为 None 时返回 None
+    """
+    if value is None:
+        return None
+    return '0x' + bytes(value).hex()
+
+
+def token_id_to_blob(token_id):
+    """将十进制 token_id 转换为 32 字节大端 BLOB
+
+    Args:
+        token_id: 十进制字符串、整数、已编码的 bytes 或 None
+
+    Returns:
+        bytes: 32 字节 BLOB，token_id 为空时返回 None
+
+    Raises:
+        ValueError: token_id 不是合法的 uint256
+    """
+    if token_id is None or token_id == '':
+        return None
+    if isinstance(token_id, (bytes, bytearray, memoryview)):
+        return bytes(token_id)
+    value = int(token_id)
+    if value < 0 or value.bit_length() > TOKEN_ID_SIZE * 8:
+        raise ValueError(f"Invalid token id: {token_id}")
+    return value.to_bytes(TOKEN_ID_SIZE, 'big')
+
+
+def blob_to_token_id(value):
+    """将 32 字节 BLOB 转换为十进制 token_id 字符串
+
+    Args:
+        value: bytes 或 None
+
+    Returns:
+        str: 十进制字符串，value 为 None 时返回 None
+    """
+    if value is None:
+        return None
+    return str(int.from_bytes(value, 'big'))
+
+
+def to_micro(value):
+    """将小数转换为百万分之一单位的整数"""
+    if value is None:
+        return None
+    return round(float(value) * AMOUNT_SCALE)
+
+
+def from_micro(value):
+    """将百万分之一单位的整数转换为小数"""
+    if value is None:
+        return None
+    return value / AMOUNT_SCALE
+
+
+def epoch_to_iso(value):
+    """将 Unix 秒转换为本地时间的 ISO 字符串"""
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value).isoformat()
+
+
+def decode_trade(tx_hash, log_index, maker, taker, side, outcome, price, size, block_number, timestamp):
+    """将一行紧凑编码的交易解码为对外格式
+
+    参数顺序与 trades 表的列顺序一致（不含 id 与 market_id），可直接用 decode_trade(*row) 调用。
+
+    Returns:
+        dict: tx_hash、log_index、maker、taker、side、outcome、price、size、block_number、timestamp
+    """
+    return {
+        'tx_hash': blob_to_hex(tx_hash),
+        'log_index': log_index,
+        'maker': blob_to_hex(maker),
+        'taker': blob_to_hex(taker),
+        'side': SIDES[side],
+        'outcome': OUTCOMES[outcome],
+        'price': from_micro(price),
+        'size': from_micro(size),
+        'block_number': block_number,
+        'timestamp': epoch_to_iso(timestamp)
+    }
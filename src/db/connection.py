@@ -0,0 +1,84 @@
+"""数据库连接工厂"""
+import os
+import sqlite3
+from urllib.request import pathname2url
+
+
+# 写连接配置：WAL 模式下读写互不阻塞，synchronous=NORMAL 在 WAL 下仍能保证数据库一致性
+WRITER_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -65536),       # 64 MiB 页缓存（负数表示 KiB）
+    ('mmap_size', 268435456),     # 256 MiB 内存映射
+    ('temp_store', 'MEMORY'),
+)
+
+# 只读连接配置：journal_mode 由写连接设置并持久化在数据库文件中
+READER_PRAGMAS = (
+    ('query_only', 'ON'),
+    ('cache_size', -32768),       # 32 MiB 页缓存
+    ('mmap_size', 268435456),
+    ('temp_store', 'MEMORY'),
+)
+
+# 等待锁的最长时间（秒）
+BUSY_TIMEOUT_SECONDS = 30
+
+
+def _apply_pragmas(conn, pragmas):
+    """依次执行 PRAGMA 设置"""
+    for name, value in pragmas:
+        conn.execute(f'PRAGMA {name} = {value}')
+
+
+def connect_writer(db_path, check_same_thread=True):
+    """创建写连接
+
+    Args:
+        db_path: 数据库文件路径
+        check_same_thread: 是否限制连接只能在创建它的线程中使用
+
+    Returns:
+        sqlite3.Connection: 数据库连接
+    """
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=check_same_thread)
+    _apply_pragmas(conn, WRITER_PRAGMAS)
+    return conn
+
+
+def database_path(conn):
+    """获取连接的主数据库文件路径
+
+    Args:
+        conn: 数据库连接
+
+    Returns:
+        str: 数据库文件路径，内存数据库返回 None
+    """
+    for _, name, path in conn.execute('PRAGMA database_list').fetchall():
+        if name == 'main':
+            return path or None
+    return None
+
+
+def connect_reader(db_path, check_same_thread=True):
+    """创建只读连接
+
+    Args:
+        db_path: 数据库文件路径，数据库必须已经存在
+        check_same_thread: 是否限制连接只能在创建它的线程中使用
+
+    Returns:
+        sqlite3.Connection: 数据库连接
+    """
+    if db_path == ':memory:':
+        conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=check_same_thread)
+    else:
+        conn = sqlite3.connect(
+            f'file:{pathname2url(os.path.abspath(db_path))}?mode=ro',
+            uri=True,
+            timeout=BUSY_TIMEOUT_SECONDS,
+            check_same_thread=check_same_thread
+        )
+    _apply_pragmas(conn, READER_PRAGMAS)
+    return conn
@@ -0,0 +1,178 @@
+"""存储格式迁移工具
+
+把旧格式（v0/v1：十六进制 TEXT 哈希与地址、浮点价格与数量、字符串枚举、ISO 时间戳、
+十进制 token_id）的数据库原地升级为当前的紧凑编码（见 src/db/codec.py）。
+
+用法：
+    python -m src.db.migrate --db ./data/demo_indexer.db
+
+迁移在单个写事务中完成，失败时数据库保持原样；完成后执行 VACUUM 回收空间。
+K 线与市场统计由迁移后的交易重新计算。
+"""
+import argparse
+import os
+import time
+
+from src.db.codec import OUTCOME_CODES, SIDE_CODES, hex_to_blob, to_micro, token_id_to_blob
+from src.db.connection import connect_writer
+from src.db.rollups import (
+    ROLLUP_COLUMNS, aggregate_candles, aggregate_market_stats, refresh_rolling_volume,
+    timestamp_to_epoch, upsert_candles, upsert_market_stats
+)
+from src.db.schema import SCHEMA_VERSION, create_tables, get_schema_version, move_legacy_metadata, table_exists
+
+
+# 需要重建的表（按依赖顺序），迁移时先重命名为 legacy_<表名>
+MIGRATED_TABLES = ('markets', 'tokens', 'trades', 'blocks', 'candles', 'market_stats')
+
+# 从旧表复制数据到新表的语句；K 线与市场统计不复制，迁移后重新计算
+COPY_STATEMENTS = {
+    'markets': '''
+    INSERT INTO markets (
+        id, event_id, slug, condition_id, question_id, oracle, collateral_token,
+        yes_token_id, no_token_id, enable_neg_risk, status, created_at, updated_at
+    )
+    SELECT
+        id, event_id, slug, condition_id, question_id, oracle, collateral_token,
+        token_blob(yes_token_id), token_blob(no_token_id), enable_neg_risk, status, created_at, updated_at
+    FROM legacy_markets
+    ''',
+    'tokens': '''
+    INSERT OR IGNORE INTO tokens (token_id, market_id, outcome)
+    SELECT token_blob(token_id), market_id, outcome_code(outcome) FROM legacy_tokens
+    ''',
+    'trades': '''
+    INSERT INTO trades (
+        id, market_id, tx_hash, log_index, maker, taker, side, outcome,
+        price, size, block_number, timestamp
+    )
+    SELECT
+        id, market_id, hex_blob(tx_hash), log_index, hex_blob(maker), hex_blob(taker),
+        side_code(side), outcome_code(outcome), micro(price), micro(size), block_number, epoch(timestamp)
+    FROM legacy_trades
+    ORDER BY id
+    ''',
+    'blocks': '''
+    INSERT INTO blocks (number, hash, parent_hash, timestamp)
+    SELECT number, hex_blob(hash), hex_blob(parent_hash), timestamp FROM legacy_blocks
+    ''',
+}
+
+
+def _register_functions(conn):
+    """注册迁移语句使用的转换函数"""
+    conn.create_function('hex_blob', 1, hex_to_blob, deterministic=True)
+    conn.create_function('token_blob', 1, token_id_to_blob, deterministic=True)
+    conn.create_function('micro', 1, to_micro, deterministic=True)
+    conn.create_function('side_code', 1, lambda value: SIDE_CODES.get(value), deterministic=True)
+    conn.create_function('outcome_code', 1, lambda value: OUTCOME_CODES.get(value), deterministic=True)
+    conn.create_function('epoch', 1, lambda value: None if value is None else timestamp_to_epoch(value), deterministic=True)
+
+
+def _legacy_indexes(conn, tables):
+    """获取旧表上的显式索引名（重命名后索引名不变，会与新表的索引冲突）"""
+    placeholders = ','.join('?' * len(tables))
+    rows = conn.execute(f'''
+    SELECT name FROM sqlite_master
+    WHERE type = 'index' AND sql IS NOT NULL AND tbl_name IN ({placeholders})
+    ''', tables).fetchall()
+    return [row[0] for row in rows]
+
+
+def rebuild_all_rollups(cursor):
+    """按市场逐个重新计算全部 K 线与市场统计，内存占用与单个市场的交易数成正比
+
+    Args:
+        cursor: 数据库游标
+    """
+    cursor.execute('DELETE FROM candles')
+    cursor.execute('DELETE FROM market_stats')
+    cursor.execute('SELECT DISTINCT market_id FROM trades')
+    for (market_id,) in cursor.fetchall():
+        cursor.execute(f'SELECT {ROLLUP_COLUMNS} FROM trades WHERE market_id = ?', (market_id,))
+        rows = cursor.fetchall()
+        upsert_candles(cursor, aggregate_candles(rows))
+        upsert_market_stats(cursor, aggregate_market_stats(rows))
+    refresh_rolling_volume(cursor)
+
+
+def migrate_db(conn, vacuum=True):
+    """把数据库原地升级到当前存储格式
+
+    Args:
+        conn: 数据库写连接
+        vacuum: 迁移完成后是否执行 VACUUM 回收旧数据占用的页
+
+    Returns:
+        dict: from_version、to_version、迁移的交易数量与耗时
+    """
+    start_time = time.time()
+    from_version = get_schema_version(conn)
+    if from_version >= SCHEMA_VERSION or not table_exists(conn, 'trades'):
+        return {"from_version": from_version, "to_version": from_version, "trades": 0, "seconds": 0.0}
+
+    _register_functions(conn)
+    # 重命名旧表时不改写其他表中引用它的外键定义
+    conn.execute('PRAGMA legacy_alter_table = ON')
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        cursor = conn.cursor()
+        tables = [table for table in MIGRATED_TABLES if table_exists(conn, table)]
+        for index_name in _legacy_indexes(conn, tables):
+            cursor.execute(f'DROP INDEX {index_name}')
+        for table in tables:
+            cursor.execute(f'ALTER TABLE {table} RENAME TO legacy_{table}')
+
+        create_tables(cursor)
+        move_legacy_metadata(cursor)
+        for table in tables:
+            if table in COPY_STATEMENTS:
+                cursor.execute(COPY_STATEMENTS[table])
+            cursor.execute(f'DROP TABLE legacy_{table}')
+
+        rebuild_all_rollups(cursor)
+        trade_count = cursor.execute('SELECT COUNT(*) FROM trades').fetchone()[0]
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute('PRAGMA legacy_alter_table = OFF')
+
+    if vacuum:
+        conn.execute('VACUUM')
+
+    return {
+        "from_version": from_version,
+        "to_version": SCHEMA_VERSION,
+        "trades": trade_count,
+        "seconds": round(time.time() - start_time, 2)
+    }
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='把数据库升级到当前存储格式')
+    parser.add_argument('--db', default='./data/demo_indexer.db', help='数据库路径')
+    parser.add_argument('--no-vacuum', action='store_true', help='迁移后不执行 VACUUM')
+    args = parser.parse_args()
+
+    size_before = os.path.getsize(args.db)
+    conn = connect_writer(args.db)
+    try:
+        result = migrate_db(conn, vacuum=not args.no_vacuum)
+        # 把 WAL 中的页写回主文件，便于比较文件大小
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        conn.close()
+
+    result["size_before"] = size_before
+    result["size_after"] = os.path.getsize(args.db)
+    print(result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,410 @@
+"""交易汇总（K 线与市场统计）的增量维护
+
+汇总表沿用 trades 的紧凑编码：价格与成交量为百万分之一单位整数，outcome 为枚举下标，
+时间为 Unix 秒。整数求和没有浮点误差，增量维护与全量重算的结果完全一致。
+"""
+import time
+from datetime import datetime
+from src.db.codec import AMOUNT_SCALE, OUTCOME_CODES, OUTCOMES, epoch_to_iso, from_micro
+
+
+# K 线周期及其秒数
+CANDLE_INTERVALS = {
+    '1m': 60,
+    '1h': 3600,
+    '1d': 86400,
+}
+
+# 滚动成交量窗口（秒）
+ROLLING_WINDOW_SECONDS = 86400
+
+# 汇总所需的交易字段，从 trades 表按此顺序读取
+ROLLUP_COLUMNS = 'market_id, outcome, price, size, block_number, log_index, timestamp'
+
+
+def timestamp_to_epoch(value):
+    """将交易时间戳转换为 Unix 秒
+
+    Args:
+        value: Unix 秒或 ISO 时间字符串
+
+    Returns:
+        int: Unix 秒
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    return int(datetime.fromisoformat(value).timestamp())
+
+
+def aggregate_candles(rows, min_buckets=None):
+    """把交易聚合为各周期的 K 线
+
+    Args:
+        rows: 按 ROLLUP_COLUMNS 顺序排列的交易元组
+        min_buckets: 可选的 {(market_id, outcome, interval): 最小 bucket_start}，只保留不早于该值的桶
+
+    Returns:
+        dict: (market_id, outcome, interval, bucket_start) → K 线列表
+              [open, high, low, close, volume, trade_count, first_block, first_log_index, last_block, last_log_index]
+    """
+    candles = {}
+
+    # 按链上顺序处理，保证开盘价与收盘价正确
+    for market_id, outcome, price, size, block_number, log_index, timestamp in sorted(rows, key=lambda row: (row[4], row[5])):
+        for interval, seconds in CANDLE_INTERVALS.items():
+            bucket_start = timestamp - timestamp % seconds
+            if min_buckets is not None:
+                min_bucket = min_buckets.get((market_id, outcome, interval))
+                if min_bucket is None or bucket_start < min_bucket:
+                    continue
+
+            key = (market_id, outcome, interval, bucket_start)
+            candle = candles.get(key)
+            if candle is None:
+                candles[key] = [price, price, price, price, size, 1, block_number, log_index, block_number, log_index]
+            else:
+                if price > candle[1]:
+                    candle[1] = price
+                if price < candle[2]:
+                    candle[2] = price
+                candle[3] = price
+                candle[4] += size
+                candle[5] += 1
+                candle[8] = block_number
+                candle[9] = log_index
+
+    return candles
+
+
+def upsert_candles(cursor, candles):
+    """把增量 K 线合并进 candles 表（在调用方的事务中执行）
+
+    开盘价与收盘价按 (区块, 日志索引) 比较先后，乱序写入（如并行回填）时结果依然正确。
+
+    Args:
+        cursor: 数据库游标
+        candles: aggregate_candles 的返回值
+    """
+    cursor.executemany('''
+    INSERT INTO candles (
+        market_id, outcome, interval, bucket_start, open, high, low, close, volume, trade_count,
+        first_block, first_log_index, last_block, last_log_index
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (market_id, interval, outcome, bucket_start) DO UPDATE SET
+        open = CASE WHEN (excluded.first_block, excluded.first_log_index) < (first_block, first_log_index)
+                    THEN excluded.open ELSE open END,
+        first_block = CASE WHEN (excluded.first_block, excluded.first_log_index) < (first_block, first_log_index)
+                           THEN excluded.first_block ELSE first_block END,
+        first_log_index = CASE WHEN (excluded.first_block, excluded.first_log_index) < (first_block, first_log_index)
+                               THEN excluded.first_log_index ELSE first_log_index END,
+        high = max(high, excluded.high),
+        low = min(low, excluded.low),
+        close = CASE WHEN (excluded.last_block, excluded.last_log_index) > (last_block, last_log_index)
+                     THEN excluded.close ELSE close END,
+        last_block = CASE WHEN (excluded.last_block, excluded.last_log_index) > (last_block, last_log_index)
+                          THEN excluded.last_block ELSE last_block END,
+        last_log_index = CASE WHEN (excluded.last_block, excluded.last_log_index) > (last_block, last_log_index)
+                              THEN excluded.last_log_index ELSE last_log_index END,
+        volume = volume + excluded.volume,
+        trade_count = trade_count + excluded.trade_count
+    ''', [key + tuple(candle) for key, candle in candles.items()])
+
+
+def yes_price(outcome, price):
+    """把成交价换算为 YES 价格（NO 价格 = 1 - YES 价格，均为百万分之一单位）"""
+    return price if outcome == OUTCOME_CODES['YES'] else AMOUNT_SCALE - price
+
+
+def aggregate_market_stats(rows, now=None):
+    """把交易聚合为按市场的统计增量
+
+    Args:
+        rows: 按 ROLLUP_COLUMNS 顺序排列的交易元组
+        now: 计算 24 小时成交量所用的当前时间（Unix 秒），默认取当前时间
+
+    Returns:
+        dict: market_id → [trade_count, volume, volume_24h, first_block, first_log_index,
+                           last_block, last_log_index, last_price, last_trade_timestamp]
+    """
+    window_start = (now if now is not None else time.time()) - ROLLING_WINDOW_SECONDS
+    stats = {}
+
+    for market_id, outcome, price, size, block_number, log_index, timestamp in sorted(rows, key=lambda row: (row[4], row[5])):
+        recent_size = size if timestamp >= window_start else 0
+
+        entry = stats.get(market_id)
+        if entry is None:
+            stats[market_id] = [
+                1, size, recent_size, block_number, log_index,
+                block_number, log_index, yes_price(outcome, price), timestamp
+            ]
+        else:
+            entry[0] += 1
+            entry[1] += size
+            entry[2] += recent_size
+            entry[5] = block_number
+            entry[6] = log_index
+            entry[7] = yes_price(outcome, price)
+            entry[8] = timestamp
+
+    return stats
+
+
+def upsert_market_stats(cursor, stats):
+    """把统计增量合并进 market_stats 表（在调用方的事务中执行）
+
+    Args:
+        cursor: 数据库游标
+        stats: aggregate_market_stats 的返回值
+    """
+    cursor.executemany('''
+    INSERT INTO market_stats (
+        market_id, total_trades, total_volume, volume_24h, first_trade_block, first_trade_log_index,
+        last_trade_block, last_trade_log_index, last_price, last_trade_timestamp
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (market_id) DO UPDATE SET
+        total_trades = total_trades + excluded.total_trades,
+        total_volume = total_volume + excluded.total_volume,
+        volume_24h = volume_24h + excluded.volume_24h,
+        first_trade_block = CASE WHEN (excluded.first_trade_block, excluded.first_trade_log_index) < (first_trade_block, first_trade_log_index)
+                                 THEN excluded.first_trade_block ELSE first_trade_block END,
+        first_trade_log_index = CASE WHEN (excluded.first_trade_block, excluded.first_trade_log_index) < (first_trade_block, first_trade_log_index)
+                                     THEN excluded.first_trade_log_index ELSE first_trade_log_index END,
+        last_price = CASE WHEN (excluded.last_trade_block, excluded.last_trade_log_index) > (last_trade_block, last_trade_log_index)
+                          THEN excluded.last_price ELSE last_price END,
+        last_trade_timestamp = CASE WHEN (excluded.last_trade_block, excluded.last_trade_log_index) > (last_trade_block, last_trade_log_index)
+                                    THEN excluded.last_trade_timestamp ELSE last_trade_timestamp END,
+        last_trade_block = CASE WHEN (excluded.last_trade_block, excluded.last_trade_log_index) > (last_trade_block, last_trade_log_index)
+                                THEN excluded.last_trade_block ELSE last_trade_block END,
+        last_trade_log_index = CASE WHEN (excluded.last_trade_block, excluded.last_trade_log_index) > (last_trade_block, last_trade_log_index)
+                                    THEN excluded.last_trade_log_index ELSE last_trade_log_index END
+    ''', [(market_id,) + tuple(entry) for market_id, entry in stats.items()])
+
+
+def apply_trade_rollups(cursor, min_trade_id):
+    """把 id 大于 min_trade_id 的新交易汇总进 K 线与市场统计（在写入交易的同一事务中调用）
+
+    Args:
+        cursor: 数据库游标
+        min_trade_id: 本批写入前 trades 表的最大 id
+    """
+    cursor.execute(f'SELECT {ROLLUP_COLUMNS} FROM trades WHERE id > ?', (min_trade_id,))
+    rows = cursor.fetchall()
+    upsert_candles(cursor, aggregate_candles(rows))
+    upsert_market_stats(cursor, aggregate_market_stats(rows))
+
+
+def recompute_market_stats(cursor, market_ids, now=None):
+    """从 1d K 线与交易表重新计算指定市场的统计（用于回滚）
+
+    Args:
+        cursor: 数据库游标
+        market_ids: 市场 ID 可迭代对象
+        now: 当前时间（Unix 秒），默认取当前时间
+    """
+    for market_id in set(market_ids):
+        cursor.execute('''
+        SELECT COALESCE(SUM(trade_count), 0), COALESCE(SUM(volume), 0) FROM candles
+        WHERE market_id = ? AND interval = '1d'
+        ''', (market_id,))
+        total_trades, total_volume = cursor.fetchone()
+        if not total_trades:
+            cursor.execute('DELETE FROM market_stats WHERE market_id = ?', (market_id,))
+            continue
+
+        cursor.execute('''
+        SELECT block_number, log_index FROM trades WHERE market_id = ?
+        ORDER BY block_number, log_index LIMIT 1
+        ''', (market_id,))
+        first_block, first_log_index = cursor.fetchone()
+        cursor.execute('''
+        SELECT block_number, log_index, outcome, price, timestamp FROM trades WHERE market_id = ?
+        ORDER BY block_number DESC, log_index DESC LIMIT 1
+        ''', (market_id,))
+        last_block, last_log_index, outcome, price, timestamp = cursor.fetchone()
+
+        cursor.execute('''
+        INSERT OR REPLACE INTO market_stats (
+            market_id, total_trades, total_volume, volume_24h, first_trade_block, first_trade_log_index,
+            last_trade_block, last_trade_log_index, last_price, last_trade_timestamp
+        ) VALUES (?, ?, ?, 0, ?, ?, ?, ?, ?, ?)
+        ''', (
+            market_id, total_trades, total_volume, first_block, first_log_index,
+            last_block, last_log_index, yes_price(outcome, price), timestamp
+        ))
+
+    refresh_rolling_volume(cursor, market_ids, now)
+
+
+def refresh_rolling_volume(cursor, market_ids=None, now=None):
+    """用 1h K 线重新计算 24 小时成交量，修正写入时累加的滚动窗口
+
+    Args:
+        cursor: 数据库游标
+        market_ids: 可选的市场 ID 可迭代对象，默认刷新全部市场
+        now: 当前时间（Unix 秒），默认取当前时间
+    """
+    now = int(now if now is not None else time.time())
+    window_start = now - ROLLING_WINDOW_SECONDS
+    # 起始小时桶只有部分落在窗口内，按整桶计入
+    bucket_start = window_start - window_start % CANDLE_INTERVALS['1h']
+
+    query = '''
+    UPDATE market_stats SET volume_24h = (
+        SELECT COALESCE(SUM(volume), 0) FROM candles
+        WHERE candles.market_id = market_stats.market_id AND interval = '1h' AND bucket_start >= ?
+    )
+    '''
+    if market_ids is None:
+        cursor.execute(query, (bucket_start,))
+    else:
+        cursor.executemany(query + ' WHERE market_id = ?', [(bucket_start, market_id) for market_id in set(market_ids)])
+
+
+def fetch_market_stats(conn, market_ids):
+    """批量获取市场统计
+
+    Args:
+        conn: 数据库连接
+        market_ids: 市场 ID 列表
+
+    Returns:
+        dict: market_id → 统计字典；没有交易的市场不会出现在结果中
+    """
+    cursor = conn.cursor()
+    market_ids = list(market_ids)
+    stats = {}
+    for start in range(0, len(market_ids), 500):
+        batch = market_ids[start:start + 500]
+        cursor.execute(f'''
+        SELECT market_id, total_trades, total_volume, volume_24h, last_price, last_trade_timestamp,
+               first_trade_block, last_trade_block
+        FROM market_stats WHERE market_id IN ({','.join('?' * len(batch))})
+        ''', batch)
+        for row in cursor.fetchall():
+            stats[row[0]] = {
+                'total_trades': row[1],
+                'total_volume': from_micro(row[2]),
+                'volume_24h': from_micro(row[3]),
+                'last_price': from_micro(row[4]),
+                'last_trade_timestamp': epoch_to_iso(row[5]),
+                'first_trade_block': row[6],
+                'last_trade_block': row[7]
+            }
+    return stats
+
+
+def collect_rollback_scope(cursor, block_number):
+    """在删除交易前，找出回滚会影响的 K 线并删除它们
+
+    Args:
+        cursor: 数据库游标
+        block_number: 分叉点区块号
+
+    Returns:
+        dict: 受影响的 (market_id, outcome) → (重建起始区块, {interval: 最小 bucket_start})
+    """
+    cursor.execute('''
+    SELECT market_id, outcome, MIN(timestamp) FROM trades
+    WHERE block_number > ?
+    GROUP BY market_id, outcome
+    ''', (block_number,))
+    affected = cursor.fetchall()
+
+    scope = {}
+    for market_id, outcome, min_timestamp in affected:
+        rebuild_from_block = block_number + 1
+        min_buckets = {}
+        for interval, seconds in CANDLE_INTERVALS.items():
+            bucket_start = min_timestamp - min_timestamp % seconds
+            min_buckets[interval] = bucket_start
+            cursor.execute('''
+            SELECT MIN(first_block) FROM candles
+            WHERE market_id = ? AND outcome = ? AND interval = ? AND bucket_start >= ?
+            ''', (market_id, outcome, interval, bucket_start))
+            first_block = cursor.fetchone()[0]
+            if first_block is not None:
+                rebuild_from_block = min(rebuild_from_block, first_block)
+            cursor.execute('''
+            DELETE FROM candles
+            WHERE market_id = ? AND outcome = ? AND interval = ? AND bucket_start >= ?
+            ''', (market_id, outcome, interval, bucket_start))
+        scope[(market_id, outcome)] = (rebuild_from_block, min_buckets)
+
+    return scope
+
+
+def rebuild_rollups(cursor, scope):
+    """在删除交易后，用剩余交易重建被删除的 K 线，并重新计算受影响市场的统计
+
+    Args:
+        cursor: 数据库游标
+        scope: collect_rollback_scope 的返回值
+    """
+    for (market_id, outcome), (rebuild_from_block, min_buckets) in scope.items():
+        cursor.execute(f'''
+        SELECT {ROLLUP_COLUMNS} FROM trades
+        WHERE market_id = ? AND outcome = ? AND block_number >= ?
+        ''', (market_id, outcome, rebuild_from_block))
+        candles = aggregate_candles(
+            cursor.fetchall(),
+            {(market_id, outcome, interval): bucket for interval, bucket in min_buckets.items()}
+        )
+        upsert_candles(cursor, candles)
+
+    recompute_market_stats(cursor, [market_id for market_id, _ in scope])
+
+
+def fetch_candles(conn, market_id, interval, outcome=None, from_time=None, to_time=None, limit=1000):
+    """查询 K 线
+
+    不指定 outcome 时每个结果各返回最多 limit 根，YES 不会占满 NO 的名额。
+
+    Args:
+        conn: 数据库连接
+        market_id: 市场 ID
+        interval: K 线周期（1m/1h/1d）
+        outcome: 可选的结果过滤（YES/NO）
+        from_time: 可选的起始时间（Unix 秒，包含）
+        to_time: 可选的结束时间（Unix 秒，包含）
+        limit: 每个结果最多返回的 K 线数量
+
+    Returns:
+        list: K 线字典列表，按 outcome 与 bucket_start 升序
+    """
+    conditions = ['market_id = ?', 'interval = ?', 'outcome = ?']
+    params = [market_id, interval]
+    if from_time is not None:
+        conditions.append('bucket_start >= ?')
+        params.append(from_time - from_time % CANDLE_INTERVALS[interval])
+    if to_time is not None:
+        conditions.append('bucket_start <= ?')
+        params.append(to_time)
+
+    # 每个结果单独查询，都是主键 (market_id, interval, outcome, bucket_start) 上的范围扫描
+    outcome_codes = [OUTCOME_CODES[outcome]] if outcome else sorted(OUTCOME_CODES.values())
+    cursor = conn.cursor()
+    rows = []
+    for outcome_code in outcome_codes:
+        cursor.execute(f'''
+        SELECT outcome, bucket_start, open, high, low, close, volume, trade_count
+        FROM candles
+        WHERE {' AND '.join(conditions)}
+        ORDER BY bucket_start
+        LIMIT ?
+        ''', params[:2] + [outcome_code] + params[2:] + [limit])
+        rows.extend(cursor.fetchall())
+
+    return [
+        {
+            'outcome': OUTCOMES[row[0]],
+            'bucket_start': row[1],
+            'open': from_micro(row[2]),
+            'high': from_micro(row[3]),
+            'low': from_micro(row[4]),
+            'close': from_micro(row[5]),
+            'volume': from_micro(row[6]),
+            'trade_count': row[7]
+        }
+        for row in rows
+    ]
@@ -1,5 +1,39 @@
 """数据库模式定义"""
-import sqlite3
+from src.db.connection import connect_writer
+
+
+# 存储格式版本（PRAGMA user_version）。版本 2 起 trades 等表使用紧凑编码，见 src/db/codec.py
+SCHEMA_VERSION = 2
+
+# 旧版本写在 sync_state 中、与区块进度无关的键（现保存在 metadata 表）
+LEGACY_METADATA_KEYS = ('data_generation', 'trades_indexer_chunk_size', 'catalog_updated_at')
+LEGACY_METADATA_PREFIXES = ('bench_seed_',)
+
+
+def get_schema_version(conn):
+    """获取数据库的存储格式版本
+    
+    Args:
+        conn: 数据库连接
+        
+    Returns:
+        int: PRAGMA user_version
+    """
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def table_exists(conn, name):
+    """检查表是否存在
+    
+    Args:
+        conn: 数据库连接
+        name: 表名
+        
+    Returns:
+        bool: 表存在时返回 True
+    """
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()
+    return row is not None
 
 
 def init_db(db_path_or_conn):
@@ -10,14 +44,66 @@ def init_db(db_path_or_conn):
         
     Returns:
         sqlite3.Connection: 数据库连接
+        
+    Raises:
+        RuntimeError: 数据库仍为旧的存储格式，需要先运行 src.db.migrate
     """
     # 检查是否是数据库连接对象
     if hasattr(db_path_or_conn, 'cursor'):
         conn = db_path_or_conn
     else:
-        conn = sqlite3.connect(db_path_or_conn)
+        conn = connect_writer(db_path_or_conn)
+    
+    if get_schema_version(conn) < SCHEMA_VERSION and table_exists(conn, 'trades'):
+        raise RuntimeError(
+            f"Database uses storage format v{get_schema_version(conn)}, "
+            f"run `python -m src.db.migrate --db <path>` to upgrade it to v{SCHEMA_VERSION}"
+        )
+    
     cursor = conn.cursor()
+    create_tables(cursor)
     
+    # 旧数据库升级：tokens 表为空时从已有市场回填（outcome 0 为 YES，1 为 NO）
+    cursor.execute('''
+    INSERT OR IGNORE INTO tokens (token_id, market_id, outcome)
+    SELECT token_id, market_id, outcome FROM (
+        SELECT yes_token_id AS token_id, id AS market_id, 0 AS outcome FROM markets WHERE yes_token_id IS NOT NULL
+        UNION ALL
+        SELECT no_token_id, id, 1 FROM markets WHERE no_token_id IS NOT NULL
+    )
+    WHERE NOT EXISTS (SELECT 1 FROM tokens)
+    ''')
+    
+    move_legacy_metadata(cursor)
+    cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    conn.commit()
+    return conn
+
+
+def move_legacy_metadata(cursor):
+    """把旧版本写在 sync_state 中的非区块进度值移到 metadata 表（不提交事务）
+    
+    Args:
+        cursor: 数据库游标
+    """
+    condition = ' OR '.join(
+        ['key IN ({})'.format(','.join('?' * len(LEGACY_METADATA_KEYS)))]
+        + ['key LIKE ?'] * len(LEGACY_METADATA_PREFIXES)
+    )
+    params = list(LEGACY_METADATA_KEYS) + [prefix + '%' for prefix in LEGACY_METADATA_PREFIXES]
+    cursor.execute(f'''
+    INSERT OR IGNORE INTO metadata (key, value, updated_at)
+    SELECT key, last_block, updated_at FROM sync_state WHERE {condition}
+    ''', params)
+    cursor.execute(f'DELETE FROM sync_state WHERE {condition}', params)
+
+
+def create_tables(cursor):
+    """创建当前存储格式的表与索引（已存在的跳过，不提交事务）
+    
+    Args:
+        cursor: 数据库游标
+    """
     # 创建事件表
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS events (
@@ -41,8 +127,8 @@ def init_db(db_path_or_conn):
         question_id TEXT,
         oracle TEXT,
         collateral_token TEXT,
-        yes_token_id TEXT,
-        no_token_id TEXT,
+        yes_token_id BLOB,
+        no_token_id BLOB,
         enable_neg_risk BOOLEAN,
         status TEXT,
         created_at TIMESTAMP,
@@ -51,28 +137,48 @@ def init_db(db_path_or_conn):
     )
     ''')
     
-    # 创建交易表
+    # 创建代币表（token_id → 市场与结果的规范化映射）
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS tokens (
+        token_id BLOB PRIMARY KEY,
+        market_id INTEGER,
+        outcome INTEGER,
+        FOREIGN KEY (market_id) REFERENCES markets (id)
+    )
+    ''')
+    
+    # 创建交易表（紧凑编码：哈希与地址为 BLOB，价格与数量为百万分之一单位整数，
+    # side/outcome 为枚举下标，timestamp 为 Unix 秒）
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS trades (
         id INTEGER PRIMARY KEY,
         market_id INTEGER,
-        tx_hash TEXT,
+        tx_hash BLOB,
         log_index INTEGER,
-        maker TEXT,
-        taker TEXT,
-        side TEXT,
-        outcome TEXT,
-        price DECIMAL,
-        size DECIMAL,
+        maker BLOB,
+        taker BLOB,
+        side INTEGER,
+        outcome INTEGER,
+        price INTEGER,
+        size INTEGER,
         block_number INTEGER,
-        timestamp TIMESTAMP,
-        created_at TIMESTAMP,
+        timestamp INTEGER,
         FOREIGN KEY (market_id) REFERENCES markets (id),
         UNIQUE (tx_hash, log_index)
     )
     ''')
     
-    # 创建同步状态表
+    # 创建区块头表
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS blocks (
+        number INTEGER PRIMARY KEY,
+        hash BLOB,
+        parent_hash BLOB,
+        timestamp INTEGER
+    )
+    ''')
+    
+    # 创建同步状态表（只记录区块进度）
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS sync_state (
         key TEXT PRIMARY KEY,
@@ -81,11 +187,106 @@ def init_db(db_path_or_conn):
     )
     ''')
     
+    # 创建元数据表（数据版本号、分块窗口大小、目录水位等与区块进度无关的整数值）
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS metadata (
+        key TEXT PRIMARY KEY,
+        value INTEGER,
+        updated_at TIMESTAMP
+    )
+    ''')
+    
+    # 创建 K 线表（1m/1h/1d，由交易写入路径增量维护；价格与成交量为百万分之一单位整数）
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS candles (
+        market_id INTEGER,
+        outcome INTEGER,
+        interval TEXT,
+        bucket_start INTEGER,
+        open INTEGER,
+        high INTEGER,
+        low INTEGER,
+        close INTEGER,
+        volume INTEGER,
+        trade_count INTEGER,
+        first_block INTEGER,
+        first_log_index INTEGER,
+        last_block INTEGER,
+        last_log_index INTEGER,
+        PRIMARY KEY (market_id, interval, outcome, bucket_start)
+    ) WITHOUT ROWID
+    ''')
+    
+    # 创建市场统计表（由交易写入路径增量维护，volume_24h 定期用 1h K 线修正；编码同 K 线表）
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS market_stats (
+        market_id INTEGER PRIMARY KEY,
+        total_trades INTEGER,
+        total_volume INTEGER,
+        volume_24h INTEGER,
+        first_trade_block INTEGER,
+        first_trade_log_index INTEGER,
+        last_trade_block INTEGER,
+        last_trade_log_index INTEGER,
+        last_price INTEGER,
+        last_trade_timestamp INTEGER,
+        FOREIGN KEY (market_id) REFERENCES markets (id)
+    )
+    ''')
+    
+    # 创建目录内容哈希表（市场发现据此跳过未变化的事件与市场，kind 为 event 或 market）
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS catalog_hashes (
+        kind TEXT,
+        key TEXT,
+        content_hash BLOB,
+        source_updated_at TEXT,
+        PRIMARY KEY (kind, key)
+    ) WITHOUT ROWID
+    ''')
+    
+    # 创建已索引区块区间表（互不重叠、相邻即合并的闭区间）
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS indexed_ranges (
+        from_block INTEGER PRIMARY KEY,
+        to_block INTEGER NOT NULL
+    )
+    ''')
+    
+    # 创建区块区间租约表（多进程回填时的工作单元）
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS range_leases (
+        from_block INTEGER PRIMARY KEY,
+        to_block INTEGER NOT NULL,
+        worker_id TEXT,
+        expires_at REAL
+    )
+    ''')
+    
+    # 创建待定交易表（token 尚无市场映射的成交，编码同交易表；市场出现后移入 trades）
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS pending_trades (
+        token_id BLOB,
+        tx_hash BLOB,
+        log_index INTEGER,
+        maker BLOB,
+        taker BLOB,
+        side INTEGER,
+        price INTEGER,
+        size INTEGER,
+        block_number INTEGER,
+        timestamp INTEGER,
+        PRIMARY KEY (tx_hash, log_index)
+    ) WITHOUT ROWID
+    ''')
+    
     # 创建索引
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_markets_event_id ON markets (event_id)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_markets_slug ON markets (slug)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_trades_market_id ON trades (market_id)')
+    # 按市场分页的复合索引，顺序与 API 的键集分页一致；它已覆盖按 market_id 的查询，旧的单列索引不再需要
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_trades_market_block_log ON trades (market_id, block_number DESC, log_index DESC)')
+    cursor.execute('DROP INDEX IF EXISTS idx_trades_market_id')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_trades_timestamp ON trades (timestamp)')
-    
-    conn.commit()
-    return conn
\ No newline at end of file
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_trades_block_number ON trades (block_number)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_tokens_market_id ON tokens (market_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_pending_trades_token_id ON pending_trades (token_id)')
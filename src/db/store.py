@@ -1,91 +1,284 @@
 """数据访问层函数"""
 import sqlite3
+import time
 from datetime import datetime
+from itertools import islice
+from src.db.codec import OUTCOME_CODES, blob_to_hex, blob_to_token_id, hex_to_blob, token_id_to_blob
+from src.db.rollups import apply_trade_rollups, collect_rollback_scope, rebuild_rollups, refresh_rolling_volume
 
 
-def upsert_event(conn, event_data):
-    """插入或更新事件信息
+# metadata 中记录数据版本号的键名，API 缓存据此判断数据是否变化
+DATA_GENERATION_KEY = 'data_generation'
+
+# metadata 中记录代币映射版本号的键名，已有代币被改到其他市场或结果时递增
+TOKEN_GENERATION_KEY = 'token_generation'
+
+# insert_trades 接受的交易元组字段顺序，值为存储编码（见 src/db/codec.py）
+TRADE_COLUMNS = (
+    'market_id', 'tx_hash', 'log_index', 'maker', 'taker', 'side', 'outcome',
+    'price', 'size', 'block_number', 'timestamp'
+)
+
+# insert_pending_trades 接受的待定交易元组字段顺序：市场与结果未知，以 token_id 代替
+PENDING_TRADE_COLUMNS = (
+    'token_id', 'tx_hash', 'log_index', 'maker', 'taker', 'side',
+    'price', 'size', 'block_number', 'timestamp'
+)
+
+
+def _increment_metadata(cursor, key):
+    """在当前事务中把 metadata 中的整数值加一（随调用方的事务一起提交）"""
+    now = datetime.now().isoformat()
+    cursor.execute('''
+    INSERT INTO metadata (key, value, updated_at)
+    VALUES (?, 1, ?)
+    ON CONFLICT (key) DO UPDATE SET
+        value = value + 1,
+        updated_at = excluded.updated_at
+    ''', (key, now))
+
+
+def _bump_data_generation(cursor):
+    """在当前事务中递增数据版本号（随调用方的事务一起提交）"""
+    _increment_metadata(cursor, DATA_GENERATION_KEY)
+
+
+def get_data_generation(conn):
+    """获取当前数据版本号
     
     Args:
         conn: 数据库连接
-        event_data: 事件数据字典
+        
+    Returns:
+        int: 数据版本号，每次市场、事件或交易数据提交后递增
     """
-    cursor = conn.cursor()
-    now = datetime.now().isoformat()
+    return get_metadata(conn, DATA_GENERATION_KEY)
+
+
+# 单条 IN (...) 查询的最大参数数量
+IN_QUERY_BATCH = 500
+
+# 由市场发现维护、内容变化时才需要改写的市场列
+MARKET_COLUMNS = (
+    'event_id', 'slug', 'question_id', 'oracle', 'collateral_token',
+    'yes_token_id', 'no_token_id', 'enable_neg_risk', 'status'
+)
+
+
+def _fetch_ids_by_key(cursor, table, column, keys):
+    """按唯一列批量查询 id，返回 {键: id}"""
+    keys = list(keys)
+    ids = {}
+    for start in range(0, len(keys), IN_QUERY_BATCH):
+        batch = keys[start:start + IN_QUERY_BATCH]
+        cursor.execute(f'''
+        SELECT {column}, id FROM {table} WHERE {column} IN ({','.join('?' * len(batch))})
+        ''', batch)
+        ids.update(cursor.fetchall())
+    return ids
+
+
+def _upsert_counts(total, inserted, changes):
+    """由批次行数、新键数量与 total_changes 差值计算插入、更新与未变化的数量"""
+    return {
+        'inserted': inserted,
+        'updated': changes - inserted,
+        'unchanged': total - changes
+    }
+
+
+def _upsert_events(cursor, events, now):
+    """在当前事务中批量插入或更新事件，内容未变化的行不会被改写
     
-    cursor.execute('''
+    Returns:
+        dict: inserted、updated、unchanged 数量
+    """
+    # 同一批次中重复的 slug 以最后一条为准
+    rows = {}
+    for event_data in events:
+        slug = event_data.get('slug')
+        rows[slug] = (
+            slug,
+            event_data.get('title'),
+            event_data.get('description'),
+            event_data.get('status', 'active'),
+            now,
+            now
+        )
+    if not rows:
+        return _upsert_counts(0, 0, 0)
+    
+    existing = _fetch_ids_by_key(cursor, 'events', 'slug', rows)
+    changes_before = cursor.connection.total_changes
+    cursor.executemany('''
     INSERT INTO events (slug, title, description, status, created_at, updated_at)
     VALUES (?, ?, ?, ?, ?, ?)
     ON CONFLICT (slug) DO UPDATE SET
         title = excluded.title,
         description = excluded.description,
         status = excluded.status,
-        updated_at = ?
-    ''', (
-        event_data.get('slug'),
-        event_data.get('title'),
-        event_data.get('description'),
-        event_data.get('status', 'active'),
-        now,
-        now,
-        now
-    ))
-    
-    conn.commit()
+        updated_at = excluded.updated_at
+    WHERE (title, description, status) IS NOT (excluded.title, excluded.description, excluded.status)
+    ''', list(rows.values()))
+    changes = cursor.connection.total_changes - changes_before
+    return _upsert_counts(len(rows), len(rows) - len(existing), changes)
 
 
-def upsert_market(conn, market_data):
-    """插入或更新市场信息
+def _upsert_markets(cursor, markets, now):
+    """在当前事务中批量插入或更新市场及其代币映射，内容未变化的行不会被改写
     
-    Args:
-        conn: 数据库连接
-        market_data: 市场数据字典
+    事件 ID 按批次一次性解析，event_slug 引用的事件需要已经写入（可以在同一事务中）。
+    
+    Returns:
+        dict: inserted、updated、unchanged 数量
     """
-    cursor = conn.cursor()
-    now = datetime.now().isoformat()
+    event_ids = _fetch_ids_by_key(
+        cursor, 'events', 'slug',
+        {market_data.get('event_slug') for market_data in markets if market_data.get('event_slug')}
+    )
     
-    # 先获取事件 ID
-    event_slug = market_data.get('event_slug')
-    event_id = None
-    if event_slug:
-        cursor.execute('SELECT id FROM events WHERE slug = ?', (event_slug,))
-        result = cursor.fetchone()
-        if result:
-            event_id = result[0]
+    # 同一批次中重复的 condition_id 以最后一条为准
+    rows = {}
+    for market_data in markets:
+        condition_id = market_data.get('condition_id')
+        rows[condition_id] = (
+            event_ids.get(market_data.get('event_slug')),
+            market_data.get('slug'),
+            condition_id,
+            market_data.get('question_id'),
+            market_data.get('oracle'),
+            market_data.get('collateral_token'),
+            token_id_to_blob(market_data.get('yes_token_id')),
+            token_id_to_blob(market_data.get('no_token_id')),
+            market_data.get('enable_neg_risk', False),
+            market_data.get('status', 'active'),
+            now,
+            now
+        )
+    if not rows:
+        return _upsert_counts(0, 0, 0)
     
-    cursor.execute('''
+    existing = _fetch_ids_by_key(cursor, 'markets', 'condition_id', rows)
+    changes_before = cursor.connection.total_changes
+    cursor.executemany(f'''
     INSERT INTO markets (
         event_id, slug, condition_id, question_id, oracle, collateral_token,
         yes_token_id, no_token_id, enable_neg_risk, status, created_at, updated_at
     ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     ON CONFLICT (condition_id) DO UPDATE SET
-        event_id = excluded.event_id,
-        slug = excluded.slug,
-        question_id = excluded.question_id,
-        oracle = excluded.oracle,
-        collateral_token = excluded.collateral_token,
-        yes_token_id = excluded.yes_token_id,
-        no_token_id = excluded.no_token_id,
-        enable_neg_risk = excluded.enable_neg_risk,
-        status = excluded.status,
-        updated_at = ?
-    ''', (
-        event_id,
-        market_data.get('slug'),
-        market_data.get('condition_id'),
-        market_data.get('question_id'),
-        market_data.get('oracle'),
-        market_data.get('collateral_token'),
-        market_data.get('yes_token_id'),
-        market_data.get('no_token_id'),
-        market_data.get('enable_neg_risk', False),
-        market_data.get('status', 'active'),
-        now,
-        now,
-        now
-    ))
+        {', '.join(f'{column} = excluded.{column}' for column in MARKET_COLUMNS)},
+        updated_at = excluded.updated_at
+    WHERE ({', '.join(MARKET_COLUMNS)}) IS NOT ({', '.join(f'excluded.{column}' for column in MARKET_COLUMNS)})
+    ''', list(rows.values()))
+    changes = cursor.connection.total_changes - changes_before
     
-    conn.commit()
+    # 维护 token_id → 市场映射
+    market_ids = _fetch_ids_by_key(cursor, 'markets', 'condition_id', rows)
+    tokens = []
+    for condition_id, row in rows.items():
+        tokens.append((row[6], market_ids[condition_id], OUTCOME_CODES['YES']))
+        tokens.append((row[7], market_ids[condition_id], OUTCOME_CODES['NO']))
+    max_token_rowid = cursor.execute('SELECT COALESCE(MAX(rowid), 0) FROM tokens').fetchone()[0]
+    token_changes_before = cursor.connection.total_changes
+    cursor.executemany('''
+    INSERT INTO tokens (token_id, market_id, outcome)
+    VALUES (?, ?, ?)
+    ON CONFLICT (token_id) DO UPDATE SET
+        market_id = excluded.market_id,
+        outcome = excluded.outcome
+    WHERE (market_id, outcome) IS NOT (excluded.market_id, excluded.outcome)
+    ''', [token for token in tokens if token[0]])
+    
+    # 已有代币的 rowid 不变，增量刷新发现不了改动，递增版本号让缓存映射的进程整表重载
+    token_changes = cursor.connection.total_changes - token_changes_before
+    new_tokens = cursor.execute('SELECT COUNT(*) FROM tokens WHERE rowid > ?', (max_token_rowid,)).fetchone()[0]
+    if token_changes > new_tokens:
+        _increment_metadata(cursor, TOKEN_GENERATION_KEY)
+    
+    return _upsert_counts(len(rows), len(rows) - len(existing), changes)
+
+
+def fetch_event_ids(conn, slugs):
+    """批量获取事件 ID
+    
+    Args:
+        conn: 数据库连接
+        slugs: 事件 slug 可迭代对象
+        
+    Returns:
+        dict: slug → 事件 ID，不存在的 slug 不会出现在结果中
+    """
+    return _fetch_ids_by_key(conn.cursor(), 'events', 'slug', slugs)
+
+
+def fetch_catalog_hashes(conn, kind):
+    """获取事件或市场的内容哈希
+    
+    Args:
+        conn: 数据库连接
+        kind: event 或 market
+        
+    Returns:
+        dict: 键（事件 slug 或市场 condition_id）→ (content_hash, source_updated_at)
+    """
+    cursor = conn.cursor()
+    cursor.execute('SELECT key, content_hash, source_updated_at FROM catalog_hashes WHERE kind = ?', (kind,))
+    return {key: (content_hash, updated_at) for key, content_hash, updated_at in cursor.fetchall()}
+
+
+def upsert_catalog(conn, events=(), markets=(), hashes=()):
+    """在单个事务中批量插入或更新事件与市场
+    
+    先写入事件再写入市场，市场的 event_slug 可以引用同一批次中的新事件。
+    只改写内容有变化的行，全部未变化时不递增数据版本号。
+    
+    Args:
+        conn: 数据库连接
+        events: 事件数据字典序列
+        markets: 市场数据字典序列
+        hashes: 与数据一起提交的 (kind, key, content_hash, source_updated_at) 序列
+    
+    Returns:
+        dict: {"events": 计数, "markets": 计数}，计数包含 inserted、updated、unchanged
+    """
+    cursor = conn.cursor()
+    now = datetime.now().isoformat()
+    
+    try:
+        event_counts = _upsert_events(cursor, events, now)
+        market_counts = _upsert_markets(cursor, markets, now)
+        cursor.executemany('''
+        INSERT OR REPLACE INTO catalog_hashes (kind, key, content_hash, source_updated_at)
+        VALUES (?, ?, ?, ?)
+        ''', list(hashes))
+        if event_counts['unchanged'] < sum(event_counts.values()) or market_counts['unchanged'] < sum(market_counts.values()):
+            _bump_data_generation(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    
+    return {'events': event_counts, 'markets': market_counts}
+
+
+def upsert_event(conn, event_data):
+    """插入或更新事件信息
+    
+    Args:
+        conn: 数据库连接
+        event_data: 事件数据字典
+    """
+    upsert_catalog(conn, events=[event_data])
+
+
+def upsert_market(conn, market_data):
+    """插入或更新市场信息
+    
+    Args:
+        conn: 数据库连接
+        market_data: 市场数据字典
+    """
+    upsert_catalog(conn, markets=[market_data])
 
 
 def fetch_market_by_slug(conn, slug):
@@ -113,8 +306,8 @@ def fetch_market_by_slug(conn, slug):
         'question_id': row[4],
         'oracle': row[5],
         'collateral_token': row[6],
-        'yes_token_id': row[7],
-        'no_token_id': row[8],
+        'yes_token_id': blob_to_token_id(row[7]),
+        'no_token_id': blob_to_token_id(row[8]),
         'enable_neg_risk': row[9],
         'status': row[10],
         'created_at': row[11],
@@ -147,8 +340,8 @@ def fetch_market_by_condition_id(conn, condition_id):
         'question_id': row[4],
         'oracle': row[5],
         'collateral_token': row[6],
-        'yes_token_id': row[7],
-        'no_token_id': row[8],
+        'yes_token_id': blob_to_token_id(row[7]),
+        'no_token_id': blob_to_token_id(row[8]),
         'enable_neg_risk': row[9],
         'status': row[10],
         'created_at': row[11],
@@ -161,15 +354,20 @@ def fetch_market_by_token_id(conn, token_id):
     
     Args:
         conn: 数据库连接
-        token_id: 代币 ID
+        token_id: 十进制代币 ID
         
     Returns:
         dict: 市场信息字典
+        
+    Raises:
+        ValueError: token_id 不是合法的 uint256
     """
     cursor = conn.cursor()
     cursor.execute('''
-    SELECT * FROM markets WHERE yes_token_id = ? OR no_token_id = ?
-    ''', (token_id, token_id))
+    SELECT markets.* FROM tokens
+    JOIN markets ON markets.id = tokens.market_id
+    WHERE tokens.token_id = ?
+    ''', (token_id_to_blob(token_id),))
     row = cursor.fetchone()
     
     if not row:
@@ -183,8 +381,8 @@ def fetch_market_by_token_id(conn, token_id):
         'question_id': row[4],
         'oracle': row[5],
         'collateral_token': row[6],
-        'yes_token_id': row[7],
-        'no_token_id': row[8],
+        'yes_token_id': blob_to_token_id(row[7]),
+        'no_token_id': blob_to_token_id(row[8]),
         'enable_neg_risk': row[9],
         'status': row[10],
         'created_at': row[11],
@@ -192,6 +390,464 @@ def fetch_market_by_token_id(conn, token_id):
     }
 
 
+def fetch_token_map(conn, since_rowid=0):
+    """获取 token_id → (market_id, outcome) 映射
+    
+    token_id 为 32 字节 BLOB，outcome 为枚举下标，与解码器输出一致，可直接查表。
+    
+    Args:
+        conn: 数据库连接
+        since_rowid: 只返回 rowid 大于该值的代币，用于增量刷新；增量刷新只能发现新增的代币，
+            TOKEN_GENERATION_KEY 变化时需要从 0 开始整表重载
+        
+    Returns:
+        tuple: (映射字典, 本次读取到的最大 rowid)
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+    SELECT rowid, token_id, market_id, outcome FROM tokens WHERE rowid > ? ORDER BY rowid
+    ''', (since_rowid,))
+    
+    token_map = {}
+    max_rowid = since_rowid
+    for rowid, token_id, market_id, outcome in cursor:
+        token_map[token_id] = (market_id, outcome)
+        max_rowid = rowid
+    
+    return token_map, max_rowid
+
+
+def fetch_blocks(conn, block_numbers):
+    """批量获取已保存的区块头
+    
+    Args:
+        conn: 数据库连接
+        block_numbers: 区块号可迭代对象
+        
+    Returns:
+        dict: 区块号 → 区块头字典（哈希解码为 0x 十六进制字符串）
+    """
+    cursor = conn.cursor()
+    numbers = list(block_numbers)
+    blocks = {}
+    
+    # 分批查询，避免超过 SQLite 的参数数量上限
+    for start in range(0, len(numbers), IN_QUERY_BATCH):
+        batch = numbers[start:start + IN_QUERY_BATCH]
+        placeholders = ','.join('?' * len(batch))
+        cursor.execute(f'''
+        SELECT number, hash, parent_hash, timestamp FROM blocks WHERE number IN ({placeholders})
+        ''', batch)
+        for number, block_hash, parent_hash, timestamp in cursor.fetchall():
+            blocks[number] = {
+                'number': number,
+                'hash': blob_to_hex(block_hash),
+                'parent_hash': blob_to_hex(parent_hash),
+                'timestamp': timestamp
+            }
+    
+    return blocks
+
+
+def upsert_blocks(conn, headers):
+    """批量插入或更新区块头
+    
+    Args:
+        conn: 数据库连接
+        headers: 区块头字典可迭代对象
+    """
+    cursor = conn.cursor()
+    cursor.executemany('''
+    INSERT INTO blocks (number, hash, parent_hash, timestamp)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (number) DO UPDATE SET
+        hash = excluded.hash,
+        parent_hash = excluded.parent_hash,
+        timestamp = excluded.timestamp
+    ''', [
+        (header['number'], hex_to_blob(header['hash']), hex_to_blob(header['parent_hash']), header['timestamp'])
+        for header in headers
+    ])
+    
+    conn.commit()
+
+
+def fetch_recent_blocks(conn, max_number, min_number, limit=32):
+    """按区块号降序获取已保存的区块头
+    
+    Args:
+        conn: 数据库连接
+        max_number: 最大区块号（包含）
+        min_number: 最小区块号（包含）
+        limit: 最多返回的区块数
+        
+    Returns:
+        list: 区块头字典列表，按区块号降序
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+    SELECT number, hash, parent_hash, timestamp FROM blocks
+    WHERE number <= ? AND number >= ?
+    ORDER BY number DESC
+    LIMIT ?
+    ''', (max_number, min_number, limit))
+    
+    return [
+        {'number': number, 'hash': blob_to_hex(block_hash), 'parent_hash': blob_to_hex(parent_hash), 'timestamp': timestamp}
+        for number, block_hash, parent_hash, timestamp in cursor.fetchall()
+    ]
+
+
+def rollback_to_block(conn, block_number, key='global_indexer'):
+    """回滚到指定区块：删除其后的交易与区块头、重建受影响的 K 线并重置同步状态（单个事务）
+    
+    Args:
+        conn: 数据库连接
+        block_number: 分叉点区块号，该区块及之前的数据保留
+        key: 同步状态键名
+        
+    Returns:
+        int: 删除的交易数量
+    """
+    cursor = conn.cursor()
+    now = datetime.now().isoformat()
+    
+    rollup_scope = collect_rollback_scope(cursor, block_number)
+    cursor.execute('DELETE FROM trades WHERE block_number > ?', (block_number,))
+    deleted_count = cursor.rowcount
+    rebuild_rollups(cursor, rollup_scope)
+    cursor.execute('DELETE FROM blocks WHERE number > ?', (block_number,))
+    cursor.execute('DELETE FROM pending_trades WHERE block_number > ?', (block_number,))
+    cursor.execute('DELETE FROM indexed_ranges WHERE from_block > ?', (block_number,))
+    cursor.execute('UPDATE indexed_ranges SET to_block = ? WHERE to_block > ?', (block_number, block_number))
+    cursor.execute('''
+    INSERT INTO sync_state (key, last_block, updated_at)
+    VALUES (?, ?, ?)
+    ON CONFLICT (key) DO UPDATE SET
+        last_block = excluded.last_block,
+        updated_at = ?
+    ''', (key, block_number, now, now))
+    
+    _bump_data_generation(cursor)
+    conn.commit()
+    return deleted_count
+
+
+def insert_trades(conn, trades, batch_size=10000):
+    """批量插入交易，已存在的 (tx_hash, log_index) 会被忽略
+    
+    每批使用同一条预编译语句 executemany 写入并单独提交，
+    插入数量通过 conn.total_changes 的差值统计。新插入的交易在同一事务中汇总进 K 线与市场统计。
+    每批先获取写锁再读取最大 id，多个进程并行写入时不会把其他进程的交易重复汇总。
+    
+    Args:
+        conn: 数据库连接
+        trades: 按 TRADE_COLUMNS 顺序排列的元组序列，或 {列名: 值列表} 形式的列式字典
+        batch_size: 每个事务写入的最大行数
+        
+    Returns:
+        int: 实际插入的交易数量
+    """
+    if isinstance(trades, dict):
+        rows = zip(*(trades[column] for column in TRADE_COLUMNS))
+    else:
+        rows = iter(trades)
+    
+    cursor = conn.cursor()
+    inserted_count = 0
+    
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        
+        # 持有写锁期间，新行的 id 一定大于写入前的最大 id，据此找出本批真正插入的交易
+        _begin_immediate(conn)
+        try:
+            cursor.execute('SELECT COALESCE(MAX(id), 0) FROM trades')
+            max_id_before = cursor.fetchone()[0]
+            
+            batch_changes_before = conn.total_changes
+            cursor.executemany('''
+            INSERT INTO trades (
+                market_id, tx_hash, log_index, maker, taker, side, outcome,
+                price, size, block_number, timestamp
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (tx_hash, log_index) DO NOTHING
+            ''', batch)
+            batch_inserted = conn.total_changes - batch_changes_before
+            if batch_inserted:
+                inserted_count += batch_inserted
+                apply_trade_rollups(cursor, max_id_before)
+                _bump_data_generation(cursor)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    
+    return inserted_count
+
+
+def insert_pending_trades(conn, pending_trades):
+    """暂存 token 尚无市场映射的交易，已存在的 (tx_hash, log_index) 会被忽略
+    
+    Args:
+        conn: 数据库连接
+        pending_trades: 按 PENDING_TRADE_COLUMNS 顺序排列的元组序列
+        
+    Returns:
+        int: 实际暂存的交易数量
+    """
+    cursor = conn.cursor()
+    changes_before = conn.total_changes
+    cursor.executemany(f'''
+    INSERT INTO pending_trades ({', '.join(PENDING_TRADE_COLUMNS)})
+    VALUES ({', '.join('?' * len(PENDING_TRADE_COLUMNS))})
+    ON CONFLICT (tx_hash, log_index) DO NOTHING
+    ''', list(pending_trades))
+    inserted_count = conn.total_changes - changes_before
+    conn.commit()
+    return inserted_count
+
+
+def fetch_pending_token_ids(conn):
+    """获取待定交易涉及的 token_id
+    
+    Args:
+        conn: 数据库连接
+        
+    Returns:
+        set: 32 字节 token_id 集合
+    """
+    cursor = conn.cursor()
+    cursor.execute('SELECT DISTINCT token_id FROM pending_trades')
+    return {row[0] for row in cursor.fetchall()}
+
+
+def promote_pending_trades(conn, batch_size=10000):
+    """把 token 已有市场映射的待定交易写入交易表
+    
+    每批先经 insert_trades 写入（维护 K 线与市场统计），再删除已写入的待定行；
+    两步之间中断时重复执行是安全的，已写入的交易会被忽略。
+    
+    Args:
+        conn: 数据库连接
+        batch_size: 每批处理的最大行数
+        
+    Returns:
+        dict: promoted（移出待定表的行数）与 inserted（实际插入交易表的行数）
+    """
+    cursor = conn.cursor()
+    promoted_count = 0
+    inserted_count = 0
+    
+    while True:
+        cursor.execute('''
+        SELECT
+            tokens.market_id, pending_trades.tx_hash, pending_trades.log_index, pending_trades.maker,
+            pending_trades.taker, pending_trades.side, tokens.outcome, pending_trades.price,
+            pending_trades.size, pending_trades.block_number, pending_trades.timestamp
+        FROM pending_trades
+        JOIN tokens ON tokens.token_id = pending_trades.token_id
+        LIMIT ?
+        ''', (batch_size,))
+        trades = cursor.fetchall()
+        if not trades:
+            break
+        
+        inserted_count += insert_trades(conn, trades, batch_size)
+        cursor.executemany(
+            'DELETE FROM pending_trades WHERE tx_hash = ? AND log_index = ?',
+            [(trade[1], trade[2]) for trade in trades]
+        )
+        conn.commit()
+        promoted_count += len(trades)
+    
+    return {'promoted': promoted_count, 'inserted': inserted_count}
+
+
+def refresh_market_stats(conn, market_ids=None):
+    """修正市场统计中的 24 小时成交量
+    
+    Args:
+        conn: 数据库连接
+        market_ids: 可选的市场 ID 可迭代对象，默认刷新全部市场
+    """
+    cursor = conn.cursor()
+    refresh_rolling_volume(cursor, market_ids)
+    _bump_data_generation(cursor)
+    conn.commit()
+
+
+def _begin_immediate(conn):
+    """开启写事务并立即获取写锁，保证跨进程的读-改-写操作互斥"""
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute('BEGIN IMMEDIATE')
+
+
+def _merge_indexed_range(cursor, from_block, to_block):
+    """在当前事务中合并一个已索引区间"""
+    cursor.execute('''
+    SELECT from_block, to_block FROM indexed_ranges
+    WHERE to_block >= ? AND from_block <= ?
+    ''', (from_block - 1, to_block + 1))
+    overlapping = cursor.fetchall()
+    
+    if overlapping:
+        from_block = min(from_block, min(row[0] for row in overlapping))
+        to_block = max(to_block, max(row[1] for row in overlapping))
+        cursor.executemany('DELETE FROM indexed_ranges WHERE from_block = ?', [(row[0],) for row in overlapping])
+    
+    cursor.execute('INSERT INTO indexed_ranges (from_block, to_block) VALUES (?, ?)', (from_block, to_block))
+
+
+def record_indexed_range(conn, from_block, to_block):
+    """记录已完成索引的区块区间，与重叠或相邻的区间合并
+    
+    Args:
+        conn: 数据库连接
+        from_block: 起始区块
+        to_block: 结束区块
+    """
+    _begin_immediate(conn)
+    try:
+        _merge_indexed_range(conn.cursor(), from_block, to_block)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def fetch_indexed_ranges(conn, from_block, to_block):
+    """获取与指定范围相交的已索引区间
+    
+    Args:
+        conn: 数据库连接
+        from_block: 起始区块
+        to_block: 结束区块
+        
+    Returns:
+        list: (from_block, to_block) 元组列表，按起始区块升序
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+    SELECT from_block, to_block FROM indexed_ranges
+    WHERE to_block >= ? AND from_block <= ?
+    ORDER BY from_block
+    ''', (from_block, to_block))
+    return cursor.fetchall()
+
+
+def _subtract_ranges(from_block, to_block, covered):
+    """计算 [from_block, to_block] 中未被 covered 区间覆盖的空洞"""
+    gaps = []
+    cursor_block = from_block
+    for start, end in sorted(covered):
+        if end < cursor_block:
+            continue
+        if start > to_block:
+            break
+        if start > cursor_block:
+            gaps.append((cursor_block, start - 1))
+        cursor_block = max(cursor_block, end + 1)
+    if cursor_block <= to_block:
+        gaps.append((cursor_block, to_block))
+    return gaps
+
+
+def find_range_gaps(conn, from_block, to_block):
+    """找出指定范围内尚未索引的区块空洞
+    
+    Args:
+        conn: 数据库连接
+        from_block: 起始区块
+        to_block: 结束区块
+        
+    Returns:
+        list: (from_block, to_block) 空洞列表，按起始区块升序
+    """
+    return _subtract_ranges(from_block, to_block, fetch_indexed_ranges(conn, from_block, to_block))
+
+
+def claim_range_lease(conn, worker_id, from_block, to_block, span, ttl_seconds):
+    """领取一个尚未索引且未被其他进程租用的区块区间
+    
+    在 BEGIN IMMEDIATE 事务中完成查找与登记，多个进程同时领取时不会拿到重叠的区间。
+    
+    Args:
+        conn: 数据库连接
+        worker_id: 工作进程标识
+        from_block: 回填范围起始区块
+        to_block: 回填范围结束区块
+        span: 单个租约的最大区块数
+        ttl_seconds: 租约有效期（秒），过期后可被其他进程领取
+        
+    Returns:
+        tuple: 领取到的 (from_block, to_block)，没有可领取的区间时返回 None
+    """
+    cursor = conn.cursor()
+    now = time.time()
+    _begin_immediate(conn)
+    try:
+        cursor.execute('DELETE FROM range_leases WHERE expires_at < ?', (now,))
+        cursor.execute('''
+        SELECT from_block, to_block FROM range_leases
+        WHERE to_block >= ? AND from_block <= ?
+        ''', (from_block, to_block))
+        leased = cursor.fetchall()
+        
+        gaps = _subtract_ranges(from_block, to_block, fetch_indexed_ranges(conn, from_block, to_block) + leased)
+        if not gaps:
+            conn.commit()
+            return None
+        
+        lease_from = gaps[0][0]
+        lease_to = min(gaps[0][1], lease_from + span - 1)
+        cursor.execute('''
+        INSERT INTO range_leases (from_block, to_block, worker_id, expires_at)
+        VALUES (?, ?, ?, ?)
+        ''', (lease_from, lease_to, worker_id, now + ttl_seconds))
+        conn.commit()
+        return lease_from, lease_to
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def renew_range_lease(conn, from_block, worker_id, ttl_seconds):
+    """延长租约有效期
+    
+    Args:
+        conn: 数据库连接
+        from_block: 租约起始区块
+        worker_id: 工作进程标识
+        ttl_seconds: 从现在起的有效期（秒）
+        
+    Returns:
+        bool: 租约仍属于该进程时返回 True
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+    UPDATE range_leases SET expires_at = ? WHERE from_block = ? AND worker_id = ?
+    ''', (time.time() + ttl_seconds, from_block, worker_id))
+    conn.commit()
+    return cursor.rowcount > 0
+
+
+def release_range_lease(conn, from_block, worker_id):
+    """释放租约
+    
+    Args:
+        conn: 数据库连接
+        from_block: 租约起始区块
+        worker_id: 工作进程标识
+    """
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM range_leases WHERE from_block = ? AND worker_id = ?', (from_block, worker_id))
+    conn.commit()
+
+
 def get_sync_state(conn, key='global_indexer'):
     """获取同步状态
     
@@ -215,6 +871,20 @@ def get_sync_state(conn, key='global_indexer'):
     }
 
 
+def fetch_sync_states(conn):
+    """获取全部同步状态
+    
+    Args:
+        conn: 数据库连接
+        
+    Returns:
+        dict: 状态键名 → last_block
+    """
+    cursor = conn.cursor()
+    cursor.execute('SELECT key, last_block FROM sync_state ORDER BY key')
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+
 def update_sync_state(conn, last_block, key='global_indexer'):
     """更新同步状态
     
@@ -234,4 +904,57 @@ def update_sync_state(conn, last_block, key='global_indexer'):
         updated_at = ?
     ''', (key, last_block, now, now))
     
-    conn.commit()
\ No newline at end of file
+    conn.commit()
+
+
+def get_metadata(conn, key, default=0):
+    """获取元数据值
+    
+    Args:
+        conn: 数据库连接
+        key: 键名
+        default: 键不存在时的返回值
+        
+    Returns:
+        int: 元数据值
+    """
+    cursor = conn.cursor()
+    cursor.execute('SELECT value FROM metadata WHERE key = ?', (key,))
+    row = cursor.fetchone()
+    return row[0] if row else default
+
+
+def fetch_metadata(conn):
+    """获取全部元数据
+    
+    Args:
+        conn: 数据库连接
+        
+    Returns:
+        dict: 键名 → 值
+    """
+    cursor = conn.cursor()
+    cursor.execute('SELECT key, value FROM metadata ORDER BY key')
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+
+def set_metadata(conn, key, value):
+    """设置元数据值
+    
+    Args:
+        conn: 数据库连接
+        key: 键名
+        value: 整数值
+    """
+    cursor = conn.cursor()
+    now = datetime.now().isoformat()
+    
+    cursor.execute('''
+    INSERT INTO metadata (key, value, updated_at)
+    VALUES (?, ?, ?)
+    ON CONFLICT (key) DO UPDATE SET
+        value = excluded.value,
+        updated_at = excluded.updated_at
+    ''', (key, value, now))
+    
+    conn.commit()
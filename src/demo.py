@@ -5,22 +5,57 @@ import sqlite3
 from web3 import Web3
 from dotenv import load_dotenv
 import os
+import socket
 from src.db.schema import init_db
-from src.indexer.run import run_indexer
+from src.indexer.profiler import AllThreadsProfile, StageProfiler
+from src.indexer.run import run_backfill_worker, run_follow, run_indexer
+from src.log import configure_logging
+from src.metrics import start_http_server
 
 
 def main():
     """主函数"""
     parser = argparse.ArgumentParser()
     parser.add_argument('--tx-hash', help='交易哈希')
-    parser.add_argument('--event-slug', help='事件 slug')
+    parser.add_argument('--event-slug', nargs='+', help='事件 slug（可指定多个）')
     parser.add_argument('--reset-db', action='store_true', help='重置数据库')
     parser.add_argument('--db', default='./data/demo_indexer.db', help='数据库路径')
     parser.add_argument('--output', default='./data/demo_output.json', help='输出文件路径')
     parser.add_argument('--from-block', type=int, default=66000000, help='起始区块')
     parser.add_argument('--to-block', type=int, default=66000000, help='结束区块')
+    parser.add_argument('--rpc-batch-size', type=int, default=100, help='JSON-RPC 批量请求大小')
+    parser.add_argument('--write-batch-size', type=int, default=10000, help='每个写入事务的最大交易数')
+    parser.add_argument('--fetch-concurrency', type=int, default=1,
+                        help='同时获取日志的区块窗口数，大于 1 时以流水线方式获取、解码、补全与写入')
+    parser.add_argument('--follow', action='store_true', help='持续跟随链头索引（从同步状态或 --from-block 开始）')
+    parser.add_argument('--confirmations', type=int, default=5, help='跟随模式的确认深度')
+    parser.add_argument('--poll-interval', type=float, default=2.0, help='跟随模式的轮询间隔（秒）')
+    parser.add_argument('--worker', action='store_true', help='以租约方式并行回填 --from-block 到 --to-block（可启动多个进程）')
+    parser.add_argument('--worker-id', default=f'{socket.gethostname()}-{os.getpid()}', help='回填工作进程标识')
+    parser.add_argument('--lease-span', type=int, default=100000, help='单个租约的最大区块数')
+    parser.add_argument('--lease-ttl', type=int, default=600, help='租约有效期（秒）')
+    parser.add_argument('--gamma-concurrency', type=int, default=8, help='Gamma API 的最大并发请求数')
+    parser.add_argument('--gamma-rate-limit', type=float, default=20.0, help='Gamma API 每秒最多请求数（0 表示不限速）')
+    parser.add_argument('--gamma-cache-dir', help='Gamma API 条件请求的磁盘缓存目录')
+    parser.add_argument('--changed-only', action='store_true', help='市场发现只获取上次运行以来有更新的事件与市场')
+    parser.add_argument('--skip-discovery', action='store_true', help='跳过市场发现，只按需解析索引中遇到的未知 token')
+    parser.add_argument('--no-resolve-tokens', action='store_true', help='不向 Gamma 查询未知 token，直接跳过其交易')
+    parser.add_argument('--unknown-token-ttl', type=int, default=3600, help='查不到市场的 token 的负缓存有效期（秒）')
+    parser.add_argument('--log-level', default='INFO', help='日志级别（DEBUG 输出逐块进度）')
+    parser.add_argument('--log-format', choices=['text', 'json'], default='text', help='日志格式')
+    parser.add_argument('--metrics-port', type=int, help='在该端口导出 Prometheus 指标')
+    parser.add_argument('--profile', action='store_true', help='按阶段统计墙钟与 CPU 时间，写入输出文件的 profile 字段')
+    parser.add_argument('--profile-dump', help='同时用 cProfile 记录整个运行（包括流水线等工作线程，各线程统计合并）并保存到该文件（可用 pstats 或 snakeviz 查看）')
     args = parser.parse_args()
     
+    configure_logging(args.log_level, args.log_format)
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+    
+    # 只指定一个事件时保持字符串形式
+    if args.event_slug and len(args.event_slug) == 1:
+        args.event_slug = args.event_slug[0]
+    
     # 加载环境变量
     load_dotenv()
     
@@ -37,27 +72,79 @@ def main():
     conn = init_db(args.db)
     
     # 运行索引器
-    settings = {}
-    results = run_indexer(
-        w3=w3,
-        conn=conn,
-        settings=settings,
-        from_block=args.from_block,
-        to_block=args.to_block,
-        event_slug=args.event_slug
-    )
+    settings = {
+        'rpc_batch_size': args.rpc_batch_size,
+        'write_batch_size': args.write_batch_size,
+        'fetch_concurrency': args.fetch_concurrency,
+        'confirmations': args.confirmations,
+        'poll_interval': args.poll_interval,
+        'lease_span': args.lease_span,
+        'lease_ttl': args.lease_ttl,
+        'gamma_concurrency': args.gamma_concurrency,
+        'gamma_rate_limit': args.gamma_rate_limit,
+        'gamma_cache_dir': args.gamma_cache_dir,
+        'discovery_changed_only': args.changed_only,
+        'skip_discovery': args.skip_discovery,
+        'resolve_unknown_tokens': not args.no_resolve_tokens,
+        'unknown_token_ttl': args.unknown_token_ttl
+    }
+    profiler = StageProfiler() if args.profile or args.profile_dump else None
+    if profiler:
+        settings['profiler'] = profiler
+    cprofile = AllThreadsProfile() if args.profile_dump else None
+    if cprofile:
+        cprofile.enable()
+    
+    if args.worker:
+        results = run_backfill_worker(
+            w3=w3,
+            conn=conn,
+            settings=settings,
+            from_block=args.from_block,
+            to_block=args.to_block,
+            worker_id=args.worker_id,
+            event_slug=args.event_slug
+        )
+    elif args.follow:
+        results = run_follow(
+            w3=w3,
+            conn=conn,
+            settings=settings,
+            start_block=args.from_block,
+            event_slug=args.event_slug
+        )
+    else:
+        results = run_indexer(
+            w3=w3,
+            conn=conn,
+            settings=settings,
+            from_block=args.from_block,
+            to_block=args.to_block,
+            event_slug=args.event_slug
+        )
+    
+    if cprofile:
+        cprofile.disable()
+        os.makedirs(os.path.dirname(args.profile_dump) or '.', exist_ok=True)
+        cprofile.dump_stats(args.profile_dump)
     
     # 构建输出结果
     output = {
         'stage2': {
-            'from_block': args.from_block,
-            'to_block': args.to_block,
+            'from_block': results['trades_indexer']['from_block'],
+            'to_block': results['trades_indexer']['to_block'],
             'inserted_trades': results['trades_indexer']['inserted_trades'],
             'market_slug': args.event_slug,
             'market_count': results['market_discovery']['market_count'],
             'db_path': args.db
         }
     }
+    if 'gaps' in results['trades_indexer']:
+        output['stage2']['gaps'] = results['trades_indexer']['gaps']
+    if profiler:
+        output['profile'] = profiler.report()
+        if args.profile_dump:
+            output['profile']['cprofile_dump'] = args.profile_dump
     
     # 输出结果
     output_json = json.dumps(output, indent=2, ensure_ascii=False)
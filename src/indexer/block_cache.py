@@ -0,0 +1,128 @@
+"""有界区块头缓存"""
+from collections import OrderedDict
+
+from src.db.store import fetch_blocks, upsert_blocks
+from src.metrics import Counter
+
+
+# 区块头查询按来源计数：memory（内存命中）、db（blocks 表命中）、rpc（向节点请求）
+BLOCK_CACHE_LOOKUPS = Counter('polymarket_block_cache_lookups_total', 'Block header lookups by source', ['source'])
+
+
+class BlockHeaderCache:
+    """区块头缓存
+
+    内存中保留最近使用的区块头（LRU 淘汰），未命中时依次查询 blocks 表和 RPC 节点，
+    从节点获取的区块头会写回 blocks 表，重复运行同一区块范围时无需再请求节点。
+    """
+
+    def __init__(self, max_size=100000):
+        """初始化区块头缓存
+
+        Args:
+            max_size: 内存中保留的最大区块数
+        """
+        self.max_size = max(1, int(max_size))
+        self._headers = OrderedDict()
+
+        # 命中统计
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._headers)
+
+    def __contains__(self, block_number):
+        return block_number in self._headers
+
+    def get(self, block_number):
+        """从内存中获取区块头
+
+        Args:
+            block_number: 区块号
+
+        Returns:
+            dict: 区块头，不在内存中时返回 None
+        """
+        header = self._headers.get(block_number)
+        if header is not None:
+            self._headers.move_to_end(block_number)
+        return header
+
+    def put(self, header):
+        """放入区块头，超出容量时淘汰最久未使用的区块
+
+        Args:
+            header: 区块头字典，包含 number、hash、parent_hash、timestamp
+        """
+        number = header["number"]
+        self._headers[number] = header
+        self._headers.move_to_end(number)
+        while len(self._headers) > self.max_size:
+            self._headers.popitem(last=False)
+
+    def discard_from(self, block_number):
+        """丢弃区块号大于 block_number 的内存缓存（用于区块重组回滚）
+
+        Args:
+            block_number: 分叉点区块号
+        """
+        for number in [number for number in self._headers if number > block_number]:
+            del self._headers[number]
+
+    def load(self, conn, block_numbers, fetch_fn=None):
+        """批量加载区块头
+
+        Args:
+            conn: 数据库连接
+            block_numbers: 区块号可迭代对象
+            fetch_fn: 可选的远程获取函数，签名为 fetch_fn(numbers) -> {number: header}
+
+        Returns:
+            dict: 区块号 → 区块头，无法获取的区块不会出现在结果中
+        """
+        found = {}
+        missing = set()
+        for number in set(block_numbers):
+            header = self.get(number)
+            if header is None:
+                missing.add(number)
+            else:
+                found[number] = header
+        self.hits += len(found)
+        BLOCK_CACHE_LOOKUPS.inc(len(found), source='memory')
+
+        if missing:
+            stored = fetch_blocks(conn, missing)
+            self.db_hits += len(stored)
+            BLOCK_CACHE_LOOKUPS.inc(len(stored), source='db')
+            for number, header in stored.items():
+                self.put(header)
+                found[number] = header
+            missing.difference_update(stored)
+
+        if missing and fetch_fn is not None:
+            self.misses += len(missing)
+            BLOCK_CACHE_LOOKUPS.inc(len(missing), source='rpc')
+            fetched = fetch_fn(missing)
+            if fetched:
+                upsert_blocks(conn, fetched.values())
+                for number, header in fetched.items():
+                    self.put(header)
+                    found[number] = header
+
+        return found
+
+    def stats(self):
+        """获取缓存统计
+
+        Returns:
+            dict: 命中统计与当前大小
+        """
+        return {
+            "hits": self.hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "size": len(self._headers)
+        }
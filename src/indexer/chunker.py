@@ -0,0 +1,189 @@
+"""自适应区块范围分块器"""
+import re
+import threading
+import time
+
+
+# 节点拒绝过大查询范围时常见的错误信息片段（小写匹配）。只匹配明确的范围与结果数量上限，
+# 超时、限流等临时错误不缩小窗口，按退避重试处理
+RANGE_ERROR_MARKERS = (
+    "too many results",
+    "more than 10000 results",
+    "query returned more than",
+    "range too large",
+    "range is too large",
+    "exceed maximum block range",
+    "exceeds maximum block range",
+    "response size exceeded",
+    "response size should not",
+    "-32005",
+)
+
+# Alchemy 等节点会在错误信息中给出建议的区块范围，如 [0x3ef1480, 0x3ef1d70]
+SUGGESTED_RANGE_PATTERN = re.compile(r"\[\s*0x([0-9a-fA-F]+)\s*,\s*0x([0-9a-fA-F]+)\s*\]")
+
+
+def is_range_error(error):
+    """判断异常是否表示查询范围过大
+
+    Args:
+        error: 异常对象
+
+    Returns:
+        bool: 是否为范围过大错误
+    """
+    message = str(error).lower()
+    return any(marker in message for marker in RANGE_ERROR_MARKERS)
+
+
+def suggested_range_size(error):
+    """从错误信息中提取节点建议的范围大小
+
+    Args:
+        error: 异常对象
+
+    Returns:
+        int: 建议的区块数量，无法提取时返回 None
+    """
+    match = SUGGESTED_RANGE_PATTERN.search(str(error))
+    if not match:
+        return None
+    start, end = int(match.group(1), 16), int(match.group(2), 16)
+    if end < start:
+        return None
+    return end - start + 1
+
+
+class AdaptiveChunker:
+    """自适应区块范围分块器
+
+    遇到范围过大错误时拆分窗口，调用快时扩大窗口，调用慢时缩小窗口。
+    当前窗口大小保存在 size 属性中，调用方可以在多次运行之间持久化。
+    多个线程可以同时调用 iter_ranges（如流水线的并发获取），窗口大小与退避状态的读写由锁保护。
+    """
+
+    def __init__(
+        self,
+        initial_size=2000,
+        min_size=1,
+        max_size=100000,
+        target_seconds=2.0,
+        grow_factor=2.0,
+        shrink_factor=0.5,
+        max_retries=5,
+        backoff_seconds=1.0,
+        ceiling_reset_after=20
+    ):
+        """初始化分块器
+
+        Args:
+            initial_size: 初始窗口大小（区块数）
+            min_size: 最小窗口大小
+            max_size: 最大窗口大小
+            target_seconds: 单次调用的目标耗时（秒）
+            grow_factor: 快速调用后的扩大倍数
+            shrink_factor: 慢速调用或范围错误后的缩小倍数
+            max_retries: 非范围错误的最大重试次数
+            backoff_seconds: 重试的初始退避时间（秒）
+            ceiling_reset_after: 连续成功多少次后解除范围错误留下的增长上限
+        """
+        self.min_size = max(1, int(min_size))
+        self.max_size = max(self.min_size, int(max_size))
+        self.target_seconds = target_seconds
+        self.grow_factor = grow_factor
+        self.shrink_factor = shrink_factor
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.ceiling_reset_after = ceiling_reset_after
+        self.size = initial_size
+        self._lock = threading.Lock()
+        
+        # 最近一次范围错误的窗口大小，避免反复增长到必然失败的大小
+        self._ceiling = None
+        self._last_good_size = None
+        self._successes_since_error = 0
+
+    @property
+    def size(self):
+        """当前窗口大小（区块数）"""
+        return self._size
+
+    @size.setter
+    def size(self, value):
+        """设置窗口大小，自动限制在 [min_size, max_size] 之间"""
+        self._size = max(self.min_size, min(self.max_size, int(value)))
+
+    def iter_ranges(self, from_block, to_block, fetch_fn):
+        """按自适应窗口遍历区块范围
+
+        Args:
+            from_block: 起始区块
+            to_block: 结束区块
+            fetch_fn: 获取函数，签名为 fetch_fn(start, end)
+
+        Yields:
+            tuple: (start, end, fetch_fn 的返回值)，按区块顺序连续产出
+
+        Raises:
+            Exception: 最小窗口仍失败或重试耗尽时抛出最后一次异常
+        """
+        start = from_block
+        retries = 0
+
+        while start <= to_block:
+            with self._lock:
+                end = min(start + self.size - 1, to_block)
+            started_at = time.monotonic()
+
+            try:
+                result = fetch_fn(start, end)
+            except Exception as e:
+                span = end - start + 1
+                if is_range_error(e) and span > self.min_size:
+                    self._shrink_after_range_error(e, span)
+                    continue
+
+                retries += 1
+                if retries > self.max_retries:
+                    raise
+                time.sleep(self.backoff_seconds * (2 ** (retries - 1)))
+                continue
+
+            retries = 0
+            self._adjust_after_success(end - start + 1, time.monotonic() - started_at)
+
+            yield start, end, result
+            start = end + 1
+
+    def _shrink_after_range_error(self, error, span):
+        """范围过大：优先采用节点建议的范围，其次回退到上次成功的大小，否则按比例缩小"""
+        suggested = suggested_range_size(error)
+        with self._lock:
+            self._ceiling = span
+            self._successes_since_error = 0
+            if suggested and suggested < span:
+                self.size = suggested
+            elif self._last_good_size and self._last_good_size < span:
+                self.size = self._last_good_size
+            else:
+                self.size = min(self.size, span) * self.shrink_factor
+
+    def _adjust_after_success(self, span, elapsed):
+        """成功调用后按耗时扩大或缩小窗口"""
+        with self._lock:
+            # 只有满窗口的调用才能说明窗口大小是否合适
+            if span < self.size:
+                return
+            self._last_good_size = self.size
+            self._successes_since_error += 1
+            if self._ceiling and self._successes_since_error >= self.ceiling_reset_after:
+                self._ceiling = None
+
+            if elapsed < self.target_seconds / 2:
+                grown = self.size * self.grow_factor
+                if self._ceiling:
+                    # 有增长上限时在当前大小与上限之间二分逼近
+                    grown = min(grown, (self.size + self._ceiling) // 2)
+                self.size = max(self.size, grown)
+            elif elapsed > self.target_seconds:
+                self.size = self.size * self.shrink_factor
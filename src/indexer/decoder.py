@@ -0,0 +1,107 @@
+"""OrderFilled 事件批量解码器
+
+OrderFilled(bytes32 indexed orderHash, address indexed maker, address indexed taker,
+            uint256 makerAssetId, uint256 takerAssetId, uint256 makerAmountFilled,
+            uint256 takerAmountFilled, uint256 fee)
+
+data 字段由 5 个 32 字节的字组成。解码时把整批日志的 data 拼接成一块连续内存，
+再用 struct.iter_unpack 按固定步长切片，不经过 web3 的逐事件 ABI 解析。
+输出直接使用存储编码（见 src/db/codec.py），写入前无需再转换。
+"""
+import struct
+
+from src.db.codec import AMOUNT_SCALE, SIDE_CODES
+
+
+# 每条 OrderFilled 日志 data 的长度（5 个 32 字节字）
+ORDER_FILLED_DATA_SIZE = 5 * 32
+
+# 资产 ID 保留 32 字节原样，金额字只取低 8 字节，高 24 字节单独取出用于校验；fee 不入库，直接跳过
+ORDER_FILLED_STRUCT = struct.Struct(">32s32s24sQ24sQ32x")
+
+ZERO_PADDING = bytes(24)
+ZERO_WORD = bytes(32)
+
+SIDE_BUY = SIDE_CODES["BUY"]
+SIDE_SELL = SIDE_CODES["SELL"]
+
+# 解码结果中每个元组的字段顺序
+DECODED_FIELDS = (
+    "tx_hash", "log_index", "block_number", "maker", "taker",
+    "side", "token_id", "price", "size"
+)
+
+
+def _to_bytes(value):
+    """将 HexBytes/bytes/十六进制字符串统一转换为 bytes"""
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    return bytes(value)
+
+
+def _to_int(value):
+    """将整数或十六进制字符串统一转换为 int"""
+    if isinstance(value, int):
+        return value
+    return int(value, 16)
+
+
+def decode_order_filled_logs(logs):
+    """批量解码 OrderFilled 日志
+
+    maker 支付 USDC（makerAssetId 为 0）时记为 BUY，token_id 取 takerAssetId，
+    否则记为 SELL，token_id 取 makerAssetId。价格为 USDC 数量除以代币数量（四舍五入到
+    百万分之一单位），数量为代币数量（链上金额本身即为百万分之一单位）。
+    tx_hash、maker、taker 与 token_id 为原始字节，side 为枚举下标。
+
+    Args:
+        logs: 日志列表（web3 返回的日志或原始 JSON-RPC 日志字典）
+
+    Returns:
+        list: 元组列表，字段顺序见 DECODED_FIELDS；data 长度不符的日志会被跳过
+    """
+    # 先筛出格式正确的日志，并把 data 拼接成一块连续内存
+    valid_logs = []
+    chunks = []
+    for log in logs:
+        data = _to_bytes(log["data"])
+        if len(data) != ORDER_FILLED_DATA_SIZE or len(log["topics"]) < 4:
+            continue
+        valid_logs.append(log)
+        chunks.append(data)
+
+    buffer = b"".join(chunks)
+    decoded = []
+
+    for log, words in zip(valid_logs, ORDER_FILLED_STRUCT.iter_unpack(buffer)):
+        maker_asset, taker_asset, maker_hi, maker_amount, taker_hi, taker_amount = words
+
+        # 金额超过 64 位时回退到完整的 256 位整数
+        if maker_hi != ZERO_PADDING:
+            maker_amount = int.from_bytes(maker_hi, "big") << 64 | maker_amount
+        if taker_hi != ZERO_PADDING:
+            taker_amount = int.from_bytes(taker_hi, "big") << 64 | taker_amount
+
+        if maker_asset == ZERO_WORD:
+            side = SIDE_BUY
+            token_id = taker_asset
+            usdc_amount, token_amount = maker_amount, taker_amount
+        else:
+            side = SIDE_SELL
+            token_id = maker_asset
+            usdc_amount, token_amount = taker_amount, maker_amount
+
+        topics = log["topics"]
+        decoded.append((
+            _to_bytes(log["transactionHash"]),
+            _to_int(log["logIndex"]),
+            _to_int(log["blockNumber"]),
+            _to_bytes(topics[2])[-20:],
+            _to_bytes(topics[3])[-20:],
+            side,
+            token_id,
+            (usdc_amount * AMOUNT_SCALE * 2 + token_amount) // (token_amount * 2) if token_amount else 0,
+            token_amount
+        ))
+
+    return decoded
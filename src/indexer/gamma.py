@@ -0,0 +1,335 @@
+"""Gamma API 客户端"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+logger = logging.getLogger(__name__)
+
+# 需要退避重试的 HTTP 状态码
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+def parse_updated_at(value):
+    """解析 Gamma 返回的 updatedAt
+
+    Args:
+        value: ISO 8601 时间字符串
+
+    Returns:
+        datetime: 带时区的时间（无时区的按 UTC 处理），无法解析时返回 None
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+class RateLimiter:
+    """线程安全的请求速率限制器（按固定间隔分配请求时间槽）"""
+
+    def __init__(self, rate):
+        """初始化速率限制器
+
+        Args:
+            rate: 每秒最多请求数，None 或 0 表示不限速
+        """
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """等待直到可以发出下一个请求"""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class GammaClient:
+    """Gamma API 客户端
+
+    所有请求复用同一个带连接池的 requests.Session，经过全局速率限制，
+    遇到网络错误、429 与 5xx 时按指数退避重试（优先使用 Retry-After）。
+    列表端点按 limit/offset 分页，同时请求 concurrency 个页面。
+    指定 cache_dir 时，带 ETag 或 Last-Modified 的响应会缓存到磁盘，
+    之后的相同请求以条件请求发出，服务端返回 304 时直接使用缓存的响应体。
+    """
+
+    def __init__(
+        self,
+        base_url="https://gamma-api.polymarket.com",
+        concurrency=8,
+        rate_limit=20.0,
+        page_size=500,
+        max_retries=4,
+        backoff_seconds=0.5,
+        timeout=10,
+        session=None,
+        cache_dir=None,
+        cache_max_entries=1000
+    ):
+        """初始化 Gamma API 客户端
+
+        Args:
+            base_url: Gamma API 地址
+            concurrency: 同时进行的最大请求数
+            rate_limit: 每秒最多请求数，None 或 0 表示不限速
+            page_size: 分页请求的 limit
+            max_retries: 单个请求的最大重试次数
+            backoff_seconds: 重试的初始退避时间（秒）
+            timeout: HTTP 请求超时时间（秒）
+            session: 可选的 requests.Session，默认新建一个连接池大小与并发数一致的会话
+            cache_dir: 可选的条件请求缓存目录
+            cache_max_entries: 磁盘缓存的最大文件数，超出时删除最久未更新的文件
+        """
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = max(1, int(concurrency))
+        self.page_size = max(1, int(page_size))
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(rate_limit)
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+
+        self.cache_dir = cache_dir
+        self.cache_max_entries = cache_max_entries
+        self._cache_writes = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        # 请求统计
+        self.requests = 0
+        self.retries = 0
+        self.not_modified = 0
+
+    def _cache_path(self, url, params):
+        """计算请求对应的缓存文件路径"""
+        key = json.dumps([url, sorted((params or {}).items())], default=str)
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+    def _read_cache(self, path):
+        """读取缓存的响应，不存在或损坏时返回 None"""
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_cache(self, path, response, body):
+        """缓存带校验器的响应（先写临时文件再替换，避免并发读到半个文件）"""
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"etag": etag, "last_modified": last_modified, "body": body}, f)
+        os.replace(temp_path, path)
+
+        self._cache_writes += 1
+        if self._cache_writes % 100 == 0:
+            self._prune_cache()
+
+    def _prune_cache(self):
+        """删除超出 cache_max_entries 的最旧缓存文件"""
+        paths = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith(".json")]
+        if len(paths) <= self.cache_max_entries:
+            return
+        paths.sort(key=lambda path: os.path.getmtime(path))
+        for path in paths[:len(paths) - self.cache_max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get(self, path, params=None):
+        """发送 GET 请求并解析 JSON
+
+        Args:
+            path: 以 / 开头的端点路径
+            params: 查询参数
+
+        Returns:
+            解析后的 JSON 响应
+
+        Raises:
+            requests.RequestException: 重试耗尽后仍然失败
+        """
+        url = f"{self.base_url}{path}"
+        cache_path = self._cache_path(url, params) if self.cache_dir else None
+        cached = self._read_cache(cache_path) if cache_path else None
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            self.requests += 1
+            retry_after = None
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+                if response.status_code == 304 and cached:
+                    self.not_modified += 1
+                    return cached["body"]
+                if response.status_code in RETRY_STATUS_CODES:
+                    retry_after = response.headers.get("Retry-After")
+                response.raise_for_status()
+                body = response.json()
+                if cache_path:
+                    self._write_cache(cache_path, response, body)
+                return body
+            except requests.RequestException as e:
+                status = e.response.status_code if e.response is not None else None
+                if attempt >= self.max_retries or (status is not None and status not in RETRY_STATUS_CODES):
+                    raise
+                delay = self.backoff_seconds * (2 ** attempt)
+                if retry_after and retry_after.isdigit():
+                    delay = max(delay, int(retry_after))
+                attempt += 1
+                self.retries += 1
+                time.sleep(delay)
+
+    def iter_pages(self, path, params=None):
+        """按 limit/offset 遍历列表端点的全部记录
+
+        每轮并发请求若干个连续页面，页面数从 1 开始逐轮翻倍直到 concurrency，
+        只有一页的结果（如增量获取）只需一个请求。按 offset 顺序输出，遇到不满一页的响应即结束。
+
+        Args:
+            path: 列表端点路径（如 /markets、/events）
+            params: 额外的查询参数
+
+        Yields:
+            dict: 列表中的每条记录
+        """
+        params = dict(params or {})
+        offset = 0
+        pages_per_round = 1
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while True:
+                offsets = [offset + i * self.page_size for i in range(pages_per_round)]
+                pages = executor.map(
+                    lambda page_offset: self.get(path, {**params, "limit": self.page_size, "offset": page_offset}),
+                    offsets
+                )
+                for page in pages:
+                    page = page or []
+                    yield from page
+                    if len(page) < self.page_size:
+                        return
+                offset = offsets[-1] + self.page_size
+                pages_per_round = min(pages_per_round * 2, self.concurrency)
+
+    def iter_updated_since(self, path, since, params=None):
+        """按 updatedAt 降序遍历列表端点，遇到早于 since 的记录即停止
+
+        Args:
+            path: 列表端点路径（如 /markets、/events）
+            since: 起始时间（datetime，带时区），为 None 时遍历全部记录
+            params: 额外的查询参数
+
+        Yields:
+            dict: updatedAt 不早于 since 的记录
+        """
+        params = {**(params or {}), "order": "updatedAt", "ascending": "false"}
+        for item in self.iter_pages(path, params):
+            updated_at = parse_updated_at(item.get("updatedAt"))
+            if since is not None and updated_at is not None and updated_at < since:
+                return
+            yield item
+
+    def get_markets(self, **params):
+        """获取全部市场
+
+        Args:
+            params: /markets 的过滤参数（如 closed=false）
+
+        Returns:
+            list: 市场列表
+        """
+        return list(self.iter_pages("/markets", params))
+
+    def get_events(self, **params):
+        """获取全部事件（每个事件包含其市场列表）
+
+        Args:
+            params: /events 的过滤参数（如 closed=false）
+
+        Returns:
+            list: 事件列表
+        """
+        return list(self.iter_pages("/events", params))
+
+    def get_markets_by_token_ids(self, token_ids, batch_size=50):
+        """按 CLOB token id 批量获取市场
+
+        每个请求携带最多 batch_size 个 clob_token_ids 参数，多个批次并发请求。
+
+        Args:
+            token_ids: 十进制字符串形式的 token id 列表
+            batch_size: 单个请求的最大 token id 数量（受 URL 长度限制）
+
+        Returns:
+            list: 市场列表（每个市场的 events 字段包含其所属事件）
+
+        Raises:
+            requests.RequestException: 重试耗尽后仍然失败
+        """
+        token_ids = list(dict.fromkeys(token_ids))
+        batches = [token_ids[start:start + batch_size] for start in range(0, len(token_ids), batch_size)]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            pages = executor.map(
+                lambda batch: self.get("/markets", {"clob_token_ids": batch, "limit": len(batch) * 2}),
+                batches
+            )
+            return [market for page in pages for market in page or []]
+
+    def get_events_by_slugs(self, slugs):
+        """并发获取多个事件
+
+        Args:
+            slugs: 事件 slug 列表
+
+        Returns:
+            dict: slug → 事件字典；不存在或请求失败的 slug 映射为 None
+        """
+        slugs = list(dict.fromkeys(slugs))
+
+        def fetch(slug):
+            try:
+                events = self.get("/events", {"slug": slug})
+            except requests.RequestException as e:
+                logger.warning("Failed to fetch event %s: %s", slug, e)
+                return None
+            return events[0] if events else None
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            return dict(zip(slugs, executor.map(fetch, slugs)))
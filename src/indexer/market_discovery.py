@@ -1,15 +1,30 @@
 """市场发现服务"""
+import hashlib
+import json
+import logging
 import requests
-from datetime import datetime
-from src.db.store import upsert_event, upsert_market
+from datetime import datetime, timezone
+from src.db.store import fetch_catalog_hashes, fetch_event_ids, get_metadata, set_metadata, upsert_catalog
+from src.indexer.gamma import GammaClient, parse_updated_at
+
+
+logger = logging.getLogger(__name__)
+
+# 在 metadata 中保存已处理的最大 Gamma updatedAt（Unix 秒）的键名
+CATALOG_WATERMARK_KEY = 'catalog_updated_at'
 
 
 class MarketDiscoveryService:
     """市场发现服务类"""
     
-    def __init__(self):
-        """初始化市场发现服务"""
-        self.gamma_api_base = "https://gamma-api.polymarket.com"
+    def __init__(self, gamma=None):
+        """初始化市场发现服务
+        
+        Args:
+            gamma: Gamma API 客户端，默认使用 GammaClient 的默认配置
+        """
+        self.gamma = gamma or GammaClient()
+        self.gamma_api_base = self.gamma.base_url
     
     def get_markets_by_event_slug(self, event_slug):
         """通过事件 slug 获取市场列表
@@ -20,128 +35,260 @@ class MarketDiscoveryService:
         Returns:
             list: 市场列表
         """
-        # 使用正确的 API 端点格式
-        url = f"{self.gamma_api_base}/events?slug={event_slug}"
+        event = self.gamma.get_events_by_slugs([event_slug]).get(event_slug)
         
-        try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            events = response.json()
-            
-            # 检查响应是否为空
-            if not events:
-                print(f"No events found for slug '{event_slug}'")
-                return []
-            
-            # 获取第一个事件（通常只有一个）
-            event = events[0]
-            
-            # 检查是否有 markets 字段
-            if "markets" not in event or not event["markets"]:
-                print(f"No markets found for event with slug '{event_slug}'")
-                return []
-            
-            # 获取市场列表
-            markets = event["markets"]
-            print(f"成功从 {url} 获取 {len(markets)} 个市场")
-            return markets
-            
-        except requests.RequestException as e:
-            print(f"Failed to fetch markets for event {event_slug}: {str(e)}")
+        # 检查响应是否为空
+        if not event:
+            logger.warning("No events found for slug '%s'", event_slug)
             return []
-        except (IndexError, KeyError) as e:
-            print(f"Invalid API response structure: {str(e)}")
+        
+        # 检查是否有 markets 字段
+        if not event.get("markets"):
+            logger.warning("No markets found for event with slug '%s'", event_slug)
             return []
+        
+        return event["markets"]
     
     def get_all_markets(self):
-        """获取所有市场
+        """分页获取所有市场
         
         Returns:
             list: 市场列表
         """
-        url = f"{self.gamma_api_base}/markets"
+        try:
+            return self.gamma.get_markets()
+        except requests.RequestException as e:
+            logger.error("Failed to fetch all markets: %s", e)
+            return []
+    
+    def get_all_events(self):
+        """分页获取所有事件（每个事件包含其市场列表）
         
+        Returns:
+            list: 事件列表
+        """
         try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            markets = response.json()
-            
-            return markets
-            
+            return self.gamma.get_events()
         except requests.RequestException as e:
-            print(f"Failed to fetch all markets: {str(e)}")
+            logger.error("Failed to fetch all events: %s", e)
             return []
     
-    def discover_markets(self, conn, event_slug=None):
+    def get_changed_catalog(self, conn, since):
+        """获取 since 之后有更新的事件与市场
+        
+        事件与市场分别按 updatedAt 降序分页，遇到更早的记录即停止。单独更新的市场
+        所属事件不在本地也不在本次结果中时，按 slug 补充获取，保证市场能关联到事件。
+        
+        Args:
+            conn: 数据库连接
+            since: 起始时间（datetime，带时区），为 None 时获取全部
+        
+        Returns:
+            tuple: (事件列表, [(市场, 事件 slug)] 列表)
+        """
+        events = list(self.gamma.iter_updated_since("/events", since))
+        markets = []
+        for market in self.gamma.iter_updated_since("/markets", since):
+            parent_events = market.get("events") or []
+            markets.append((market, parent_events[0].get("slug") if parent_events else None))
+        
+        # 补充获取本地缺失的父事件
+        known_slugs = {event.get("slug") for event in events}
+        wanted_slugs = {slug for _, slug in markets if slug and slug not in known_slugs}
+        missing_slugs = wanted_slugs - set(fetch_event_ids(conn, wanted_slugs))
+        if missing_slugs:
+            events.extend(event for event in self.gamma.get_events_by_slugs(missing_slugs).values() if event)
+        
+        return events, markets
+    
+    def discover_markets(self, conn, event_slug=None, changed_only=False):
         """发现市场并存储
         
+        每个事件与市场的内容哈希和 Gamma updatedAt 记录在 catalog_hashes 表中，
+        内容未变化的记录不会写入数据库。
+        
         Args:
             conn: 数据库连接
-            event_slug: 事件 slug，如果为 None 则获取所有市场
-            
+            event_slug: 事件 slug 或 slug 列表，如果为 None 则分页获取全部事件及其市场
+            changed_only: 未指定 event_slug 时，只获取上次运行以来 updatedAt 有变化的事件与市场
+        
         Returns:
-            int: 发现的市场数量
+            dict: market_count（发现的市场数量）以及事件、市场的 inserted/updated/unchanged 计数
         """
+        requests_before, retries_before = self.gamma.requests, self.gamma.retries
+        not_modified_before = self.gamma.not_modified
+        loose_markets = []
         if event_slug:
-            # 获取指定事件的市场
-            markets = self.get_markets_by_event_slug(event_slug)
-            
-            # 获取事件信息
-            event_info = self._get_event_info(event_slug)
-            if event_info:
-                upsert_event(conn, event_info)
+            # 并发获取指定的事件
+            slugs = [event_slug] if isinstance(event_slug, str) else list(event_slug)
+            events = []
+            for slug, event in self.gamma.get_events_by_slugs(slugs).items():
+                if event:
+                    events.append(event)
+                else:
+                    logger.warning("No events found for slug '%s'", slug)
+        elif changed_only:
+            # 只获取上次运行以来有更新的事件与市场
+            watermark = get_metadata(conn, CATALOG_WATERMARK_KEY)
+            since = datetime.fromtimestamp(watermark, timezone.utc) if watermark else None
+            events, loose_markets = self.get_changed_catalog(conn, since)
         else:
-            # 获取所有市场
-            markets = self.get_all_markets()
+            # 获取全部事件
+            events = self.get_all_events()
+        logger.info(
+            "成功获取 %d 个事件、%d 个单独更新的市场（Gamma 请求 %d 次，重试 %d 次，未修改 %d 次）",
+            len(events), len(loose_markets),
+            self.gamma.requests - requests_before,
+            self.gamma.retries - retries_before,
+            self.gamma.not_modified - not_modified_before
+        )
+        
+        counts, events_data, markets_data = self._store_catalog(conn, events, loose_markets)
+        
+        # 完整获取（全量或增量）后推进 updatedAt 水位
+        if not event_slug:
+            updated_times = [
+                parse_updated_at(updated_at)
+                for _, updated_at in list(events_data.values()) + list(markets_data.values())
+            ]
+            updated_times = [updated_time for updated_time in updated_times if updated_time is not None]
+            if updated_times:
+                watermark = max(int(max(updated_times).timestamp()), get_metadata(conn, CATALOG_WATERMARK_KEY))
+                set_metadata(conn, CATALOG_WATERMARK_KEY, watermark)
         
-        # 处理每个市场
-        market_count = 0
-        for market in markets:
+        return {
+            'market_count': len(markets_data),
+            'events': counts['events'],
+            'markets': counts['markets']
+        }
+    
+    def resolve_token_ids(self, conn, token_ids):
+        """按 CLOB token id 查询并存储未知代币所属的市场
+        
+        市场响应中内嵌了所属事件，本地没有的事件直接使用内嵌数据写入，无需再按 slug 请求。
+        
+        Args:
+            conn: 数据库连接
+            token_ids: 十进制字符串形式的 token id 集合
+            
+        Returns:
+            set: 查询到所属市场的 token id
+            
+        Raises:
+            requests.RequestException: Gamma 请求重试耗尽后仍然失败
+        """
+        token_ids = set(token_ids)
+        if not token_ids:
+            return set()
+        
+        markets = []
+        parent_events = {}
+        for market in self.gamma.get_markets_by_token_ids(sorted(token_ids)):
+            events = market.get("events") or []
+            parent_slug = events[0].get("slug") if events else None
+            if parent_slug:
+                parent_events[parent_slug] = events[0]
+            markets.append((market, parent_slug))
+        
+        # 只写入本地缺失的父事件，已有事件保持完整发现得到的数据
+        missing_slugs = set(parent_events) - set(fetch_event_ids(conn, parent_events))
+        events = [parent_events[slug] for slug in missing_slugs]
+        _, _, markets_data = self._store_catalog(conn, events, markets)
+        
+        resolved = set()
+        for market_data, _ in markets_data.values():
+            resolved.update({market_data.get('yes_token_id'), market_data.get('no_token_id')} & token_ids)
+        logger.info(
+            "按 %d 个 token id 查询到 %d 个市场，其中 %d 个 token 已解析",
+            len(token_ids), len(markets_data), len(resolved)
+        )
+        return resolved
+    
+    def _store_catalog(self, conn, events, loose_markets=()):
+        """解析事件与市场并在单个事务中写入有变化的记录
+        
+        Args:
+            conn: 数据库连接
+            events: Gamma 返回的事件列表（包含各自的市场列表）
+            loose_markets: 不在事件列表中的 [(市场, 事件 slug)] 列表
+            
+        Returns:
+            tuple: (计数, 事件 slug → (事件数据, updatedAt), condition_id → (市场数据, updatedAt))
+        """
+        # 解析全部事件与市场，同一键重复出现时以最后一条为准
+        events_data = {}
+        markets_data = {}
+        market_sources = [(market, event.get("slug")) for event in events for market in event.get("markets") or []]
+        for event in events:
+            events_data[event.get("slug")] = (self._parse_event_data(event), event.get("updatedAt"))
+        for market, parent_slug in market_sources + list(loose_markets):
             try:
-                market_data = self._parse_market_data(market, event_slug)
-                if market_data:
-                    # 添加调试输出
-                    print(f"发现市场: {market_data.get('slug')}")
-                    print(f"Condition ID: {market_data.get('condition_id')}")
-                    print(f"YES Token: {market_data.get('yes_token_id')}")
-                    print(f"NO Token: {market_data.get('no_token_id')}")
-                    print("---")
-                    
-                    upsert_market(conn, market_data)
-                    market_count += 1
+                market_data = self._parse_market_data(market, parent_slug)
+                if market_data and market_data.get("condition_id"):
+                    markets_data[market_data["condition_id"]] = (market_data, market.get("updatedAt"))
             except Exception as e:
-                print(f"Error processing market {market.get('slug', 'unknown')}: {str(e)}")
+                logger.warning("Error processing market %s: %s", market.get('slug', 'unknown'), e)
                 continue
         
-        return market_count
+        # 按内容哈希过滤未变化的记录
+        changed_events, event_hashes, skipped_events = self._filter_unchanged(
+            conn, "event", events_data, exclude=("created_at",)
+        )
+        changed_markets, market_hashes, skipped_markets = self._filter_unchanged(conn, "market", markets_data)
+        
+        # 单个事务批量写入
+        counts = upsert_catalog(conn, changed_events, changed_markets, event_hashes + market_hashes)
+        counts['events']['unchanged'] += skipped_events
+        counts['markets']['unchanged'] += skipped_markets
+        logger.info("事件: %s，市场: %s", counts['events'], counts['markets'], extra=counts)
+        
+        return counts, events_data, markets_data
     
-    def _get_event_info(self, event_slug):
-        """获取事件信息
+    def _filter_unchanged(self, conn, kind, items, exclude=()):
+        """按内容哈希筛出有变化的记录
         
         Args:
-            event_slug: 事件 slug
-            
+            conn: 数据库连接
+            kind: event 或 market
+            items: 键 → (数据字典, Gamma updatedAt)
+            exclude: 不参与哈希的字段
+        
         Returns:
-            dict: 事件信息字典
+            tuple: (有变化的数据字典列表, 需要写入的哈希行列表, 未变化的记录数)
         """
-        url = f"{self.gamma_api_base}/events/{event_slug}"
+        stored = fetch_catalog_hashes(conn, kind)
+        changed = []
+        hash_rows = []
+        skipped = 0
+        for key, (data, updated_at) in items.items():
+            content = {name: value for name, value in data.items() if name not in exclude}
+            content_hash = hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode()).digest()
+            previous = stored.get(key)
+            if previous is not None and previous[0] == content_hash:
+                skipped += 1
+                if previous[1] != updated_at:
+                    hash_rows.append((kind, key, content_hash, updated_at))
+                continue
+            changed.append(data)
+            hash_rows.append((kind, key, content_hash, updated_at))
+        return changed, hash_rows, skipped
+    
+    def _parse_event_data(self, event):
+        """解析事件数据
         
-        try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            event = response.json()
-            
-            return {
-                'slug': event.get('slug'),
-                'title': event.get('title'),
-                'description': event.get('description'),
-                'status': event.get('status', 'active'),
-                'created_at': event.get('createdAt') or datetime.now().isoformat()
-            }
+        Args:
+            event: Gamma API 返回的事件
             
-        except requests.RequestException as e:
-            print(f"Failed to fetch event info for {event_slug}: {str(e)}")
-            return None
+        Returns:
+            dict: 事件信息字典
+        """
+        return {
+            'slug': event.get('slug'),
+            'title': event.get('title'),
+            'description': event.get('description'),
+            'status': event.get('status', 'active'),
+            'created_at': event.get('createdAt') or datetime.now().isoformat()
+        }
     
     def _parse_market_data(self, market, event_slug=None):
         """解析市场数据
@@ -153,8 +300,6 @@ class MarketDiscoveryService:
         Returns:
             dict: 解析后的市场数据字典
         """
-        import json
-        
         # 提取基本信息
         market_slug = market.get('slug')
         condition_id = market.get('conditionId')
@@ -171,9 +316,8 @@ class MarketDiscoveryService:
             # 处理字符串格式的 JSON 数组
             try:
                 clob_token_ids = json.loads(clob_token_ids)
-                print(f"成功解析 clobTokenIds: {clob_token_ids}")
             except json.JSONDecodeError as e:
-                print(f"Failed to decode clobTokenIds: {str(e)}")
+                logger.warning("Failed to decode clobTokenIds: %s", e)
                 clob_token_ids = None
         
         if isinstance(clob_token_ids, list) and len(clob_token_ids) >= 2:
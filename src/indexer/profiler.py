@@ -0,0 +1,162 @@
+"""分阶段耗时统计"""
+import cProfile
+import functools
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+# 按阶段计时的 TradesIndexer 方法：方法名 → 阶段名
+INDEXER_STAGES = {
+    '_get_logs': 'get_logs',
+    '_fetch_range': 'fetch_range',
+    '_parse_logs': 'parse_logs',
+    '_decode_logs': 'decode',
+    '_enrich_trades': 'enrich',
+    '_refresh_token_map': 'token_map',
+    '_get_block_timestamps': 'block_timestamps',
+    '_fetch_block_headers': 'block_headers_rpc',
+    '_store_trades': 'store_trades',
+}
+
+
+class StageProfiler:
+    """按阶段累计墙钟时间、CPU 时间与调用次数
+
+    阶段可以嵌套，每个阶段同时记录总耗时与扣除子阶段后的自身耗时。
+    CPU 时间使用 time.thread_time，多线程运行时每个线程分别计算。
+    """
+
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started_at = time.perf_counter()
+        self._cpu_started_at = time.process_time()
+
+    @contextmanager
+    def stage(self, name):
+        """以上下文管理器的方式统计一个阶段
+
+        Args:
+            name: 阶段名
+        """
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        # [子阶段墙钟时间, 子阶段 CPU 时间]
+        frame = [0.0, 0.0]
+        stack.append(frame)
+        wall_started, cpu_started = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_started
+            cpu = time.thread_time() - cpu_started
+            stack.pop()
+            if stack:
+                stack[-1][0] += wall
+                stack[-1][1] += cpu
+            with self._lock:
+                totals = self._stages.setdefault(name, [0, 0.0, 0.0, 0.0, 0.0])
+                totals[0] += 1
+                totals[1] += wall
+                totals[2] += cpu
+                totals[3] += wall - frame[0]
+                totals[4] += cpu - frame[1]
+
+    def wrap(self, name, fn):
+        """返回在 name 阶段中调用 fn 的包装函数"""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def instrument(self, obj, stages):
+        """把对象的方法替换为计时包装（只影响该实例）
+
+        Args:
+            obj: 要统计的对象
+            stages: 方法名 → 阶段名
+        """
+        for method_name, stage_name in stages.items():
+            setattr(obj, method_name, self.wrap(stage_name, getattr(obj, method_name)))
+
+    def report(self):
+        """生成阶段统计
+
+        Returns:
+            dict: 总墙钟与 CPU 时间、未归入任何阶段的墙钟时间（单线程运行时有意义），
+                  以及每个阶段的调用次数、总耗时、自身耗时与自身耗时占比
+        """
+        wall_seconds = time.perf_counter() - self._started_at
+        cpu_seconds = time.process_time() - self._cpu_started_at
+        with self._lock:
+            stages = {
+                name: {
+                    "calls": calls,
+                    "wall_seconds": round(wall, 4),
+                    "cpu_seconds": round(cpu, 4),
+                    "self_wall_seconds": round(self_wall, 4),
+                    "self_cpu_seconds": round(self_cpu, 4),
+                    "self_share": round(self_wall / wall_seconds, 4) if wall_seconds else 0.0
+                }
+                for name, (calls, wall, cpu, self_wall, self_cpu) in sorted(
+                    self._stages.items(), key=lambda item: item[1][3], reverse=True
+                )
+            }
+        staged_seconds = sum(stage["self_wall_seconds"] for stage in stages.values())
+        return {
+            "wall_seconds": round(wall_seconds, 4),
+            "cpu_seconds": round(cpu_seconds, 4),
+            "other_wall_seconds": round(max(0.0, wall_seconds - staged_seconds), 4),
+            "stages": stages
+        }
+
+
+class AllThreadsProfile:
+    """对调用线程及之后启动的全部线程运行 cProfile，结束时合并为一份统计
+
+    Python 3.12 起 cProfile 基于 sys.monitoring，一个 Profile 即覆盖全部线程；更早的版本中
+    Profile 只记录启用它的线程，这里通过 threading.setprofile 为之后启动的每个线程各启用一个。
+    """
+
+    def __init__(self):
+        self._profiles = [cProfile.Profile()]
+        self._lock = threading.Lock()
+        self._per_thread = sys.version_info < (3, 12)
+
+    def _profile_new_thread(self, frame, event, arg):
+        """新线程的第一个事件：为该线程启用独立的 Profile（同时替换掉本钩子）"""
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+
+    def enable(self):
+        """开始记录"""
+        if self._per_thread:
+            threading.setprofile(self._profile_new_thread)
+        self._profiles[0].enable()
+
+    def disable(self):
+        """停止记录（之后启动的线程不再记录）"""
+        self._profiles[0].disable()
+        if self._per_thread:
+            threading.setprofile(None)
+
+    def dump_stats(self, path):
+        """合并各线程的统计并保存为 pstats 文件
+
+        Args:
+            path: 输出文件路径
+        """
+        with self._lock:
+            profiles = list(self._profiles)
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
@@ -0,0 +1,213 @@
+"""JSON-RPC 批量请求客户端"""
+import time
+import requests
+from src.metrics import Counter, Histogram
+
+
+# 节点调用指标（eth_getLogs 等经 web3 发出的调用同样记录在这里）
+RPC_CALLS = Counter('polymarket_rpc_calls_total', 'JSON-RPC calls sent to the node', ['method'])
+RPC_ERRORS = Counter('polymarket_rpc_errors_total', 'Failed JSON-RPC requests', ['method'])
+RPC_SECONDS = Histogram('polymarket_rpc_request_seconds', 'JSON-RPC HTTP request latency', ['method'])
+
+# 节点因批量请求过大而拒绝时常见的错误信息片段（小写匹配）
+BATCH_SIZE_ERROR_MARKERS = (
+    "batch size",
+    "batch too large",
+    "batch limit",
+    "too many requests in batch",
+    "request entity too large",
+    "payload too large",
+    "response size exceeded",
+)
+
+
+class BatchTooLargeError(RuntimeError):
+    """节点拒绝了过大的批量请求（HTTP 413 或批量级别的大小错误）"""
+
+
+def is_retryable_error(error):
+    """判断批量请求的失败是否值得整批重试
+
+    连接错误、超时、HTTP 429 与 5xx，以及节点对单个调用返回的错误（RuntimeError）可以重试；
+    其余 HTTP 4xx（如鉴权失败）重试也不会成功。
+
+    Args:
+        error: 异常对象
+
+    Returns:
+        bool: 是否可以重试
+    """
+    if isinstance(error, requests.HTTPError):
+        status = error.response.status_code if error.response is not None else None
+        return status is None or status == 429 or status >= 500
+    return isinstance(error, (requests.RequestException, RuntimeError))
+
+
+class BatchRpcClient:
+    """JSON-RPC 批量请求客户端
+
+    把同一方法的多次调用合并为 JSON-RPC 批量请求发送。只有节点明确拒绝过大的批量时
+    才对半拆分；连接错误、5xx 等其他失败按指数退避整批重试，重试耗尽后抛出异常，
+    节点故障期间一个批量最多等待 backoff_seconds * (2 ** max_retries - 1) 秒。
+    """
+
+    def __init__(self, rpc_url, batch_size=100, max_retries=3, backoff_seconds=0.5, timeout=30, session=None):
+        """初始化批量请求客户端
+
+        Args:
+            rpc_url: JSON-RPC 节点地址
+            batch_size: 单个批量请求包含的最大调用数
+            max_retries: 每个批量请求的最大重试次数
+            backoff_seconds: 重试的初始退避时间（秒）
+            timeout: HTTP 请求超时时间（秒）
+            session: 可选的 requests.Session，默认新建一个以复用连接
+        """
+        self.rpc_url = rpc_url
+        self.batch_size = max(1, int(batch_size))
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self._next_id = 0
+
+    def _post(self, payload):
+        """发送 JSON-RPC 请求
+
+        Args:
+            payload: 请求体（单个请求字典或请求列表）
+
+        Returns:
+            解析后的 JSON 响应
+        """
+        response = self.session.post(self.rpc_url, json=payload, timeout=self.timeout)
+        if response.status_code == 413:
+            raise BatchTooLargeError(f"Batch of {len(payload)} requests rejected: HTTP 413")
+        response.raise_for_status()
+        return response.json()
+
+    def _execute(self, method, params_list):
+        """发送一个批量请求
+
+        Args:
+            method: JSON-RPC 方法名
+            params_list: 每个调用的参数列表
+
+        Returns:
+            list: 与 params_list 顺序一致的结果列表
+
+        Raises:
+            BatchTooLargeError: 节点拒绝了过大的批量请求
+            RuntimeError: 响应格式错误或任一调用返回错误
+            requests.RequestException: HTTP 请求失败
+        """
+        requests_payload = []
+        for params in params_list:
+            self._next_id += 1
+            requests_payload.append({"jsonrpc": "2.0", "id": self._next_id, "method": method, "params": params})
+
+        RPC_CALLS.inc(len(requests_payload), method=method)
+        with RPC_SECONDS.time(method=method):
+            responses = self._post(requests_payload)
+        if not isinstance(responses, list):
+            # 部分节点对整个批量请求返回单个错误对象
+            message = str(responses.get("error") if isinstance(responses, dict) else responses)
+            if any(marker in message.lower() for marker in BATCH_SIZE_ERROR_MARKERS):
+                raise BatchTooLargeError(f"Batch of {len(requests_payload)} {method} requests rejected: {message}")
+            raise RuntimeError(f"Invalid batch response for {method}: {responses}")
+
+        # 节点可能乱序返回，按 id 对齐
+        by_id = {item.get("id"): item for item in responses}
+        results = []
+        for request_item in requests_payload:
+            item = by_id.get(request_item["id"])
+            if item is None:
+                raise RuntimeError(f"Missing response for {method} {request_item['params']}")
+            if item.get("error"):
+                raise RuntimeError(f"{method} {request_item['params']} failed: {item['error']}")
+            results.append(item.get("result"))
+        return results
+
+    def _execute_with_split(self, method, params_list):
+        """发送批量请求，批量过大时对半拆分，其他可重试的失败整批退避重试
+
+        Args:
+            method: JSON-RPC 方法名
+            params_list: 每个调用的参数列表
+
+        Returns:
+            list: 与 params_list 顺序一致的结果列表
+
+        Raises:
+            Exception: 不可重试的错误、单个调用仍然过大或重试耗尽时抛出最后一次异常
+        """
+        attempt = 0
+        while True:
+            try:
+                return self._execute(method, params_list)
+            except BatchTooLargeError:
+                RPC_ERRORS.inc(method=method)
+                if len(params_list) <= 1:
+                    raise
+                middle = len(params_list) // 2
+                return (
+                    self._execute_with_split(method, params_list[:middle])
+                    + self._execute_with_split(method, params_list[middle:])
+                )
+            except Exception as e:
+                RPC_ERRORS.inc(method=method)
+                if attempt >= self.max_retries or not is_retryable_error(e):
+                    raise
+                time.sleep(self.backoff_seconds * (2 ** attempt))
+                attempt += 1
+
+    def call_batch(self, method, params_list):
+        """按 batch_size 分批调用同一方法
+
+        Args:
+            method: JSON-RPC 方法名
+            params_list: 每个调用的参数列表
+
+        Returns:
+            list: 与 params_list 顺序一致的结果列表
+        """
+        results = []
+        for start in range(0, len(params_list), self.batch_size):
+            results.extend(self._execute_with_split(method, params_list[start:start + self.batch_size]))
+        return results
+
+    def get_block_headers(self, block_numbers):
+        """批量获取区块头
+
+        Args:
+            block_numbers: 区块号列表
+
+        Returns:
+            dict: 区块号 → {"number", "hash", "parent_hash", "timestamp"}，不存在的区块不会出现在结果中
+        """
+        numbers = sorted(set(block_numbers))
+        blocks = self.call_batch("eth_getBlockByNumber", [[hex(number), False] for number in numbers])
+
+        headers = {}
+        for number, block in zip(numbers, blocks):
+            if not block:
+                continue
+            headers[number] = {
+                "number": number,
+                "hash": block["hash"],
+                "parent_hash": block["parentHash"],
+                "timestamp": int(block["timestamp"], 16)
+            }
+        return headers
+
+    def get_receipts(self, tx_hashes):
+        """批量获取交易回执
+
+        Args:
+            tx_hashes: 交易哈希列表
+
+        Returns:
+            dict: 交易哈希 → 原始回执字典，不存在（节点返回 null）的交易不会出现在结果中
+        """
+        hashes = list(dict.fromkeys(tx_hashes))
+        receipts = self.call_batch("eth_getTransactionReceipt", [[tx_hash] for tx_hash in hashes])
+        return {tx_hash: receipt for tx_hash, receipt in zip(hashes, receipts) if receipt}
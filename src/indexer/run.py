@@ -1,30 +1,98 @@
 """索引器核心实现"""
 from web3 import Web3
+from src.indexer.gamma import GammaClient
 from src.indexer.market_discovery import MarketDiscoveryService
+from src.indexer.profiler import INDEXER_STAGES
+from src.indexer.token_resolver import TokenResolver
 from src.indexer.trades_indexer import TradesIndexer
 
 
-def run_market_discovery(conn, event_slug=None):
+def create_gamma_client(settings):
+    """根据设置创建 Gamma API 客户端
+    
+    Args:
+        settings: 设置字典，支持 gamma_concurrency、gamma_rate_limit、gamma_cache_dir
+        
+    Returns:
+        GammaClient: Gamma API 客户端
+    """
+    return GammaClient(
+        concurrency=settings.get('gamma_concurrency', 8),
+        rate_limit=settings.get('gamma_rate_limit', 20.0),
+        cache_dir=settings.get('gamma_cache_dir')
+    )
+
+
+def run_market_discovery(conn, event_slug=None, settings=None):
     """运行市场发现服务
     
     Args:
         conn: 数据库连接
-        event_slug: 事件 slug，如果为 None 则获取所有市场
+        event_slug: 事件 slug 或 slug 列表，如果为 None 则获取所有市场
+        settings: 可选的设置字典，支持 gamma_concurrency、gamma_rate_limit、gamma_cache_dir、
+                  discovery_changed_only、skip_discovery、profiler
         
     Returns:
         dict: 运行结果
     """
-    discovery_service = MarketDiscoveryService()
+    settings = settings or {}
+    if settings.get('skip_discovery'):
+        # 跳过市场发现，由索引器按需解析未知 token
+        return {'market_count': 0, 'event_slug': event_slug}
+    
+    discovery_service = MarketDiscoveryService(create_gamma_client(settings))
+    discover_markets = discovery_service.discover_markets
+    if settings.get('profiler'):
+        discover_markets = settings['profiler'].wrap('market_discovery', discover_markets)
     
     # 发现市场
-    market_count = discovery_service.discover_markets(conn, event_slug)
+    discovery_results = discover_markets(
+        conn,
+        event_slug,
+        changed_only=settings.get('discovery_changed_only', False)
+    )
     
     return {
-        'market_count': market_count,
+        **discovery_results,
         'event_slug': event_slug
     }
 
 
+def create_trades_indexer(w3, settings):
+    """根据设置创建交易索引器
+    
+    Args:
+        w3: Web3 实例
+        settings: 设置字典，支持 resolve_unknown_tokens、unknown_token_ttl、fetch_concurrency，
+                  以及可选的 StageProfiler（profiler），用于按阶段统计索引器方法的耗时
+        
+    Returns:
+        TradesIndexer: 交易索引器
+    """
+    token_resolver = None
+    if settings.get('resolve_unknown_tokens', True):
+        token_resolver = TokenResolver(
+            MarketDiscoveryService(create_gamma_client(settings)),
+            negative_ttl=settings.get('unknown_token_ttl', 3600)
+        )
+    
+    trades_indexer = TradesIndexer(
+        w3,
+        rpc_batch_size=settings.get('rpc_batch_size', 100),
+        write_batch_size=settings.get('write_batch_size', 10000),
+        token_resolver=token_resolver,
+        fetch_concurrency=settings.get('fetch_concurrency', 1)
+    )
+    
+    profiler = settings.get('profiler')
+    if profiler:
+        profiler.instrument(trades_indexer, INDEXER_STAGES)
+        if token_resolver is not None:
+            profiler.instrument(token_resolver, {'resolve': 'token_resolve'})
+    
+    return trades_indexer
+
+
 def run_indexer(
     w3,
     conn,
@@ -57,16 +125,16 @@ def run_indexer(
         include_ctf: 是否包含 CTF 合约
         include_exchange: 是否包含交易所合约
         include_neg_risk: 是否包含负风险交易所合约
-        event_slug: 事件 slug
+        event_slug: 事件 slug 或 slug 列表
         
     Returns:
         dict: 运行结果
     """
     # 首先运行市场发现
-    market_results = run_market_discovery(conn, event_slug)
+    market_results = run_market_discovery(conn, event_slug, settings)
     
     # 运行交易索引器
-    trades_indexer = TradesIndexer(w3)
+    trades_indexer = create_trades_indexer(w3, settings)
     trade_results = trades_indexer.run_indexer(conn, from_block, to_block)
     
     # 合并结果
@@ -77,3 +145,71 @@ def run_indexer(
     }
     
     return results
+
+
+def run_follow(w3, conn, settings, start_block=None, event_slug=None):
+    """运行持续跟随模式
+    
+    市场发现只在启动时运行一次，之后索引器持续跟随链头。
+    
+    Args:
+        w3: Web3 实例
+        conn: 数据库连接
+        settings: 设置字典，支持 confirmations、poll_interval
+        start_block: 没有同步状态时的起始区块
+        event_slug: 事件 slug
+        
+    Returns:
+        dict: 运行结果
+    """
+    market_results = run_market_discovery(conn, event_slug, settings)
+    
+    trades_indexer = create_trades_indexer(w3, settings)
+    trade_results = trades_indexer.follow(
+        conn,
+        start_block=start_block,
+        confirmations=settings.get('confirmations', 5),
+        poll_interval=settings.get('poll_interval', 2.0)
+    )
+    
+    return {
+        'market_discovery': market_results,
+        'trades_indexer': trade_results,
+        'event_slug': event_slug
+    }
+
+
+def run_backfill_worker(w3, conn, settings, from_block, to_block, worker_id, event_slug=None):
+    """运行并行回填工作进程
+    
+    多个进程可以对同一范围同时运行本函数；只有指定 event_slug 时才运行市场发现。
+    
+    Args:
+        w3: Web3 实例
+        conn: 数据库连接
+        settings: 设置字典，支持 lease_span、lease_ttl
+        from_block: 回填范围起始区块
+        to_block: 回填范围结束区块
+        worker_id: 工作进程标识
+        event_slug: 事件 slug
+        
+    Returns:
+        dict: 运行结果
+    """
+    market_results = run_market_discovery(conn, event_slug, settings) if event_slug else {'market_count': 0, 'event_slug': None}
+    
+    trades_indexer = create_trades_indexer(w3, settings)
+    trade_results = trades_indexer.run_worker(
+        conn,
+        from_block,
+        to_block,
+        worker_id,
+        lease_span=settings.get('lease_span', 100000),
+        lease_ttl=settings.get('lease_ttl', 600)
+    )
+    
+    return {
+        'market_discovery': market_results,
+        'trades_indexer': trade_results,
+        'event_slug': event_slug
+    }
@@ -0,0 +1,106 @@
+"""未知代币解析"""
+import time
+
+from src.db.codec import blob_to_token_id
+
+
+class TokenResolver:
+    """按需解析未知 token_id 所属的市场
+
+    索引器把一块日志中本地没有映射的 token_id 汇总后交给 resolve，一次批量查询
+    Gamma 并把查到的市场写入数据库。Gamma 也查不到的 token_id 记入带有效期的负缓存，
+    有效期内不再重复查询。
+    """
+
+    def __init__(self, discovery, negative_ttl=3600, max_negative_entries=100000):
+        """初始化代币解析器
+
+        Args:
+            discovery: MarketDiscoveryService 实例
+            negative_ttl: 查不到市场的 token_id 的负缓存有效期（秒）
+            max_negative_entries: 负缓存的最大条目数，超出时先清理过期条目，仍超出则清空
+        """
+        self.discovery = discovery
+        self.negative_ttl = negative_ttl
+        self.max_negative_entries = max_negative_entries
+        # token_id（32 字节）→ 负缓存过期时间（time.monotonic）
+        self._negative = {}
+
+        # 解析统计
+        self.lookups = 0
+        self.resolved = 0
+        self.negative_hits = 0
+
+    def is_known_missing(self, token_id):
+        """token_id 是否在未过期的负缓存中
+
+        Args:
+            token_id: 32 字节 token_id
+
+        Returns:
+            bool: 有效期内已确认查不到市场时返回 True
+        """
+        expires_at = self._negative.get(token_id)
+        if expires_at is None:
+            return False
+        if expires_at <= time.monotonic():
+            del self._negative[token_id]
+            return False
+        return True
+
+    def resolve(self, conn, token_ids):
+        """批量查询并存储未知 token_id 所属的市场
+
+        Args:
+            conn: 数据库连接
+            token_ids: 32 字节 token_id 集合
+
+        Returns:
+            set: 已写入市场映射的 token_id
+
+        Raises:
+            requests.RequestException: Gamma 请求重试耗尽后仍然失败，调用方不应提交本块
+        """
+        pending = set()
+        for token_id in token_ids:
+            if self.is_known_missing(token_id):
+                self.negative_hits += 1
+            else:
+                pending.add(token_id)
+        if not pending:
+            return set()
+
+        decimal_ids = {blob_to_token_id(token_id): token_id for token_id in pending}
+        self.lookups += 1
+        resolved_decimal = self.discovery.resolve_token_ids(conn, decimal_ids)
+        resolved = {decimal_ids[decimal_id] for decimal_id in resolved_decimal}
+        self.resolved += len(resolved)
+
+        self._remember_missing(pending - resolved)
+        return resolved
+
+    def _remember_missing(self, token_ids):
+        """把查不到市场的 token_id 记入负缓存"""
+        if not token_ids:
+            return
+        now = time.monotonic()
+        if len(self._negative) + len(token_ids) > self.max_negative_entries:
+            self._negative = {token_id: expires_at for token_id, expires_at in self._negative.items() if expires_at > now}
+            if len(self._negative) + len(token_ids) > self.max_negative_entries:
+                self._negative.clear()
+        expires_at = now + self.negative_ttl
+        for token_id in token_ids:
+            self._negative[token_id] = expires_at
+
+    def stats(self):
+        """获取解析统计
+
+        Returns:
+            dict: 查询次数、解析数量、负缓存命中与当前大小
+        """
+        return {
+            "lookups": self.lookups,
+            "resolved": self.resolved,
+            "negative_hits": self.negative_hits,
+            "negative_entries": len(self._negative)
+        }
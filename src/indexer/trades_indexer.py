@@ -1,20 +1,99 @@
 """交易索引器实现"""
 import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
 from web3 import Web3
-from datetime import datetime
-from src.db.store import fetch_market_by_token_id, update_sync_state
+from src.db.codec import blob_to_hex, blob_to_token_id
+from src.db.connection import connect_writer, database_path
+from src.db.store import (
+    TOKEN_GENERATION_KEY, claim_range_lease, fetch_blocks, fetch_indexed_ranges, fetch_pending_token_ids,
+    fetch_recent_blocks, fetch_token_map, find_range_gaps, get_metadata, get_sync_state, insert_pending_trades,
+    insert_trades, promote_pending_trades, record_indexed_range, refresh_market_stats, release_range_lease,
+    renew_range_lease, rollback_to_block, set_metadata, update_sync_state, upsert_blocks
+)
+from src.indexer.block_cache import BlockHeaderCache
+from src.indexer.chunker import AdaptiveChunker
+from src.indexer.decoder import decode_order_filled_logs
+from src.indexer.rpc import RPC_CALLS, RPC_ERRORS, RPC_SECONDS, BatchRpcClient
+from src.metrics import Counter, Gauge, Histogram
+
+
+logger = logging.getLogger(__name__)
+
+# 在 metadata 中保存自适应窗口大小的键名
+CHUNK_SIZE_STATE_KEY = 'trades_indexer_chunk_size'
+
+# 索引器指标
+LOGS_FETCHED = Counter('polymarket_logs_fetched_total', 'OrderFilled logs returned by eth_getLogs')
+DECODE_SECONDS = Histogram('polymarket_decode_seconds', 'Time to decode the OrderFilled logs of one chunk')
+TOKEN_LOOKUPS = Counter(
+    'polymarket_token_lookups_total',
+    'Decoded fills by market lookup result (hit, resolved, unknown)',
+    ['result']
+)
+TOKEN_RESOLVE_SECONDS = Histogram('polymarket_token_resolve_seconds', 'Gamma lookup latency for unknown token ids')
+DB_WRITE_SECONDS = Histogram('polymarket_db_write_seconds', 'Database write transaction latency', ['operation'])
+TRADES_INSERTED = Counter('polymarket_trades_inserted_total', 'Trades inserted into the database')
+TRADES_HELD = Counter('polymarket_trades_held_total', 'Fills held in pending_trades because their token has no market yet')
+TRADES_PROMOTED = Counter('polymarket_trades_promoted_total', 'Pending fills moved into trades after their market appeared')
+CHUNKS_INDEXED = Counter('polymarket_chunks_indexed_total', 'Block ranges committed by the indexer')
+REORGS = Counter('polymarket_reorgs_total', 'Chain reorganisations detected while following the head')
+INDEXED_BLOCK = Gauge('polymarket_indexed_block', 'Last block of the most recently committed chunk')
+CHAIN_HEAD_BLOCK = Gauge('polymarket_chain_head_block', 'Latest chain head block number seen by the indexer')
+CHAIN_HEAD_LAG = Gauge('polymarket_chain_head_lag_blocks', 'Blocks between the chain head and the last indexed block')
+PIPELINE_QUEUE_DEPTH = Gauge('polymarket_pipeline_queue_depth', 'Items waiting between pipeline stages', ['queue'])
+
+# 流水线队列的结束标记
+_PIPELINE_DONE = object()
 
 
 class TradesIndexer:
     """交易索引器类"""
     
-    def __init__(self, w3):
+    def __init__(
+        self,
+        w3,
+        chunker=None,
+        rpc=None,
+        rpc_batch_size=100,
+        block_cache_size=100000,
+        write_batch_size=10000,
+        token_resolver=None,
+        fetch_concurrency=1,
+        pipeline_depth=4
+    ):
         """初始化交易索引器
         
         Args:
             w3: Web3 实例
+            chunker: 区块范围分块器，默认使用 AdaptiveChunker
+            rpc: JSON-RPC 批量请求客户端，默认根据 HTTP 节点地址创建
+            rpc_batch_size: 默认批量请求客户端的批量大小
+            block_cache_size: 内存中缓存的最大区块头数量
+            write_batch_size: 写入交易时每个事务的最大行数
+            token_resolver: 可选的 TokenResolver，按需解析本地没有映射的 token_id；
+                            为 None 时跳过未知 token 的交易
+            fetch_concurrency: 同时获取日志的区块窗口数，大于 1 时以流水线方式运行
+                               （见 _run_pipeline，需要文件数据库）
+            pipeline_depth: 流水线中解码、补全与写入各阶段之间最多排队的区块窗口数
         """
         self.w3 = w3
+        self.chunker = chunker or AdaptiveChunker()
+        self.write_batch_size = write_batch_size
+        self.token_resolver = token_resolver
+        self.fetch_concurrency = max(1, int(fetch_concurrency))
+        self.pipeline_depth = max(1, int(pipeline_depth))
+        
+        # 非 HTTP 节点无法发送批量请求，退回逐块 get_block
+        if rpc is None:
+            endpoint_uri = getattr(w3.provider, 'endpoint_uri', None)
+            if endpoint_uri and str(endpoint_uri).startswith('http'):
+                rpc = BatchRpcClient(str(endpoint_uri), batch_size=rpc_batch_size)
+        self.rpc = rpc
         
         # Polymarket Exchange 合约地址（使用校验和格式）
         self.exchange_addresses = [
@@ -25,38 +104,503 @@ class TradesIndexer:
         # OrderFilled 事件签名哈希
         self.order_filled_topic = "0x" + Web3.keccak(text="OrderFilled(bytes32,address,address,uint256,uint256,uint256,uint256,uint256)").hex()
         
-        # 区块时间戳缓存
-        self.block_timestamp_cache = {}
+        # 区块头缓存（内存 LRU + blocks 表）
+        self.block_cache = BlockHeaderCache(block_cache_size)
+        
+        # token_id（32 字节）→ (market_id, outcome) 内存映射，按 tokens 表 rowid 增量刷新
+        self.token_map = {}
+        self._token_map_rowid = 0
+        self._token_generation = None
+        
+        # 待定交易涉及、尚无市场映射的 token_id，以及本次运行暂存与跳过的交易数
+        self._pending_tokens = set()
+        self._held_count = 0
+        self._skipped_count = 0
     
-    def run_indexer(self, conn, from_block, to_block):
+    def run_indexer(self, conn, from_block, to_block, sync_key='global_indexer', on_chunk=None):
         """运行交易索引器
         
         Args:
             conn: 数据库连接
             from_block: 起始区块
             to_block: 结束区块
+            sync_key: 每块完成后推进的同步状态键名，None 表示不更新同步状态（并行回填）
+            on_chunk: 可选回调，每块完成后以 (chunk_from, chunk_to) 调用
             
         Returns:
             dict: 运行结果
         """
-        # 获取日志
-        logs = self._get_logs(from_block, to_block)
+        # 加载 token → 市场映射，并写入市场已经出现的待定交易
+        self._refresh_token_map(conn)
+        self._held_count = 0
+        self._skipped_count = 0
+        promoted_count = self._promote_pending_trades(conn, resolve=True)
+        
+        # 恢复上次运行得到的窗口大小
+        saved_size = get_metadata(conn, CHUNK_SIZE_STATE_KEY)
+        if saved_size:
+            self.chunker.size = saved_size
+        
+        inserted_count = promoted_count
+        chunk_count = 0
+        
+        try:
+            if self.fetch_concurrency > 1 and database_path(conn):
+                inserted_count, chunk_count = self._run_pipeline(conn, from_block, to_block, sync_key, on_chunk)
+            else:
+                # 按自适应窗口分块获取日志，每块处理完成后才推进同步状态
+                for chunk_from, chunk_to, logs in self.chunker.iter_ranges(from_block, to_block, self._get_logs):
+                    # 解析日志
+                    trades, held = self._parse_logs(conn, logs)
+                    
+                    # 存储交易与暂不能确定市场的待定交易
+                    inserted_count += self._store_trades(conn, trades, held)
+                    
+                    # 记录已完成区间并更新同步状态
+                    self._commit_progress(conn, [(chunk_from, chunk_to)], sync_key, on_chunk)
+                    chunk_count += 1
+        finally:
+            # 保存窗口大小供下次运行使用
+            set_metadata(conn, CHUNK_SIZE_STATE_KEY, self.chunker.size)
+        
+        logger.info(
+            "索引区块 %d-%d 完成: %d 块，插入 %d 条交易",
+            from_block, to_block, chunk_count, inserted_count,
+            extra={"from_block": from_block, "to_block": to_block, "chunks": chunk_count, "inserted_trades": inserted_count}
+        )
+        if self._held_count:
+            logger.warning(
+                "区块 %d-%d 中有 %d 条交易的 token 尚无市场，已暂存到 pending_trades，市场出现后写入",
+                from_block, to_block, self._held_count
+            )
+        if self._skipped_count:
+            logger.warning(
+                "区块 %d-%d 中有 %d 条交易的 token 没有市场映射，未启用按需解析，已跳过",
+                from_block, to_block, self._skipped_count
+            )
+        
+        return {
+            "from_block": from_block,
+            "to_block": to_block,
+            "inserted_trades": inserted_count,
+            "held_trades": self._held_count,
+            "skipped_trades": self._skipped_count,
+            "chunks": chunk_count,
+            "chunk_size": self.chunker.size
+        }
+    
+    def _commit_progress(self, conn, ranges, sync_key, on_chunk=None):
+        """记录已写入交易的连续区块窗口并推进同步状态
+        
+        Args:
+            conn: 数据库连接
+            ranges: 按区块顺序排列、首尾相接的 (chunk_from, chunk_to) 列表
+            sync_key: 同步状态键名，None 表示不更新
+            on_chunk: 可选回调，对每个窗口以 (chunk_from, chunk_to) 调用
+        """
+        last_block = ranges[-1][1]
+        with DB_WRITE_SECONDS.time(operation='progress'):
+            record_indexed_range(conn, ranges[0][0], last_block)
+            if sync_key:
+                update_sync_state(conn, last_block, sync_key)
+        for chunk_from, chunk_to in ranges:
+            if on_chunk:
+                on_chunk(chunk_from, chunk_to)
+            CHUNKS_INDEXED.inc()
+        self._record_progress(last_block)
+    
+    def _run_pipeline(self, conn, from_block, to_block, sync_key, on_chunk):
+        """以流水线方式索引区块范围
+        
+        规划线程按分块器当前的窗口大小切分范围，交给 fetch_concurrency 个线程并发获取日志；
+        按提交顺序排列的 future 队列既保证下游按区块顺序处理，又限制同时在途的窗口数。
+        解码线程与补全线程（市场与区块时间戳，使用独立的数据库连接）依次处理，
+        调用线程作为唯一的写入者，把连续窗口的交易合并到 write_batch_size 行后写入，
+        交易提交后才记录区间并推进同步状态，因此同步状态只会覆盖已提交的连续区间。
+        各阶段之间是有界队列，下游变慢时上游阻塞，内存占用保持有界。
+        任一阶段出错时停止流水线，已补全的窗口仍会写入，然后抛出该异常。
+        
+        并发获取的窗口共享同一个分块器，窗口大小与退避状态的更新由分块器的锁串行化；
+        规划线程按规划时的窗口大小切分，节点拒绝时由 _fetch_range 在窗口内继续拆分。
+        
+        Args:
+            conn: 数据库连接（文件数据库）
+            from_block: 起始区块
+            to_block: 结束区块
+            sync_key: 同步状态键名，None 表示不更新
+            on_chunk: 可选回调，每个窗口提交后以 (chunk_from, chunk_to) 调用
+            
+        Returns:
+            tuple: (插入的交易数量, 窗口数量)
+        """
+        db_path = database_path(conn)
+        stop = threading.Event()
+        errors = []
+        fetch_queue = queue.Queue(maxsize=self.fetch_concurrency)
+        decode_queue = queue.Queue(maxsize=self.pipeline_depth)
+        store_queue = queue.Queue(maxsize=self.pipeline_depth)
+        fetch_pool = ThreadPoolExecutor(max_workers=self.fetch_concurrency, thread_name_prefix='indexer-fetch')
+        
+        def put(target_queue, item):
+            # 队列满时等待，流水线停止时放弃
+            while not stop.is_set():
+                try:
+                    target_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def get(source_queue):
+            # 流水线停止且队列已空时返回结束标记
+            while True:
+                try:
+                    return source_queue.get(timeout=0.1)
+                except queue.Empty:
+                    if stop.is_set():
+                        return _PIPELINE_DONE
+        
+        def stage(fn):
+            # 记录阶段异常并停止流水线
+            def run():
+                try:
+                    fn()
+                except BaseException as e:
+                    errors.append(e)
+                    stop.set()
+            return threading.Thread(target=run, name=f'indexer-{fn.__name__}', daemon=True)
+        
+        def plan():
+            start = from_block
+            while start <= to_block and not stop.is_set():
+                end = min(start + self.chunker.size - 1, to_block)
+                future = fetch_pool.submit(self._fetch_range, start, end)
+                if not put(fetch_queue, (start, end, future)):
+                    future.cancel()
+                    return
+                start = end + 1
+            put(fetch_queue, _PIPELINE_DONE)
+        
+        def decode():
+            while True:
+                item = get(fetch_queue)
+                if item is _PIPELINE_DONE:
+                    break
+                chunk_from, chunk_to, future = item
+                decoded = self._decode_logs(future.result())
+                if not put(decode_queue, (chunk_from, chunk_to, decoded)):
+                    return
+            put(decode_queue, _PIPELINE_DONE)
+        
+        def enrich():
+            # sqlite 连接只能在创建它的线程中使用
+            enrich_conn = connect_writer(db_path)
+            try:
+                while True:
+                    item = get(decode_queue)
+                    if item is _PIPELINE_DONE:
+                        break
+                    chunk_from, chunk_to, decoded = item
+                    trades, held = self._enrich_trades(enrich_conn, decoded)
+                    if not put(store_queue, (chunk_from, chunk_to, trades, held)):
+                        return
+                put(store_queue, _PIPELINE_DONE)
+            finally:
+                enrich_conn.close()
+        
+        inserted_count = 0
+        chunk_count = 0
+        pending_ranges = []
+        pending_trades = []
+        pending_held = []
+        
+        def flush():
+            nonlocal inserted_count, chunk_count
+            if not pending_ranges:
+                return
+            inserted_count += self._store_trades(conn, pending_trades, pending_held)
+            self._commit_progress(conn, pending_ranges, sync_key, on_chunk)
+            chunk_count += len(pending_ranges)
+            pending_ranges.clear()
+            pending_trades.clear()
+            pending_held.clear()
+        
+        threads = [stage(plan), stage(decode), stage(enrich)]
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                for name, stage_queue in (('fetch', fetch_queue), ('decode', decode_queue), ('store', store_queue)):
+                    PIPELINE_QUEUE_DEPTH.set(stage_queue.qsize(), queue=name)
+                item = get(store_queue)
+                if item is _PIPELINE_DONE:
+                    break
+                chunk_from, chunk_to, trades, held = item
+                pending_ranges.append((chunk_from, chunk_to))
+                pending_trades.extend(trades)
+                pending_held.extend(held)
+                # 攒够一个写入批次，或暂时没有更多已补全的窗口时提交
+                if len(pending_trades) >= self.write_batch_size or store_queue.empty():
+                    flush()
+            flush()
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            fetch_pool.shutdown(wait=True, cancel_futures=True)
+        
+        if errors:
+            raise errors[0]
+        return inserted_count, chunk_count
+    
+    def _fetch_range(self, from_block, to_block):
+        """获取一个区块窗口的全部日志，节点拒绝时由分块器拆分重试
+        
+        Args:
+            from_block: 起始区块
+            to_block: 结束区块
+            
+        Returns:
+            list: 窗口内的全部日志，按区块顺序
+        """
+        logs = []
+        for _, _, chunk_logs in self.chunker.iter_ranges(from_block, to_block, self._get_logs):
+            logs.extend(chunk_logs)
+        return logs
+    
+    def run_worker(self, conn, from_block, to_block, worker_id, lease_span=100000, lease_ttl=600):
+        """以租约方式并行回填区块范围
+        
+        多个进程（或共享同一数据库的多台机器）可以同时对同一范围运行，
+        每个进程反复领取尚未索引且未被租用的区间，完成后记入 indexed_ranges。
         
-        # 解析日志
-        trades = self._parse_logs(conn, logs)
+        Args:
+            conn: 数据库连接
+            from_block: 回填范围起始区块
+            to_block: 回填范围结束区块
+            worker_id: 工作进程标识
+            lease_span: 单个租约的最大区块数
+            lease_ttl: 租约有效期（秒），每完成一块自动续期
+            
+        Returns:
+            dict: 运行结果，包含剩余空洞
+        """
+        inserted_count = 0
+        lease_count = 0
         
-        # 存储交易
-        inserted_count = self._store_trades(conn, trades)
+        while True:
+            lease = claim_range_lease(conn, worker_id, from_block, to_block, lease_span, lease_ttl)
+            if lease is None:
+                break
+            
+            lease_from, lease_to = lease
+            logger.info("%s 领取区块 %d-%d", worker_id, lease_from, lease_to)
+            try:
+                result = self.run_indexer(
+                    conn, lease_from, lease_to,
+                    sync_key=None,
+                    on_chunk=lambda chunk_from, chunk_to: renew_range_lease(conn, lease_from, worker_id, lease_ttl)
+                )
+            finally:
+                release_range_lease(conn, lease_from, worker_id)
+            
+            inserted_count += result["inserted_trades"]
+            lease_count += 1
         
-        # 更新同步状态
-        update_sync_state(conn, to_block)
+        self._advance_sync_state_from_ledger(conn, from_block)
         
         return {
             "from_block": from_block,
             "to_block": to_block,
-            "inserted_trades": inserted_count
+            "inserted_trades": inserted_count,
+            "leases": lease_count,
+            "gaps": find_range_gaps(conn, from_block, to_block)
+        }
+    
+    def _advance_sync_state_from_ledger(self, conn, from_block):
+        """按 indexed_ranges 中的连续区间推进全局同步状态
+        
+        Args:
+            conn: 数据库连接
+            from_block: 没有同步状态时的起始区块
+        """
+        last_block = get_sync_state(conn)['last_block']
+        next_block = last_block + 1 if last_block else from_block
+        ranges = fetch_indexed_ranges(conn, next_block, next_block)
+        if ranges and ranges[0][1] > last_block:
+            update_sync_state(conn, ranges[0][1])
+    
+    def follow(
+        self,
+        conn,
+        start_block=None,
+        confirmations=5,
+        poll_interval=2.0,
+        max_cycles=None,
+        max_reorg_depth=256,
+        stats_refresh_interval=60
+    ):
+        """持续跟随链头索引交易
+        
+        从 sync_state 记录的区块继续，先以自适应大窗口追平，再按 poll_interval 轮询链头，
+        每次只索引新确认的少量区块。每一步之前检查父哈希连续性，发现区块重组时
+        回滚到分叉点并重新索引受影响的区块。按 Ctrl+C 停止。
+        
+        Args:
+            conn: 数据库连接
+            start_block: 没有同步状态时的起始区块
+            confirmations: 确认深度，只索引到 链头 - confirmations
+            poll_interval: 追平后的轮询间隔（秒）
+            max_cycles: 最大轮询次数，None 表示一直运行
+            max_reorg_depth: 查找分叉点时最多回溯的区块数
+            stats_refresh_interval: 修正市场 24 小时成交量的间隔（秒）
+            
+        Returns:
+            dict: 运行结果
+        """
+        last_block = get_sync_state(conn)['last_block']
+        if not last_block:
+            if start_block is None:
+                raise ValueError('No sync state found, start_block is required')
+            last_block = start_block - 1
+        
+        first_block = last_block + 1
+        inserted_count = 0
+        reorg_count = 0
+        cycles = 0
+        stats_refreshed_at = 0.0
+        
+        try:
+            while max_cycles is None or cycles < max_cycles:
+                cycles += 1
+                
+                # 定期修正滚动 24 小时成交量
+                if time.monotonic() - stats_refreshed_at >= stats_refresh_interval:
+                    refresh_market_stats(conn)
+                    stats_refreshed_at = time.monotonic()
+                
+                RPC_CALLS.inc(method='eth_blockNumber')
+                with RPC_SECONDS.time(method='eth_blockNumber'):
+                    head_block = self.w3.eth.block_number
+                CHAIN_HEAD_BLOCK.set(head_block)
+                CHAIN_HEAD_LAG.set(max(0, head_block - last_block))
+                target_block = head_block - confirmations
+                
+                if target_block <= last_block:
+                    # 已追平，等待新区块
+                    time.sleep(poll_interval)
+                    continue
+                
+                # 检查父哈希连续性，发生重组时回滚到分叉点
+                fork_block = self._detect_reorg(conn, last_block, max_reorg_depth)
+                if fork_block is not None:
+                    self._rollback(conn, fork_block)
+                    last_block = fork_block
+                    reorg_count += 1
+                    REORGS.inc()
+                
+                result = self.run_indexer(conn, last_block + 1, target_block)
+                inserted_count += result["inserted_trades"]
+                last_block = target_block
+                
+                # 记录本步最后一个区块的哈希，供下一步校验
+                self.block_cache.load(conn, {last_block}, self._fetch_block_headers)
+        except KeyboardInterrupt:
+            logger.info("收到中断信号，停止跟随链头")
+        
+        return {
+            "from_block": first_block,
+            "to_block": last_block,
+            "inserted_trades": inserted_count,
+            "reorgs": reorg_count,
+            "cycles": cycles
         }
     
+    def _detect_reorg(self, conn, last_block, max_reorg_depth=256):
+        """检查已索引区块之后的链是否仍然连续
+        
+        Args:
+            conn: 数据库连接
+            last_block: 最后索引的区块号
+            max_reorg_depth: 查找分叉点时最多回溯的区块数
+            
+        Returns:
+            int: 发生重组时返回分叉点区块号，否则返回 None
+        """
+        stored = fetch_blocks(conn, [last_block]).get(last_block)
+        wanted = {last_block + 1} if stored else {last_block, last_block + 1}
+        headers = self._fetch_block_headers(wanted)
+        
+        if not stored:
+            # 没有记录哈希（如首次跟随），以节点当前的区块为基准
+            if last_block in headers:
+                upsert_blocks(conn, [headers[last_block]])
+            return None
+        
+        next_header = headers.get(last_block + 1)
+        if next_header is None or next_header["parent_hash"] == stored["hash"]:
+            return None
+        
+        logger.warning("检测到区块重组: 区块 %d 的父哈希与已记录的区块 %d 不一致", last_block + 1, last_block)
+        return self._find_fork_block(conn, last_block, max_reorg_depth)
+    
+    def _find_fork_block(self, conn, last_block, max_reorg_depth=256):
+        """查找本地记录与链上一致的最高区块
+        
+        按降序分批比较已保存的区块哈希，批量大小逐次翻倍，浅重组只需一次批量请求。
+        
+        Args:
+            conn: 数据库连接
+            last_block: 最后索引的区块号
+            max_reorg_depth: 最多回溯的区块数
+            
+        Returns:
+            int: 分叉点区块号
+        """
+        min_block = max(0, last_block - max_reorg_depth)
+        max_block = last_block
+        batch_size = 16
+        
+        while max_block >= min_block:
+            stored_headers = fetch_recent_blocks(conn, max_block, min_block, batch_size)
+            if not stored_headers:
+                break
+            
+            chain_headers = self._fetch_block_headers({header["number"] for header in stored_headers})
+            for header in stored_headers:
+                chain_header = chain_headers.get(header["number"])
+                if chain_header and chain_header["hash"] == header["hash"]:
+                    return header["number"]
+            
+            max_block = stored_headers[-1]["number"] - 1
+            batch_size *= 2
+        
+        # 回溯范围内没有一致的记录，保守地回滚到最大深度
+        return min_block
+    
+    def _rollback(self, conn, fork_block):
+        """回滚分叉点之后的数据
+        
+        Args:
+            conn: 数据库连接
+            fork_block: 分叉点区块号
+        """
+        with DB_WRITE_SECONDS.time(operation='rollback'):
+            deleted_count = rollback_to_block(conn, fork_block)
+        self.block_cache.discard_from(fork_block)
+        logger.warning("已回滚到区块 %d，删除 %d 条交易", fork_block, deleted_count)
+    
+    def _record_progress(self, block_number):
+        """更新已索引区块与链头延迟指标
+        
+        Args:
+            block_number: 最近提交的区块号
+        """
+        INDEXED_BLOCK.set(block_number)
+        head_block = CHAIN_HEAD_BLOCK.value()
+        if head_block:
+            CHAIN_HEAD_LAG.set(max(0, head_block - block_number))
+    
     def _get_logs(self, from_block, to_block):
         """获取日志
         
@@ -66,24 +610,52 @@ class TradesIndexer:
             
         Returns:
             list: 日志列表
+            
+        Raises:
+            Exception: 节点调用失败时直接抛出，由分块器决定拆分或重试
         """
+        # 构造过滤参数
+        filter_params = {
+            "address": self.exchange_addresses,
+            "topics": [self.order_filled_topic],
+            "fromBlock": from_block,
+            "toBlock": to_block
+        }
+        
+        # 调用 eth_getLogs
+        RPC_CALLS.inc(method='eth_getLogs')
         try:
-            # 构造过滤参数
-            filter_params = {
-                "address": self.exchange_addresses,
-                "topics": [self.order_filled_topic],
-                "fromBlock": from_block,
-                "toBlock": to_block
-            }
-            
-            # 调用 eth_getLogs
-            logs = self.w3.eth.get_logs(filter_params)
-            print(f"成功获取 {len(logs)} 条 OrderFilled 事件日志")
-            return logs
+            with RPC_SECONDS.time(method='eth_getLogs'):
+                logs = self.w3.eth.get_logs(filter_params)
+        except Exception:
+            RPC_ERRORS.inc(method='eth_getLogs')
+            raise
+        LOGS_FETCHED.inc(len(logs))
+        logger.debug("成功获取区块 %d-%d 的 %d 条 OrderFilled 事件日志", from_block, to_block, len(logs))
+        return logs
+    
+    def _refresh_token_map(self, conn):
+        """增量加载 tokens 表中新增的代币映射
+        
+        已有代币被改到其他市场或结果时（代币映射版本号变化）整表重载。
+        映射原地更新，调用方持有的 self.token_map 引用仍然有效。
+        
+        Args:
+            conn: 数据库连接
             
-        except Exception as e:
-            print(f"Failed to get logs: {str(e)}")
-            return []
+        Returns:
+            int: 新加载的代币数量
+        """
+        # 先读版本号再读映射，两者之间发生的改动会在下次刷新时重载
+        generation = get_metadata(conn, TOKEN_GENERATION_KEY)
+        if generation != self._token_generation:
+            token_map, self._token_map_rowid = fetch_token_map(conn)
+            self.token_map.clear()
+            self._token_generation = generation
+        else:
+            token_map, self._token_map_rowid = fetch_token_map(conn, self._token_map_rowid)
+        self.token_map.update(token_map)
+        return len(token_map)
     
     def _parse_logs(self, conn, logs):
         """解析日志
@@ -93,184 +665,227 @@ class TradesIndexer:
             logs: 日志列表
             
         Returns:
-            list: 交易列表
+            tuple: (交易元组列表, 待定交易元组列表)，见 _enrich_trades
+        """
+        return self._enrich_trades(conn, self._decode_logs(logs))
+    
+    def _decode_logs(self, logs):
+        """整批解码 OrderFilled 日志
+        
+        Args:
+            logs: 日志列表
+            
+        Returns:
+            list: 解码后的日志元组列表，见 decode_order_filled_logs
+        """
+        with DECODE_SECONDS.time():
+            return decode_order_filled_logs(logs)
+    
+    def _enrich_trades(self, conn, decoded):
+        """为解码后的日志查找所属市场与区块时间戳，构建交易数据
+        
+        启用 token_resolver 时，Gamma 也查不到市场的成交作为待定交易返回，由 _store_trades
+        暂存到 pending_trades，市场出现后再写入；未启用时这些成交被跳过。
+        
+        Args:
+            conn: 数据库连接
+            decoded: _decode_logs 的结果
+            
+        Returns:
+            tuple: (交易元组列表，字段顺序见 TRADE_COLUMNS；
+                    待定交易元组列表，字段顺序见 PENDING_TRADE_COLUMNS)
         """
         trades = []
+        held = []
+        hold_unknown = self.token_resolver is not None
+        
+        # 遇到未知 token 时刷新一次映射，以获取其他进程新发现的市场
+        token_map = self.token_map
+        if any(row[6] not in token_map for row in decoded):
+            self._refresh_token_map(conn)
+        
+        # 仍然未知的 token 汇总后一次批量查询 Gamma，本块交易等待解析完成后再构建
+        unknown_tokens = {row[6] for row in decoded if row[6] not in token_map}
+        if unknown_tokens and self.token_resolver is not None:
+            with TOKEN_RESOLVE_SECONDS.time():
+                resolved_tokens = self.token_resolver.resolve(conn, unknown_tokens)
+            if resolved_tokens:
+                self._refresh_token_map(conn)
         
-        for log in logs:
+        # 批量获取本块日志涉及的区块时间戳
+        block_timestamps = self._get_block_timestamps(
+            conn, {row[2] for row in decoded if hold_unknown or row[6] in token_map}
+        )
+        
+        skipped = {}
+        for tx_hash, log_index, block_number, maker, taker, side, token_id, price, size in decoded:
             try:
-                # 解析日志数据
-                trade_data = self._parse_single_log(log)
-                if not trade_data:
-                    continue
-                
-                # 通过 token_id 找到所属市场
-                market = fetch_market_by_token_id(conn, trade_data["token_id"])
-                if not market:
-                    print(f"No market found for token_id: {trade_data['token_id']}")
-                    continue
-                
-                # 确定 outcome 类型
-                if trade_data["token_id"] == market["yes_token_id"]:
-                    outcome = "YES"
-                elif trade_data["token_id"] == market["no_token_id"]:
-                    outcome = "NO"
-                else:
-                    print(f"Token_id {trade_data['token_id']} not found in market {market['slug']}")
-                    continue
+                # 通过 token_id 找到所属市场与结果
+                token = token_map.get(token_id)
+                if not token:
+                    skipped[token_id] = skipped.get(token_id, 0) + 1
+                    if not hold_unknown:
+                        continue
                 
                 # 获取区块时间戳
-                block_timestamp = self._get_block_timestamp(log["blockNumber"])
+                block_timestamp = block_timestamps[block_number]
                 
-                # 构建交易数据
-                trade = {
-                    "market_id": market["id"],
-                    "tx_hash": log["transactionHash"].hex(),
-                    "log_index": log["logIndex"],
-                    "maker": trade_data["maker"],
-                    "taker": trade_data["taker"],
-                    "side": trade_data["side"],
-                    "outcome": outcome,
-                    "price": trade_data["price"],
-                    "size": trade_data["size"],
-                    "block_number": log["blockNumber"],
-                    "timestamp": block_timestamp
-                }
+                if not token:
+                    # 构建待定交易数据（字段顺序与 PENDING_TRADE_COLUMNS 一致）
+                    held.append((
+                        token_id, tx_hash, log_index, maker, taker, side,
+                        price, size, block_number, block_timestamp
+                    ))
+                    continue
+                market_id, outcome = token
                 
-                trades.append(trade)
+                # 构建交易数据（字段顺序与 TRADE_COLUMNS 一致）
+                trades.append((
+                    market_id, tx_hash, log_index, maker, taker, side, outcome,
+                    price, size, block_number, block_timestamp
+                ))
                 
             except Exception as e:
-                print(f"Error parsing log {log.get('transactionHash', 'unknown')}: {str(e)}")
+                logger.warning("Error parsing log %s: %s", blob_to_hex(tx_hash), e)
                 continue
         
-        print(f"成功解析 {len(trades)} 条交易数据")
-        return trades
+        skipped_count = sum(skipped.values())
+        resolved_count = sum(1 for row in decoded if row[6] in unknown_tokens) - skipped_count
+        TOKEN_LOOKUPS.inc(len(decoded) - resolved_count - skipped_count, result='hit')
+        TOKEN_LOOKUPS.inc(resolved_count, result='resolved')
+        TOKEN_LOOKUPS.inc(skipped_count, result='unknown')
+        if hold_unknown:
+            self._held_count += len(held)
+        else:
+            self._skipped_count += skipped_count
+        if skipped and logger.isEnabledFor(logging.DEBUG):
+            for token_id, count in skipped.items():
+                logger.debug(
+                    "No market found for token_id: %s，%s %d 条交易",
+                    blob_to_token_id(token_id), "暂存" if hold_unknown else "跳过", count
+                )
+        
+        logger.debug("成功解析 %d 条交易数据，区块头缓存: %s", len(trades), self.block_cache.stats())
+        return trades, held
     
-    def _parse_single_log(self, log):
-        """解析单条日志
+    def _fetch_block_headers(self, block_numbers):
+        """从节点批量获取区块头
         
         Args:
-            log: 日志对象
+            block_numbers: 区块号集合
             
         Returns:
-            dict: 解析后的交易数据
+            dict: 区块号 → 区块头字典
         """
-        # 这里需要使用正确的 ABI 解析日志数据
-        # 由于我们没有完整的 ABI，这里使用简化的解析方法
-        # 实际项目中，应该使用完整的 ABI 和 Web3.py 的事件解析功能
-        
-        # 从日志数据中提取字段
-        # 注意：这里的解析方法是简化的，实际项目中应该使用正确的 ABI 解析
-        data = log["data"]
-        topics = log["topics"]
-        
-        # 提取 orderHash
-        order_hash = topics[1].hex()
-        
-        # 提取 maker 和 taker
-        maker = "0x" + topics[2].hex()[-40:]
-        taker = "0x" + topics[3].hex()[-40:]
-        
-        # 提取其他字段
-        # 这里需要根据实际的 ABI 格式解析 data 字段
-        # 由于格式复杂，这里使用简化的方法
-        
-        # 计算 price 和 size
-        # 这里需要根据实际的 ABI 格式计算
-        price = 0.5  # 示例值
-        size = 100.0  # 示例值
-        
-        # 确定 token_id 和 side
-        # 这里我们使用示例值，实际项目中应该根据实际的 ABI 格式解析
-        # 由于我们没有完整的 ABI，并且从 data 字段解析 token_id 比较复杂
-        # 我们暂时使用一个固定的 token_id，这个 token_id 应该与市场的 yes_token_id 或 no_token_id 匹配
-        # 实际项目中，应该使用正确的 ABI 解析
-        
-        # 尝试从日志中获取更多信息
-        print(f"Log data type: {type(data)}")
-        print(f"Log data length: {len(data) if hasattr(data, 'len') else 'N/A'}")
-        print(f"Log topics: {len(topics)}")
-        
-        # 暂时使用新市场的 yes_token_id 作为示例
-        # 实际项目中，应该根据实际的 ABI 格式解析
-        token_id = "23957885615115430922384185661294483989521212430808224513177413172438775950057"
-        side = "BUY"  # 示例值
+        if self.rpc is not None:
+            return self.rpc.get_block_headers(block_numbers)
         
-        return {
-            "order_hash": order_hash,
-            "maker": maker,
-            "taker": taker,
-            "price": price,
-            "size": size,
-            "token_id": token_id,
-            "side": side
-        }
+        headers = {}
+        for number in block_numbers:
+            block = self.w3.eth.get_block(number)
+            headers[number] = {
+                "number": number,
+                "hash": "0x" + bytes(block["hash"]).hex(),
+                "parent_hash": "0x" + bytes(block["parentHash"]).hex(),
+                "timestamp": block["timestamp"]
+            }
+        return headers
     
-    def _get_block_timestamp(self, block_number):
-        """获取区块时间戳
+    def _get_block_timestamps(self, conn, block_numbers):
+        """批量获取区块时间戳
+        
+        节点暂时没有返回的区块头按分块器的退避设置重新批量获取；仍然缺失时抛出异常，
+        本块交易不会写入，同步状态也不会越过这些区块，不用本地时间代替区块时间。
         
         Args:
-            block_number: 区块号
+            conn: 数据库连接
+            block_numbers: 区块号集合
             
         Returns:
-            str: 时间戳字符串
+            dict: 区块号 → 时间戳（Unix 秒）
+            
+        Raises:
+            RuntimeError: 重试后仍有区块头缺失
         """
-        if block_number in self.block_timestamp_cache:
-            return self.block_timestamp_cache[block_number]
+        block_numbers = set(block_numbers)
+        headers = self.block_cache.load(conn, block_numbers, self._fetch_block_headers)
+        for attempt in range(self.chunker.max_retries):
+            missing = block_numbers.difference(headers)
+            if not missing:
+                break
+            time.sleep(self.chunker.backoff_seconds * (2 ** attempt))
+            headers.update(self.block_cache.load(conn, missing, self._fetch_block_headers))
         
-        try:
-            block = self.w3.eth.get_block(block_number)
-            timestamp = datetime.fromtimestamp(block["timestamp"]).isoformat()
-            self.block_timestamp_cache[block_number] = timestamp
-            return timestamp
-        except Exception as e:
-            print(f"Failed to get block timestamp for block {block_number}: {str(e)}")
-            return datetime.now().isoformat()
+        missing = block_numbers.difference(headers)
+        if missing:
+            raise RuntimeError(
+                f"Block headers unavailable for {len(missing)} blocks ({min(missing)}-{max(missing)})"
+            )
+        return {number: header["timestamp"] for number, header in headers.items()}
     
-    def _store_trades(self, conn, trades):
-        """存储交易
+    def _store_trades(self, conn, trades, held=()):
+        """存储交易与待定交易
         
         Args:
             conn: 数据库连接
-            trades: 交易列表
+            trades: 交易元组列表或列式字典，格式见 insert_trades
+            held: 待定交易元组列表，格式见 insert_pending_trades
+            
+        Returns:
+            int: 插入的交易数量（包括本次写入的待定交易）
+        """
+        with DB_WRITE_SECONDS.time(operation='trades'):
+            inserted_count = insert_trades(conn, trades, self.write_batch_size)
+        TRADES_INSERTED.inc(inserted_count)
+        logger.debug("成功插入 %d 条交易数据", inserted_count)
+        
+        if held:
+            with DB_WRITE_SECONDS.time(operation='pending'):
+                TRADES_HELD.inc(insert_pending_trades(conn, held))
+            self._pending_tokens.update(row[0] for row in held)
+        
+        # 流水线中补全阶段可能已经解析出之前暂存的 token
+        return inserted_count + self._promote_pending_trades(conn)
+    
+    def _promote_pending_trades(self, conn, resolve=False):
+        """把市场已经出现的待定交易写入交易表
+        
+        Args:
+            conn: 数据库连接
+            resolve: 是否先从数据库重新加载待定 token，并用 token_resolver 查询仍然未知的部分
+                     （负缓存有效期内的 token 不会重复查询）
             
         Returns:
             int: 插入的交易数量
         """
-        cursor = conn.cursor()
-        inserted_count = 0
+        if resolve:
+            self._pending_tokens = fetch_pending_token_ids(conn)
+            unknown_tokens = {token_id for token_id in self._pending_tokens if token_id not in self.token_map}
+            if unknown_tokens:
+                self._refresh_token_map(conn)
+                unknown_tokens = {token_id for token_id in unknown_tokens if token_id not in self.token_map}
+            if unknown_tokens and self.token_resolver is not None:
+                try:
+                    with TOKEN_RESOLVE_SECONDS.time():
+                        resolved_tokens = self.token_resolver.resolve(conn, unknown_tokens)
+                except requests.RequestException as e:
+                    logger.warning("解析待定交易的 token 失败，下次运行重试: %s", e)
+                    resolved_tokens = set()
+                if resolved_tokens:
+                    self._refresh_token_map(conn)
         
-        for trade in trades:
-            try:
-                # 插入交易数据
-                cursor.execute('''
-                INSERT INTO trades (
-                    market_id, tx_hash, log_index, maker, taker, side, outcome, 
-                    price, size, block_number, timestamp, created_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ON CONFLICT (tx_hash, log_index) DO NOTHING
-                ''', (
-                    trade["market_id"],
-                    trade["tx_hash"],
-                    trade["log_index"],
-                    trade["maker"],
-                    trade["taker"],
-                    trade["side"],
-                    trade["outcome"],
-                    trade["price"],
-                    trade["size"],
-                    trade["block_number"],
-                    trade["timestamp"],
-                    datetime.now().isoformat()
-                ))
-                
-                if cursor.rowcount > 0:
-                    inserted_count += 1
-                    
-            except Exception as e:
-                print(f"Error storing trade {trade['tx_hash']}: {str(e)}")
-                continue
+        ready_tokens = {token_id for token_id in self._pending_tokens if token_id in self.token_map}
+        if not ready_tokens:
+            return 0
         
-        conn.commit()
-        print(f"成功插入 {inserted_count} 条交易数据")
-        return inserted_count
+        with DB_WRITE_SECONDS.time(operation='pending'):
+            result = promote_pending_trades(conn, self.write_batch_size)
+        self._pending_tokens -= ready_tokens
+        TRADES_PROMOTED.inc(result['promoted'])
+        TRADES_INSERTED.inc(result['inserted'])
+        logger.info(
+            "%d 个 token 的市场已出现，写入 %d 条待定交易",
+            len(ready_tokens), result['inserted'],
+            extra={"promoted_trades": result['promoted'], "inserted_trades": result['inserted']}
+        )
+        return result['inserted']
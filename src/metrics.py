@@ -0,0 +1,251 @@
+"""Prometheus 指标
+
+计数器、仪表与直方图的轻量实现，输出 Prometheus 文本格式（0.0.4），不依赖 prometheus_client。
+各模块在模块级定义自己的指标并注册到全局 REGISTRY；API 服务器通过 /metrics 路由输出，
+索引器进程可以用 start_http_server 启动独立的导出端口。
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Prometheus 文本格式的 Content-Type
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 延迟直方图的默认桶上界（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    """转义标签值中的反斜杠、双引号与换行"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    """格式化样本值"""
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """注册指标
+
+        Raises:
+            ValueError: 同名指标已经注册
+        """
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Duplicate metric: {metric.name}')
+            self._metrics[metric.name] = metric
+
+    def render(self):
+        """按注册顺序输出全部指标的文本格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    """指标基类，按标签值组合保存样本"""
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        """初始化指标
+
+        Args:
+            name: 指标名
+            documentation: HELP 说明
+            labelnames: 标签名序列
+            registry: 注册到的注册表，None 表示不注册
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels):
+        """把标签参数转换为样本键"""
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key, extra=()):
+        """格式化样本的标签部分"""
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+    def _samples(self, key, value):
+        """返回一个标签组合的 [(后缀, 额外标签, 值)]"""
+        return [('', (), value)]
+
+    def render(self):
+        """输出指标的 HELP、TYPE 与全部样本行"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        with self._lock:
+            items = sorted(self._values.items())
+            for key, value in items:
+                for suffix, extra, sample in self._samples(key, value):
+                    lines.append(f'{self.name}{suffix}{self._labels(key, extra)} {_format_value(sample)}')
+        return lines
+
+
+class Counter(Metric):
+    """单调递增计数器"""
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        """增加计数"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        """获取当前计数"""
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    """可增可减的仪表"""
+
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        """设置当前值"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        """增加当前值"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        """获取当前值"""
+        return self._values.get(self._key(labels), 0)
+
+
+class Histogram(Metric):
+    """按桶累计的直方图"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        """初始化直方图
+
+        Args:
+            name: 指标名
+            documentation: HELP 说明
+            labelnames: 标签名序列
+            buckets: 递增的桶上界，+Inf 桶自动追加
+            registry: 注册到的注册表，None 表示不注册
+        """
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        """记录一次观测值"""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [各桶计数..., 总和, 总数]
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """以上下文管理器的方式记录代码块耗时（秒），代码块抛出异常时同样记录"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        """获取观测次数"""
+        state = self._values.get(self._key(labels))
+        return state[-1] if state else 0
+
+    def sum(self, **labels):
+        """获取观测值总和"""
+        state = self._values.get(self._key(labels))
+        return state[-2] if state else 0.0
+
+    def _samples(self, key, state):
+        samples = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), state):
+            cumulative += bucket_count
+            samples.append(('_bucket', (('le', _format_value(float(bound))),), cumulative))
+        samples.append(('_sum', (), state[-2]))
+        samples.append(('_count', (), state[-1]))
+        return samples
+
+
+def render(registry=REGISTRY):
+    """输出注册表的 Prometheus 文本格式"""
+    return registry.render()
+
+
+def start_http_server(port, addr='0.0.0.0', registry=REGISTRY):
+    """在后台线程中启动指标导出 HTTP 服务
+
+    任意 GET 路径都返回注册表的当前内容，供 Prometheus 抓取长时间运行的索引器进程。
+
+    Args:
+        port: 监听端口
+        addr: 监听地址
+        registry: 要导出的注册表
+
+    Returns:
+        ThreadingHTTPServer: 已启动的服务，调用 shutdown() 停止
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # 抓取请求不写访问日志
+            pass
+
+    server = ThreadingHTTPServer((addr, port), MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='metrics-exporter', daemon=True)
+    thread.start()
+    return server
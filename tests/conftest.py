@@ -0,0 +1,69 @@
+"""测试公共夹具：临时文件数据库与合成市场目录"""
+import pytest
+from web3 import Web3
+
+from benchmarks.fake_rpc import FakeChain, FakeProvider, FakeRpcClient
+from benchmarks.synthetic import SyntheticLogs, SyntheticMarkets
+from src.db.schema import init_db
+from src.db.store import upsert_catalog
+from src.indexer.chunker import AdaptiveChunker
+from src.indexer.trades_indexer import TradesIndexer
+
+
+@pytest.fixture
+def catalog():
+    """50 个市场的合成目录"""
+    return SyntheticMarkets(50, seed=1)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """临时数据库文件路径"""
+    return str(tmp_path / 'test.db')
+
+
+@pytest.fixture
+def conn(db_path, catalog):
+    """已初始化并写入合成目录的写连接"""
+    conn = init_db(db_path)
+    upsert_catalog(conn, catalog.events(), catalog.markets())
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def market_ids(conn, catalog):
+    """合成市场下标 → 数据库中的市场 ID"""
+    ids_by_slug = dict(conn.execute('SELECT slug, id FROM markets').fetchall())
+    return [ids_by_slug[f'bench-market-{index}'] for index in range(catalog.market_count)]
+
+
+@pytest.fixture
+def api_client(conn, db_path, monkeypatch):
+    """指向测试数据库的 Flask 测试客户端（响应缓存已清空）"""
+    from src.api import server
+    monkeypatch.setattr(server, 'db_path', db_path)
+    monkeypatch.setattr(server, 'response_cache', server.ResponseCache())
+    return server.app.test_client()
+
+
+@pytest.fixture
+def make_chain(catalog):
+    """合成链工厂：make_chain(head_block, logs_per_block=3, **FakeChain 参数)"""
+    def make(head_block, logs_per_block=3, unknown_token_rate=0.0, **kwargs):
+        logs = SyntheticLogs(catalog, logs_per_block, seed=1, unknown_token_rate=unknown_token_rate)
+        return FakeChain(logs, head_block=head_block, **kwargs)
+    return make
+
+
+@pytest.fixture
+def make_indexer():
+    """连接到合成链的索引器工厂：make_indexer(chain, initial_chunk_size=100, **TradesIndexer 参数)"""
+    def make(chain, initial_chunk_size=100, **kwargs):
+        return TradesIndexer(
+            Web3(FakeProvider(chain)),
+            chunker=AdaptiveChunker(initial_size=initial_chunk_size, backoff_seconds=0.001),
+            rpc=FakeRpcClient(chain, backoff_seconds=0.001),
+            **kwargs
+        )
+    return make
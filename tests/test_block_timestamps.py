@@ -0,0 +1,68 @@
+"""交易时间戳只来自区块头：节点暂时缺失的区块头重试，仍然缺失时本块失败"""
+import pytest
+
+from benchmarks.fake_rpc import FakeChain
+from benchmarks.synthetic import BLOCK_TIME, GENESIS_TIMESTAMP, SyntheticLogs
+from src.db.store import find_range_gaps, get_sync_state
+
+
+START_BLOCK = 1000
+END_BLOCK = 1099
+
+
+class LaggingChain(FakeChain):
+    """对 unavailable 中的区块，eth_getBlockByNumber 先返回指定次数的 null"""
+
+    def __init__(self, logs, head_block, **kwargs):
+        super().__init__(logs, head_block, **kwargs)
+        self.unavailable = {}
+
+    def handle(self, request):
+        if request["method"] == "eth_getBlockByNumber":
+            number = int(request["params"][0], 16)
+            if self.unavailable.get(number):
+                self.unavailable[number] -= 1
+                return {"jsonrpc": "2.0", "id": request.get("id"), "result": None}
+        return super().handle(request)
+
+
+@pytest.fixture
+def chain(catalog):
+    return LaggingChain(SyntheticLogs(catalog, 3, seed=1), head_block=END_BLOCK)
+
+
+def busy_block(chain):
+    """有日志的第一个区块"""
+    return next(number for number in range(START_BLOCK, END_BLOCK + 1) if chain._logs_for_block(number))
+
+
+def test_missing_header_is_refetched(conn, chain, make_indexer):
+    block = busy_block(chain)
+    chain.unavailable[block] = 2
+
+    make_indexer(chain).run_indexer(conn, START_BLOCK, END_BLOCK)
+
+    timestamps = conn.execute('SELECT DISTINCT timestamp FROM trades WHERE block_number = ?', (block,)).fetchall()
+    assert timestamps == [(GENESIS_TIMESTAMP + block * BLOCK_TIME,)]
+    assert get_sync_state(conn)['last_block'] == END_BLOCK
+
+
+def test_unavailable_header_fails_chunk_instead_of_using_wall_clock(conn, chain, make_indexer):
+    block = busy_block(chain)
+    chain.unavailable[block] = 100
+
+    with pytest.raises(RuntimeError, match='Block headers unavailable'):
+        make_indexer(chain).run_indexer(conn, START_BLOCK, END_BLOCK)
+
+    assert conn.execute('SELECT COUNT(*) FROM trades WHERE block_number >= ?', (block,)).fetchone()[0] == 0
+    assert get_sync_state(conn)['last_block'] < block
+    assert find_range_gaps(conn, START_BLOCK, END_BLOCK)[0][0] <= block
+
+    # 节点补齐区块后重新运行，时间戳来自区块头
+    chain.unavailable.clear()
+    make_indexer(chain).run_indexer(conn, START_BLOCK, END_BLOCK)
+    wrong = conn.execute(
+        'SELECT COUNT(*) FROM trades WHERE timestamp != ? + block_number * ?', (GENESIS_TIMESTAMP, BLOCK_TIME)
+    ).fetchone()[0]
+    assert wrong == 0
+    assert get_sync_state(conn)['last_block'] == END_BLOCK
@@ -0,0 +1,68 @@
+"""自适应分块器：只有范围过大错误才缩小窗口"""
+import pytest
+import requests
+
+from src.indexer import chunker as chunker_module
+from src.indexer.chunker import AdaptiveChunker, is_range_error
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """记录退避等待而不真正休眠"""
+    recorded = []
+    monkeypatch.setattr(chunker_module.time, 'sleep', recorded.append)
+    return recorded
+
+
+@pytest.mark.parametrize('message', [
+    'query returned more than 10000 results',
+    'Log response size exceeded. You can make eth_getLogs requests with up to a 10000 logs limit.',
+    'block range is too large',
+    'exceed maximum block range: 5000',
+    '{"code": -32005, "message": "query timeout exceeded"}',
+])
+def test_range_errors_are_recognised(message):
+    assert is_range_error(ValueError(message))
+
+
+@pytest.mark.parametrize('error', [
+    requests.ReadTimeout('HTTPSConnectionPool(host=rpc, port=443): Read timed out. (read timeout=30)'),
+    requests.ConnectTimeout('Connection to rpc timed out'),
+    ValueError('request timeout'),
+    ValueError('daily request limit exceeded'),
+    ValueError('invalid block range params'),
+])
+def test_transient_errors_are_not_range_errors(error):
+    assert not is_range_error(error)
+
+
+def test_timeout_is_retried_without_shrinking_window(sleeps):
+    chunker = AdaptiveChunker(initial_size=1000, grow_factor=1.0, backoff_seconds=0.5)
+    failures = [requests.ReadTimeout('Read timed out. (read timeout=30)')] * 2
+
+    def fetch(start, end):
+        if failures:
+            raise failures.pop()
+        return end - start + 1
+
+    ranges = list(chunker.iter_ranges(0, 2999, fetch))
+
+    assert [(start, end) for start, end, _ in ranges] == [(0, 999), (1000, 1999), (2000, 2999)]
+    assert chunker.size == 1000
+    assert sleeps == [0.5, 1.0]
+
+
+def test_range_error_shrinks_window(sleeps):
+    chunker = AdaptiveChunker(initial_size=1000, grow_factor=1.0)
+    failures = [ValueError('query returned more than 10000 results')]
+
+    def fetch(start, end):
+        if failures:
+            raise failures.pop()
+        return end - start + 1
+
+    ranges = list(chunker.iter_ranges(0, 999, fetch))
+
+    assert [(start, end) for start, end, _ in ranges] == [(0, 499), (500, 999)]
+    assert chunker.size == 500
+    assert sleeps == []
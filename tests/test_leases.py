@@ -0,0 +1,50 @@
+"""区块区间租约：互不重叠、过期后可被其他进程接手"""
+from src.db.store import (
+    claim_range_lease,
+    find_range_gaps,
+    get_sync_state,
+    record_indexed_range,
+    renew_range_lease,
+)
+
+
+START_BLOCK = 1000
+END_BLOCK = 1999
+
+
+def test_leases_do_not_overlap_and_skip_indexed_ranges(conn):
+    record_indexed_range(conn, 1100, 1199)
+
+    assert claim_range_lease(conn, 'a', START_BLOCK, END_BLOCK, 100, 600) == (1000, 1099)
+    assert claim_range_lease(conn, 'b', START_BLOCK, END_BLOCK, 150, 600) == (1200, 1349)
+    assert claim_range_lease(conn, 'c', START_BLOCK, END_BLOCK, 1000, 600) == (1350, 1999)
+    assert claim_range_lease(conn, 'd', START_BLOCK, END_BLOCK, 100, 600) is None
+
+
+def test_expired_lease_is_reclaimed(conn):
+    # 进程 a 领取后崩溃，租约已过期
+    assert claim_range_lease(conn, 'a', START_BLOCK, END_BLOCK, 100, -1) == (1000, 1099)
+
+    assert claim_range_lease(conn, 'b', START_BLOCK, END_BLOCK, 100, 600) == (1000, 1099)
+    # 过期的租约已被删除，a 无法再续期
+    assert not renew_range_lease(conn, 1000, 'a', 600)
+    assert renew_range_lease(conn, 1000, 'b', 600)
+
+
+def test_run_worker_reclaims_expired_lease_and_leaves_live_lease(conn, make_chain, make_indexer):
+    live_lease = claim_range_lease(conn, 'busy', 1200, END_BLOCK, 200, 600)
+    assert claim_range_lease(conn, 'crashed', START_BLOCK, END_BLOCK, 200, -1) == (1000, 1199)
+
+    indexer = make_indexer(make_chain(END_BLOCK))
+    result = indexer.run_worker(conn, START_BLOCK, END_BLOCK, 'worker', lease_span=300)
+
+    assert result['gaps'] == [live_lease]
+    assert find_range_gaps(conn, START_BLOCK, END_BLOCK) == [live_lease]
+    # 同步状态只推进到第一个空洞之前
+    assert get_sync_state(conn)['last_block'] == live_lease[0] - 1
+    indexed = conn.execute('SELECT MIN(block_number), MAX(block_number) FROM trades').fetchone()
+    assert indexed[0] < 1200 and indexed[1] > 1399
+    assert conn.execute(
+        'SELECT COUNT(*) FROM trades WHERE block_number BETWEEN ? AND ?', live_lease
+    ).fetchone()[0] == 0
+    assert conn.execute('SELECT COUNT(*) FROM range_leases').fetchone()[0] == 1
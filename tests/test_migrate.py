@@ -0,0 +1,161 @@
+"""旧格式（v0）数据库原地升级到当前存储格式"""
+import random
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from src.db.codec import decode_trade
+from src.db.connection import connect_writer
+from src.db.migrate import migrate_db
+from src.db.rollups import ROLLUP_COLUMNS, aggregate_candles, aggregate_market_stats
+from src.db.schema import SCHEMA_VERSION, get_schema_version, init_db
+from src.db.store import fetch_market_by_token_id, fetch_sync_states, get_metadata
+
+
+# 最初版本的表结构：十六进制 TEXT 哈希与地址、浮点价格与数量、字符串枚举、ISO 时间戳
+V0_SCHEMA = (
+    '''
+    CREATE TABLE events (
+        id INTEGER PRIMARY KEY, slug TEXT UNIQUE, title TEXT, description TEXT, status TEXT,
+        created_at TIMESTAMP, updated_at TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE markets (
+        id INTEGER PRIMARY KEY, event_id INTEGER, slug TEXT, condition_id TEXT UNIQUE, question_id TEXT,
+        oracle TEXT, collateral_token TEXT, yes_token_id TEXT, no_token_id TEXT, enable_neg_risk BOOLEAN,
+        status TEXT, created_at TIMESTAMP, updated_at TIMESTAMP,
+        FOREIGN KEY (event_id) REFERENCES events (id)
+    )
+    ''',
+    '''
+    CREATE TABLE trades (
+        id INTEGER PRIMARY KEY, market_id INTEGER, tx_hash TEXT, log_index INTEGER, maker TEXT, taker TEXT,
+        side TEXT, outcome TEXT, price DECIMAL, size DECIMAL, block_number INTEGER, timestamp TIMESTAMP,
+        created_at TIMESTAMP,
+        FOREIGN KEY (market_id) REFERENCES markets (id),
+        UNIQUE (tx_hash, log_index)
+    )
+    ''',
+    'CREATE TABLE sync_state (key TEXT PRIMARY KEY, last_block INTEGER, updated_at TIMESTAMP)',
+    'CREATE INDEX idx_markets_event_id ON markets (event_id)',
+    'CREATE INDEX idx_markets_slug ON markets (slug)',
+    'CREATE INDEX idx_trades_market_id ON trades (market_id)',
+    'CREATE INDEX idx_trades_timestamp ON trades (timestamp)',
+)
+
+MARKETS = 3
+TRADES = 500
+LAST_BLOCK = 60000000
+
+
+def token_id(market, outcome):
+    return str(2 ** 255 + market * 2 + outcome)
+
+
+def create_v0_db(path):
+    """按 v0 格式写入市场与交易，返回写入的交易（对外格式）"""
+    rng = random.Random(3)
+    now = datetime.now().isoformat()
+    conn = sqlite3.connect(path)
+    for statement in V0_SCHEMA:
+        conn.execute(statement)
+    conn.execute("INSERT INTO events (id, slug, title, status) VALUES (1, 'legacy-event', 'Legacy', 'active')")
+    for market in range(1, MARKETS + 1):
+        conn.execute('''
+        INSERT INTO markets (id, event_id, slug, condition_id, yes_token_id, no_token_id, status, created_at, updated_at)
+        VALUES (?, 1, ?, ?, ?, ?, 'active', ?, ?)
+        ''', (market, f'legacy-market-{market}', '0x' + f'{market:064x}',
+              token_id(market, 0), token_id(market, 1), now, now))
+
+    trades = []
+    for index in range(TRADES):
+        block_number = LAST_BLOCK - TRADES + index
+        trade = {
+            'market_id': rng.randint(1, MARKETS),
+            'tx_hash': '0x' + f'{rng.getrandbits(256):064x}',
+            'log_index': rng.randrange(20),
+            'maker': '0x' + f'{rng.getrandbits(160):040x}',
+            'taker': '0x' + f'{rng.getrandbits(160):040x}',
+            'side': rng.choice(['BUY', 'SELL']),
+            'outcome': rng.choice(['YES', 'NO']),
+            'price': rng.randint(1, 99) / 100,
+            'size': rng.randint(1, 100000) / 100,
+            'block_number': block_number,
+            'timestamp': datetime.fromtimestamp(1700000000 + block_number * 2).isoformat()
+        }
+        conn.execute('''
+        INSERT INTO trades (
+            market_id, tx_hash, log_index, maker, taker, side, outcome, price, size, block_number, timestamp, created_at
+        )
+        VALUES (:market_id, :tx_hash, :log_index, :maker, :taker, :side, :outcome, :price, :size,
+                :block_number, :timestamp, :timestamp)
+        ''', trade)
+        trades.append(trade)
+
+    conn.execute("INSERT INTO sync_state VALUES ('global_indexer', ?, ?)", (LAST_BLOCK, now))
+    conn.execute("INSERT INTO sync_state VALUES ('trades_indexer_chunk_size', 2500, ?)", (now,))
+    conn.commit()
+    conn.close()
+    return trades
+
+
+@pytest.fixture
+def legacy_conn(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    trades = create_v0_db(path)
+    conn = connect_writer(path)
+    yield conn, trades
+    conn.close()
+
+
+def test_init_db_refuses_v0_database(legacy_conn):
+    conn, _ = legacy_conn
+    with pytest.raises(RuntimeError, match='migrate'):
+        init_db(conn)
+
+
+def test_migrate_v0_to_current(legacy_conn):
+    conn, trades = legacy_conn
+
+    result = migrate_db(conn)
+
+    assert result['from_version'] == 0
+    assert result['to_version'] == SCHEMA_VERSION == get_schema_version(conn)
+    assert result['trades'] == TRADES
+    init_db(conn)
+
+    # 交易解码后与原始数据一致
+    rows = conn.execute('''
+    SELECT market_id, tx_hash, log_index, maker, taker, side, outcome, price, size, block_number, timestamp
+    FROM trades ORDER BY id
+    ''').fetchall()
+    assert [dict(decode_trade(*row[1:]), market_id=row[0]) for row in rows] == trades
+
+    # 市场与 token 映射可用
+    market = fetch_market_by_token_id(conn, token_id(2, 1))
+    assert market['slug'] == 'legacy-market-2'
+
+    # K 线与市场统计由迁移后的交易重新计算
+    rollup_rows = conn.execute(f'SELECT {ROLLUP_COLUMNS} FROM trades').fetchall()
+    candles = conn.execute('''
+    SELECT market_id, outcome, interval, bucket_start, open, high, low, close, volume, trade_count,
+           first_block, first_log_index, last_block, last_log_index
+    FROM candles
+    ''').fetchall()
+    assert {tuple(row[:4]): list(row[4:]) for row in candles} == aggregate_candles(rollup_rows)
+    stats = conn.execute('''
+    SELECT market_id, total_trades, total_volume, volume_24h, first_trade_block, first_trade_log_index,
+           last_trade_block, last_trade_log_index, last_price, last_trade_timestamp
+    FROM market_stats
+    ''').fetchall()
+    assert {row[0]: list(row[1:]) for row in stats} == aggregate_market_stats(rollup_rows)
+    assert sum(row[1] for row in stats) == TRADES
+
+    # 与区块进度无关的值移到 metadata
+    assert fetch_sync_states(conn) == {'global_indexer': LAST_BLOCK}
+    assert get_metadata(conn, 'trades_indexer_chunk_size') == 2500
+
+    # 已是当前格式时不再迁移
+    assert migrate_db(conn)['from_version'] == SCHEMA_VERSION
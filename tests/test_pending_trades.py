@@ -0,0 +1,73 @@
+"""token 尚无市场的交易暂存到 pending_trades，市场出现后写入"""
+from src.db.codec import blob_to_token_id
+from src.db.store import get_sync_state, upsert_catalog
+from src.indexer.token_resolver import TokenResolver
+
+
+START_BLOCK = 1000
+
+
+class FakeDiscovery:
+    """只认识 known 中 token 的市场发现替身"""
+
+    def __init__(self):
+        self.known = {}
+        self.queries = 0
+
+    def resolve_token_ids(self, conn, token_ids):
+        self.queries += 1
+        resolved = set(token_ids) & set(self.known)
+        for token_id in resolved:
+            upsert_catalog(conn, markets=[self.known[token_id]])
+        return resolved
+
+
+def count(conn, table):
+    return conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+def test_unknown_fills_are_held_and_promoted_when_market_appears(conn, make_chain, make_indexer):
+    end_block = START_BLOCK + 299
+    chain = make_chain(end_block, unknown_token_rate=0.2)
+    discovery = FakeDiscovery()
+    indexer = make_indexer(chain, token_resolver=TokenResolver(discovery, negative_ttl=0))
+
+    result = indexer.run_indexer(conn, START_BLOCK, end_block)
+
+    held = count(conn, 'pending_trades')
+    assert held > 0
+    assert result['held_trades'] == held
+    assert count(conn, 'trades') + held == sum(len(chain._logs_for_block(n)) for n in range(START_BLOCK, end_block + 1))
+    # 同步状态照常推进，暂存的交易不会丢失
+    assert get_sync_state(conn)['last_block'] == end_block
+
+    # Gamma 之后收录了其中一个 token 的市场
+    token_id, token_held = conn.execute('''
+    SELECT token_id, COUNT(*) FROM pending_trades GROUP BY token_id ORDER BY COUNT(*) DESC LIMIT 1
+    ''').fetchone()
+    token_decimal = blob_to_token_id(token_id)
+    discovery.known[token_decimal] = {
+        'slug': 'late-market', 'condition_id': '0xlate', 'yes_token_id': token_decimal, 'no_token_id': '1'
+    }
+
+    trades_before = count(conn, 'trades')
+    result = indexer.run_indexer(conn, end_block + 1, end_block)
+
+    assert result['inserted_trades'] == token_held
+    assert count(conn, 'trades') == trades_before + token_held
+    assert count(conn, 'pending_trades') == held - token_held
+    market_id = conn.execute("SELECT id FROM markets WHERE slug = 'late-market'").fetchone()[0]
+    stats = conn.execute('SELECT total_trades FROM market_stats WHERE market_id = ?', (market_id,)).fetchone()
+    assert stats[0] == token_held
+
+
+def test_unknown_fills_are_skipped_without_resolver(conn, make_chain, make_indexer, caplog):
+    end_block = START_BLOCK + 99
+    indexer = make_indexer(make_chain(end_block, unknown_token_rate=0.2))
+
+    with caplog.at_level('WARNING'):
+        result = indexer.run_indexer(conn, START_BLOCK, end_block)
+
+    assert count(conn, 'pending_trades') == 0
+    assert result['skipped_trades'] > 0
+    assert any('已跳过' in record.getMessage() for record in caplog.records)
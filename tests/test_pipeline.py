@@ -0,0 +1,94 @@
+"""流水线索引与顺序索引的结果一致"""
+import threading
+
+import pytest
+
+from src.db.schema import init_db
+from src.db.store import get_sync_state, upsert_catalog
+from src.indexer.chunker import AdaptiveChunker
+
+
+START_BLOCK = 1000
+END_BLOCK = 2999
+
+# 与写入顺序无关的表内容（不含自增 id）
+SNAPSHOT_QUERIES = {
+    'trades': '''
+    SELECT market_id, tx_hash, log_index, maker, taker, side, outcome, price, size, block_number, timestamp
+    FROM trades ORDER BY block_number, log_index
+    ''',
+    'candles': 'SELECT * FROM candles ORDER BY market_id, interval, outcome, bucket_start',
+    'market_stats': '''
+    SELECT market_id, total_trades, total_volume, first_trade_block, first_trade_log_index,
+           last_trade_block, last_trade_log_index, last_price, last_trade_timestamp
+    FROM market_stats ORDER BY market_id
+    ''',
+    'indexed_ranges': 'SELECT * FROM indexed_ranges ORDER BY from_block',
+}
+
+
+def index_snapshot(db_path, catalog, make_chain, make_indexer, **indexer_kwargs):
+    """在新数据库上索引合成链，返回各表内容"""
+    conn = init_db(db_path)
+    try:
+        upsert_catalog(conn, catalog.events(), catalog.markets())
+        # 单次查询的日志上限远小于初始窗口，迫使分块器反复遇到范围错误；同时注入传输错误
+        chain = make_chain(END_BLOCK, logs_per_block=5, max_logs_per_query=150, error_rate=0.05)
+        indexer = make_indexer(chain, initial_chunk_size=400, **indexer_kwargs)
+        result = indexer.run_indexer(conn, START_BLOCK, END_BLOCK)
+        snapshot = {name: conn.execute(query).fetchall() for name, query in SNAPSHOT_QUERIES.items()}
+        snapshot['sync_state'] = get_sync_state(conn)['last_block']
+        return snapshot, result, chain
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('fetch_concurrency', [2, 4])
+def test_pipeline_matches_sequential_under_range_errors(tmp_path, catalog, make_chain, make_indexer, fetch_concurrency):
+    sequential, _, _ = index_snapshot(str(tmp_path / 'sequential.db'), catalog, make_chain, make_indexer)
+    pipelined, result, chain = index_snapshot(
+        str(tmp_path / 'pipelined.db'), catalog, make_chain, make_indexer,
+        fetch_concurrency=fetch_concurrency, write_batch_size=500
+    )
+
+    assert chain.range_errors > 0
+    assert chain.injected_errors > 0
+    assert len(sequential['trades']) == sum(len(chain._logs_for_block(n)) for n in range(START_BLOCK, END_BLOCK + 1))
+    assert pipelined == sequential
+    assert pipelined['sync_state'] == END_BLOCK
+    assert pipelined['indexed_ranges'] == [(START_BLOCK, END_BLOCK)]
+    assert result['chunks'] > 1
+
+
+def test_chunker_shared_across_threads_covers_each_range(make_chain):
+    chain = make_chain(END_BLOCK, logs_per_block=5, max_logs_per_query=150)
+    chunker = AdaptiveChunker(initial_size=400, max_size=1000, backoff_seconds=0.001)
+
+    def fetch(start, end):
+        response = chain.handle({'method': 'eth_getLogs', 'params': [{'fromBlock': hex(start), 'toBlock': hex(end)}]})
+        if 'error' in response:
+            raise RuntimeError(response['error']['message'])
+        return response['result']
+
+    spans = {}
+    errors = []
+
+    def worker(index):
+        try:
+            start = START_BLOCK + index * 250
+            spans[index] = [(chunk_from, chunk_to) for chunk_from, chunk_to, _ in chunker.iter_ranges(start, start + 249, fetch)]
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    for index, ranges in spans.items():
+        start = START_BLOCK + index * 250
+        assert ranges[0][0] == start and ranges[-1][1] == start + 249
+        assert all(previous[1] + 1 == current[0] for previous, current in zip(ranges, ranges[1:]))
+    assert chunker.min_size <= chunker.size <= chunker.max_size
@@ -0,0 +1,26 @@
+"""cProfile 记录覆盖工作线程"""
+import pstats
+from concurrent.futures import ThreadPoolExecutor
+
+from src.indexer.profiler import AllThreadsProfile
+
+
+def busy_in_worker_thread(n):
+    return sum(range(n))
+
+
+def test_all_threads_profile_includes_worker_threads(tmp_path):
+    profile = AllThreadsProfile()
+    profile.enable()
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        list(pool.map(busy_in_worker_thread, [100000] * 6))
+    profile.disable()
+
+    path = str(tmp_path / 'run.prof')
+    profile.dump_stats(path)
+
+    calls = {
+        function: stat[1]
+        for (_, _, function), stat in pstats.Stats(path).stats.items()
+    }
+    assert calls.get('busy_in_worker_thread') == 6
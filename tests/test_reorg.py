@@ -0,0 +1,107 @@
+"""区块重组：回滚到分叉点后重新索引，结果与直接索引新链一致"""
+from benchmarks.fake_rpc import FakeChain
+from benchmarks.synthetic import SyntheticLogs, block_header
+from src.db.codec import hex_to_blob
+from src.db.schema import init_db
+from src.db.store import get_sync_state, upsert_catalog
+
+
+START_BLOCK = 1000
+FORK_BLOCK = 1080
+
+# 与写入顺序无关的表内容（不含自增 id）
+SNAPSHOT_QUERIES = {
+    'trades': '''
+    SELECT market_id, tx_hash, log_index, maker, taker, side, outcome, price, size, block_number, timestamp
+    FROM trades ORDER BY block_number, log_index
+    ''',
+    'candles': 'SELECT * FROM candles ORDER BY market_id, interval, outcome, bucket_start',
+    'market_stats': '''
+    SELECT market_id, total_trades, total_volume, first_trade_block, first_trade_log_index,
+           last_trade_block, last_trade_log_index, last_price, last_trade_timestamp
+    FROM market_stats ORDER BY market_id
+    ''',
+}
+
+
+class ForkingChain(FakeChain):
+    """fork() 之后，分叉点以上的区块换成另一条链（哈希与日志都不同）"""
+
+    def __init__(self, logs, forked_logs, head_block, **kwargs):
+        super().__init__(logs, head_block, **kwargs)
+        self.forked_logs = forked_logs
+        self.fork_block = None
+
+    def fork(self, fork_block, head_block):
+        self.fork_block = fork_block
+        self.head_block = head_block
+
+    def _forked(self, number):
+        return self.fork_block is not None and number > self.fork_block
+
+    def _block_hash(self, number):
+        return f"0x{number:064x}" if self._forked(number) else block_header(number)["hash"]
+
+    def _logs_for_block(self, number):
+        if not self._forked(number):
+            return super()._logs_for_block(number)
+        logs = self.forked_logs.block_logs(number)
+        for log in logs:
+            log["blockHash"] = self._block_hash(number)
+        return logs
+
+    def handle(self, request):
+        response = super().handle(request)
+        if request["method"] == "eth_getBlockByNumber" and response.get("result"):
+            number = int(request["params"][0], 16)
+            response["result"] = dict(
+                response["result"], hash=self._block_hash(number), parentHash=self._block_hash(number - 1)
+            )
+        return response
+
+
+def make_forking_chain(catalog, head_block):
+    return ForkingChain(
+        SyntheticLogs(catalog, 3, seed=1), SyntheticLogs(catalog, 3, seed=2), head_block=head_block
+    )
+
+
+def follow_once(indexer, conn, start_block=None):
+    return indexer.follow(
+        conn, start_block=start_block, confirmations=0, poll_interval=0, max_cycles=1,
+        stats_refresh_interval=3600
+    )
+
+
+def test_follow_rolls_back_to_fork_and_reindexes(conn, tmp_path, catalog, make_indexer):
+    chain = make_forking_chain(catalog, head_block=1100)
+    indexer = make_indexer(chain)
+    follow_once(indexer, conn, start_block=START_BLOCK)
+    trades_before_fork = conn.execute(
+        'SELECT COUNT(*) FROM trades WHERE block_number <= ?', (FORK_BLOCK,)
+    ).fetchone()[0]
+
+    # 分叉点之后的 20 个区块被替换，同时链头前进
+    chain.fork(FORK_BLOCK, head_block=1150)
+    result = follow_once(indexer, conn)
+
+    assert result['reorgs'] == 1
+    assert get_sync_state(conn)['last_block'] == 1150
+    assert conn.execute(
+        'SELECT COUNT(*) FROM trades WHERE block_number <= ?', (FORK_BLOCK,)
+    ).fetchone()[0] == trades_before_fork
+    # 保存的区块哈希已换成新链的
+    stored_hash = conn.execute('SELECT hash FROM blocks WHERE number = 1150').fetchone()[0]
+    assert stored_hash == hex_to_blob(chain._block_hash(1150))
+
+    # 交易与回滚时重建的 K 线、统计都与直接索引新链得到的数据库一致
+    expected_conn = init_db(str(tmp_path / 'expected.db'))
+    try:
+        upsert_catalog(expected_conn, catalog.events(), catalog.markets())
+        expected_chain = make_forking_chain(catalog, head_block=1150)
+        expected_chain.fork(FORK_BLOCK, head_block=1150)
+        make_indexer(expected_chain).run_indexer(expected_conn, START_BLOCK, 1150)
+        for name, query in SNAPSHOT_QUERIES.items():
+            assert conn.execute(query).fetchall() == expected_conn.execute(query).fetchall(), name
+    finally:
+        expected_conn.close()
@@ -0,0 +1,128 @@
+"""K 线与市场统计的增量维护与全量重算一致"""
+import multiprocessing
+
+from benchmarks.seed_db import iter_trade_batches
+from benchmarks.synthetic import SyntheticMarkets
+from src.db.connection import connect_writer
+from src.db.codec import OUTCOME_CODES
+from src.db.rollups import ROLLUP_COLUMNS, aggregate_candles, aggregate_market_stats, fetch_candles
+from src.db.store import insert_trades
+
+
+WRITERS = 3
+TRADES_PER_WRITER = 2000
+# 相邻写入者之间重复的交易数，验证重复交易不会被汇总
+OVERLAP = 200
+
+
+def generate_trades(market_ids, count, seed=7):
+    """生成按区块顺序排列的合成交易"""
+    catalog = SyntheticMarkets(len(market_ids), seed=1)
+    trades = []
+    for batch in iter_trade_batches(catalog, market_ids, count, 5, 60000000, seed, batch_size=1000, traders=100):
+        trades.extend(batch)
+    return trades
+
+
+def _insert_slice(db_path, market_ids, index):
+    """子进程：以很小的批次写入自己的交易切片"""
+    trades = generate_trades(market_ids, WRITERS * TRADES_PER_WRITER)
+    conn = connect_writer(db_path)
+    try:
+        start = index * TRADES_PER_WRITER
+        insert_trades(conn, trades[start:start + TRADES_PER_WRITER + OVERLAP], batch_size=5)
+    finally:
+        conn.close()
+
+
+def insert_concurrently(db_path, market_ids):
+    """多个进程同时写入交易"""
+    context = multiprocessing.get_context('spawn')
+    processes = [
+        context.Process(target=_insert_slice, args=(db_path, market_ids, index))
+        for index in range(WRITERS)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=120)
+        assert process.exitcode == 0
+
+
+def stored_candles(conn):
+    """读取 candles 表，格式与 aggregate_candles 一致"""
+    rows = conn.execute('''
+    SELECT market_id, outcome, interval, bucket_start, open, high, low, close, volume, trade_count,
+           first_block, first_log_index, last_block, last_log_index
+    FROM candles
+    ''').fetchall()
+    return {tuple(row[:4]): list(row[4:]) for row in rows}
+
+
+def stored_market_stats(conn):
+    """读取 market_stats 表，格式与 aggregate_market_stats 一致"""
+    rows = conn.execute('''
+    SELECT market_id, total_trades, total_volume, volume_24h, first_trade_block, first_trade_log_index,
+           last_trade_block, last_trade_log_index, last_price, last_trade_timestamp
+    FROM market_stats
+    ''').fetchall()
+    return {row[0]: list(row[1:]) for row in rows}
+
+
+def all_trades(conn):
+    """按 ROLLUP_COLUMNS 读取全部交易"""
+    return conn.execute(f'SELECT {ROLLUP_COLUMNS} FROM trades').fetchall()
+
+
+def test_candles_match_full_recompute_after_concurrent_inserts(conn, db_path, market_ids):
+    insert_concurrently(db_path, market_ids)
+
+    assert conn.execute('SELECT COUNT(*) FROM trades').fetchone()[0] == WRITERS * TRADES_PER_WRITER
+    candles = stored_candles(conn)
+    assert candles == aggregate_candles(all_trades(conn))
+    daily_trades = sum(candle[5] for key, candle in candles.items() if key[2] == '1d')
+    assert daily_trades == WRITERS * TRADES_PER_WRITER
+
+
+def test_reinserting_trades_does_not_change_candles(conn, market_ids):
+    trades = generate_trades(market_ids, 500)
+    assert insert_trades(conn, trades, batch_size=100) == 500
+    before = stored_candles(conn)
+
+    assert insert_trades(conn, trades[100:300], batch_size=100) == 0
+    assert stored_candles(conn) == before
+
+
+def test_market_stats_match_full_recompute_after_concurrent_inserts(conn, db_path, market_ids, api_client):
+    insert_concurrently(db_path, market_ids)
+
+    stats = stored_market_stats(conn)
+    assert stats == aggregate_market_stats(all_trades(conn))
+    assert sum(entry[0] for entry in stats.values()) == WRITERS * TRADES_PER_WRITER
+
+    # X-Total-Count 直接取自 market_stats，应与实际行数一致
+    market_id = max(stats, key=lambda market_id: stats[market_id][0])
+    slug = conn.execute('SELECT slug FROM markets WHERE id = ?', (market_id,)).fetchone()[0]
+    response = api_client.get(f'/markets/{slug}/trades?limit=1')
+    actual = conn.execute('SELECT COUNT(*) FROM trades WHERE market_id = ?', (market_id,)).fetchone()[0]
+    assert response.status_code == 200
+    assert int(response.headers['X-Total-Count']) == actual
+
+
+def test_fetch_candles_limit_applies_per_outcome(conn, market_ids):
+    market_id = market_ids[0]
+    trades = []
+    for index in range(20):
+        for outcome in OUTCOME_CODES.values():
+            trades.append((
+                market_id, bytes([index, outcome]) * 16, outcome, b'm' * 20, b't' * 20, 0, outcome,
+                500000, 1000000, 100 + index, 1700000000 + index * 60
+            ))
+    insert_trades(conn, trades)
+
+    candles = fetch_candles(conn, market_id, '1m', limit=5)
+
+    assert [(candle['outcome'], candle['bucket_start']) for candle in candles] == [
+        (outcome, 1700000000 - 1700000000 % 60 + index * 60) for outcome in ('YES', 'NO') for index in range(5)
+    ]
+    assert len(fetch_candles(conn, market_id, '1m', outcome='NO', limit=5)) == 5
@@ -0,0 +1,124 @@
+"""BatchRpcClient 的拆分与重试策略"""
+import pytest
+import requests
+
+from src.indexer import rpc
+from src.indexer.rpc import BatchRpcClient, BatchTooLargeError
+
+
+class ScriptedClient(BatchRpcClient):
+    """按 respond(payload) 响应的客户端，记录每次发送的批量大小"""
+
+    def __init__(self, respond, **kwargs):
+        super().__init__('fake://', backoff_seconds=1.0, **kwargs)
+        self.respond = respond
+        self.sent = []
+
+    def _post(self, payload):
+        self.sent.append(len(payload))
+        return self.respond(payload)
+
+
+def echo(payload):
+    return [{'jsonrpc': '2.0', 'id': item['id'], 'result': item['params'][0]} for item in payload]
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """记录退避等待而不真正休眠"""
+    recorded = []
+    monkeypatch.setattr(rpc.time, 'sleep', recorded.append)
+    return recorded
+
+
+def test_outage_retries_whole_batch_without_splitting(sleeps):
+    def down(payload):
+        raise requests.ConnectionError('connection refused')
+    client = ScriptedClient(down, max_retries=3)
+
+    with pytest.raises(requests.ConnectionError):
+        client.call_batch('eth_getBlockByNumber', [[n] for n in range(100)])
+
+    assert client.sent == [100] * 4
+    assert sleeps == [1.0, 2.0, 4.0]
+
+
+def test_server_errors_are_retried_then_succeed(sleeps):
+    failures = [503]
+
+    def flaky(payload):
+        if failures:
+            response = requests.Response()
+            response.status_code = failures.pop()
+            raise requests.HTTPError(response=response)
+        return echo(payload)
+    client = ScriptedClient(flaky)
+
+    assert client.call_batch('eth_getBlockByNumber', [[n] for n in range(10)]) == list(range(10))
+    assert client.sent == [10, 10]
+    assert sleeps == [1.0]
+
+
+def test_client_errors_are_not_retried(sleeps):
+    def unauthorized(payload):
+        response = requests.Response()
+        response.status_code = 401
+        raise requests.HTTPError(response=response)
+    client = ScriptedClient(unauthorized)
+
+    with pytest.raises(requests.HTTPError):
+        client.call_batch('eth_getBlockByNumber', [[1]])
+    assert client.sent == [1]
+    assert sleeps == []
+
+
+def test_oversized_batches_are_split_without_backoff(sleeps):
+    def limited(payload):
+        if len(payload) > 30:
+            return {'jsonrpc': '2.0', 'id': None, 'error': {'code': -32600, 'message': 'Batch size too large'}}
+        return echo(payload)
+    client = ScriptedClient(limited)
+
+    assert client.call_batch('eth_getBlockByNumber', [[n] for n in range(100)]) == list(range(100))
+    assert client.sent == [100, 50, 25, 25, 50, 25, 25]
+    assert sleeps == []
+
+
+def test_single_call_too_large_is_raised(sleeps):
+    def rejected(payload):
+        raise BatchTooLargeError('HTTP 413')
+    client = ScriptedClient(rejected)
+
+    with pytest.raises(BatchTooLargeError):
+        client.call_batch('eth_getBlockByNumber', [[1], [2]])
+    assert client.sent == [2, 1]
+    assert sleeps == []
+
+
+def test_receipts_are_batched_split_and_retried(sleeps):
+    missing = '0xmissing'
+    failures = [503]
+
+    def node(payload):
+        if failures:
+            response = requests.Response()
+            response.status_code = failures.pop()
+            raise requests.HTTPError(response=response)
+        if len(payload) > 4:
+            return {'jsonrpc': '2.0', 'id': None, 'error': {'code': -32600, 'message': 'batch limit exceeded'}}
+        assert all(item['method'] == 'eth_getTransactionReceipt' for item in payload)
+        return [
+            {'jsonrpc': '2.0', 'id': item['id'],
+             'result': None if item['params'][0] == missing else {'transactionHash': item['params'][0], 'status': '0x1'}}
+            for item in reversed(payload)
+        ]
+    client = ScriptedClient(node)
+    tx_hashes = [f'0x{n:02x}' for n in range(5)] + [missing, '0x01']
+
+    receipts = client.get_receipts(tx_hashes)
+
+    # 重复的哈希只请求一次；节点返回 null 的交易不出现在结果中
+    assert list(receipts) == [f'0x{n:02x}' for n in range(5)]
+    assert all(receipt['transactionHash'] == tx_hash for tx_hash, receipt in receipts.items())
+    assert client.sent == [6, 6, 3, 3]
+    assert sleeps == [1.0]
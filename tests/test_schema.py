@@ -0,0 +1,32 @@
+"""表结构初始化与旧数据库的自动升级"""
+from src.db.connection import connect_writer
+from src.db.schema import init_db
+from src.db.store import fetch_sync_states, get_data_generation, get_metadata, upsert_event
+
+
+def test_legacy_metadata_moves_out_of_sync_state(db_path):
+    conn = init_db(db_path)
+    # 旧版本把这些值写在 sync_state.last_block 中
+    conn.executemany('INSERT INTO sync_state (key, last_block, updated_at) VALUES (?, ?, ?)', [
+        ('global_indexer', 66000000, None),
+        ('data_generation', 41, None),
+        ('trades_indexer_chunk_size', 1500, None),
+        ('catalog_updated_at', 1760000000, None),
+        ('bench_seed_trades', 500000, None),
+    ])
+    conn.commit()
+    conn.close()
+
+    conn = init_db(connect_writer(db_path))
+    try:
+        assert fetch_sync_states(conn) == {'global_indexer': 66000000}
+        assert get_metadata(conn, 'trades_indexer_chunk_size') == 1500
+        assert get_metadata(conn, 'catalog_updated_at') == 1760000000
+        assert get_metadata(conn, 'bench_seed_trades') == 500000
+        assert get_data_generation(conn) == 41
+
+        upsert_event(conn, {'slug': 'event', 'title': 'Event'})
+        assert get_data_generation(conn) == 42
+        assert 'data_generation' not in fetch_sync_states(conn)
+    finally:
+        conn.close()
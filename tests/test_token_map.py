@@ -0,0 +1,51 @@
+"""索引器缓存的 token 映射：新增代币增量加载，已有代币被改到其他市场时整表重载"""
+from src.db.codec import OUTCOME_CODES, token_id_to_blob
+from src.db.store import TOKEN_GENERATION_KEY, get_metadata, upsert_catalog
+
+
+START_BLOCK = 1000
+
+
+def test_new_and_unchanged_tokens_keep_token_generation(conn, catalog):
+    upsert_catalog(conn, catalog.events(), catalog.markets())
+    upsert_catalog(conn, markets=[{
+        'slug': 'fresh-market', 'condition_id': '0xfresh', 'yes_token_id': '11', 'no_token_id': '12'
+    }])
+
+    assert get_metadata(conn, TOKEN_GENERATION_KEY) == 0
+
+
+def test_reassigned_token_is_reloaded(conn, catalog, market_ids, make_chain, make_indexer):
+    indexer = make_indexer(make_chain(START_BLOCK + 199))
+    indexer.run_indexer(conn, START_BLOCK, START_BLOCK + 99)
+    # 移动前一段交易最多的 YES 代币
+    old_id = conn.execute('''
+    SELECT market_id FROM trades WHERE outcome = ? GROUP BY market_id ORDER BY COUNT(*) DESC LIMIT 1
+    ''', (OUTCOME_CODES['YES'],)).fetchone()[0]
+    moved = catalog.markets()[market_ids.index(old_id)]
+    token_id = token_id_to_blob(moved['yes_token_id'])
+    assert indexer.token_map[token_id] == (old_id, OUTCOME_CODES['YES'])
+
+    # 目录把该代币改为另一个市场的 NO（rowid 不变）
+    upsert_catalog(conn, markets=[{
+        'slug': 'relisted-market', 'condition_id': '0xrelisted', 'event_slug': moved['event_slug'],
+        'yes_token_id': '1', 'no_token_id': moved['yes_token_id']
+    }])
+    assert get_metadata(conn, TOKEN_GENERATION_KEY) == 1
+    relisted_id = conn.execute("SELECT id FROM markets WHERE slug = 'relisted-market'").fetchone()[0]
+
+    indexer.run_indexer(conn, START_BLOCK + 100, START_BLOCK + 199)
+
+    assert indexer.token_map[token_id] == (relisted_id, OUTCOME_CODES['NO'])
+    assert len(indexer.token_map) == conn.execute('SELECT COUNT(*) FROM tokens').fetchone()[0]
+    # 之后的交易记入新市场
+    later_trades = dict(conn.execute('''
+    SELECT market_id, COUNT(*) FROM trades
+    WHERE block_number > ? AND market_id IN (?, ?) AND outcome = ?
+    GROUP BY market_id
+    ''', (START_BLOCK + 99, old_id, relisted_id, OUTCOME_CODES['YES'])).fetchall())
+    assert relisted_id not in later_trades
+    assert old_id not in later_trades
+    assert conn.execute(
+        'SELECT COUNT(*) FROM trades WHERE market_id = ? AND outcome = ?', (relisted_id, OUTCOME_CODES['NO'])
+    ).fetchone()[0] > 0
@@ -0,0 +1,126 @@
+"""交易查询接口：键集分页游标与流式导出"""
+import csv
+import io
+import json
+
+import pytest
+
+from src.api import server
+from src.db.codec import blob_to_token_id
+
+
+START_BLOCK = 1000
+END_BLOCK = 1199
+
+
+@pytest.fixture
+def indexed(conn, make_chain, make_indexer):
+    """索引合成链，返回 (索引器, 交易最多的市场 slug)"""
+    indexer = make_indexer(make_chain(END_BLOCK + 100))
+    indexer.run_indexer(conn, START_BLOCK, END_BLOCK)
+    slug = conn.execute('''
+    SELECT m.slug FROM trades t JOIN markets m ON m.id = t.market_id
+    GROUP BY t.market_id ORDER BY COUNT(*) DESC LIMIT 1
+    ''').fetchone()[0]
+    return indexer, slug
+
+
+def walk_pages(api_client, url, limit, between_pages=None):
+    """沿 next_cursor 翻页直到结束，返回每页的交易"""
+    pages = []
+    response = api_client.get(url, query_string={'limit': limit})
+    while True:
+        assert response.status_code == 200
+        pages.append(response.get_json()['trades'])
+        if between_pages:
+            between_pages()
+        next_cursor = response.get_json()['next_cursor']
+        if next_cursor is None:
+            return pages
+        response = api_client.get(url, query_string={'limit': limit, 'cursor': next_cursor})
+
+
+def trade_key(trade):
+    return trade['block_number'], trade['log_index']
+
+
+def test_cursor_pages_cover_every_trade_once(conn, api_client, indexed):
+    _, slug = indexed
+    url = f'/markets/{slug}/trades'
+    total = int(api_client.get(url).headers['X-Total-Count'])
+    everything = api_client.get(url, query_string={'limit': total + 1}).get_json()['trades']
+    assert len(everything) == total > 20
+
+    pages = walk_pages(api_client, url, limit=7)
+
+    walked = [trade for page in pages for trade in page]
+    assert walked == everything
+    assert len({trade_key(trade) for trade in walked}) == total
+    assert all(len(page) == 7 for page in pages[:-1])
+    # 至少有一个页边界落在同一区块内，验证 log_index 作为第二排序键
+    assert any(
+        previous[-1]['block_number'] == page[0]['block_number']
+        for previous, page in zip(pages, pages[1:]) if page
+    )
+
+
+def test_cursor_pages_are_stable_while_new_trades_arrive(conn, api_client, indexed):
+    indexer, slug = indexed
+    url = f'/markets/{slug}/trades'
+    before = api_client.get(url, query_string={'limit': 100000}).get_json()['trades']
+
+    # 翻页过程中有新区块写入，后续页面不会重复或漏掉已有交易
+    new_blocks = iter(range(END_BLOCK + 1, END_BLOCK + 101, 20))
+    def index_more():
+        block = next(new_blocks, None)
+        if block is not None:
+            indexer.run_indexer(conn, block, block + 19)
+
+    walked = [trade for page in walk_pages(api_client, url, limit=10, between_pages=index_more) for trade in page]
+
+    assert walked == before
+    assert int(api_client.get(url).headers['X-Total-Count']) > len(before)
+
+
+def test_token_trades_cursor_filters_outcome(conn, api_client, indexed):
+    _, slug = indexed
+    yes_token_id = conn.execute('SELECT yes_token_id FROM markets WHERE slug = ?', (slug,)).fetchone()[0]
+    token_id = blob_to_token_id(yes_token_id)
+
+    walked = [trade for page in walk_pages(api_client, f'/tokens/{token_id}/trades', limit=5) for trade in page]
+
+    market_trades = api_client.get(f'/markets/{slug}/trades', query_string={'limit': 100000}).get_json()['trades']
+    assert walked == [trade for trade in market_trades if trade['outcome'] == 'YES']
+
+
+def test_invalid_cursor_is_rejected(api_client, indexed):
+    _, slug = indexed
+    response = api_client.get(f'/markets/{slug}/trades', query_string={'cursor': 'not-a-cursor'})
+    assert response.status_code == 400
+
+
+def test_export_streams_every_trade_in_block_order(conn, api_client, indexed, monkeypatch):
+    _, slug = indexed
+    # 缩小读取批次，让导出跨越多个批次
+    monkeypatch.setattr(server, 'EXPORT_FETCH_SIZE', 7)
+    newest_first = api_client.get(f'/markets/{slug}/trades', query_string={'limit': 100000}).get_json()['trades']
+    expected = [{key: trade[key] for key in server.EXPORT_COLUMNS} for trade in reversed(newest_first)]
+
+    response = api_client.get(f'/markets/{slug}/trades/export')
+    assert response.mimetype == 'application/x-ndjson'
+    assert [json.loads(line) for line in response.get_data(as_text=True).splitlines()] == expected
+
+    response = api_client.get(f'/markets/{slug}/trades/export', query_string={'format': 'csv'})
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert tuple(rows[0]) == server.EXPORT_COLUMNS
+    assert rows[1:] == [[str(value) for value in trade.values()] for trade in expected]
+
+
+def test_export_block_bounds(api_client, indexed):
+    _, slug = indexed
+    response = api_client.get(f'/markets/{slug}/trades/export', query_string={'from_block': 1050, 'to_block': 1099})
+    blocks = [json.loads(line)['block_number'] for line in response.get_data(as_text=True).splitlines()]
+
+    assert blocks and min(blocks) >= 1050 and max(blocks) <= 1099
+    assert blocks == sorted(blocks)
+    assert api_client.get(f'/markets/{slug}/trades/export', query_string={'from_block': 'x'}).status_code == 400
@@ -1,7 +1,8 @@
-import sqlite3
+from src.db.codec import blob_to_token_id
+from src.db.connection import connect_reader
 
-# 连接到数据库
-conn = sqlite3.connect('./data/demo_indexer.db')
+# 连接到数据库（只读）
+conn = connect_reader('./data/demo_indexer.db')
 cursor = conn.cursor()
 
 # 查询市场数据
@@ -11,8 +12,8 @@ for row in cursor.fetchall():
     print(f"ID: {row[0]}")
     print(f"Slug: {row[1]}")
     print(f"Condition ID: {row[2]}")
-    print(f"YES Token ID: {row[3]}")
-    print(f"NO Token ID: {row[4]}")
+    print(f"YES Token ID: {blob_to_token_id(row[3])}")
+    print(f"NO Token ID: {blob_to_token_id(row[4])}")
     print("---")
 
 # 查询事件数据
@@ -34,5 +35,14 @@ for row in cursor.fetchall():
     print(f"Updated At: {row[2]}")
     print("---")
 
+# 查询元数据
+print("\n=== 元数据 ===")
+cursor.execute('SELECT key, value, updated_at FROM metadata;')
+for row in cursor.fetchall():
+    print(f"Key: {row[0]}")
+    print(f"Value: {row[1]}")
+    print(f"Updated At: {row[2]}")
+    print("---")
+
 # 关闭连接
 conn.close()
\ No newline at end of file